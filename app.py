@@ -1,10 +1,17 @@
 import os
 import json
-import threading
 import re
 import time
 import shutil
-from datetime import datetime
+import hashlib
+import gzip
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import signal
+import sys
+from datetime import datetime, timezone
 from http import HTTPStatus
 from flask import Flask, request, jsonify, Response
 from flask_socketio import SocketIO, emit
@@ -12,6 +19,16 @@ import requests
 import pandas as pd
 import google.generativeai as genai
 from google.generativeai import types
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖, 没有安装时只提供 gzip
+    brotli = None
+
+from movie_store import MovieStore, SqliteMovieStore, InterProcessLock, DurabilityError, LIST_NAMES, parse_tmdb_id, convert_snapshot
+from movie_record import MovieRecord, POSTER_SIZES, STILL_SIZES, image_base, first_image, images
+from library_search import LibrarySearchIndex, SORT_KEYS
+from tmdb_client import TmdbClient
+from tmdb_cache import TmdbCache
 
 # ==============================================================================
 # --- 配置 (CONFIG) ---
@@ -23,14 +40,40 @@ HUB_DATA_FILE = "hub_data.json"
 CHAT_LOG_FILE = "chat_log.json"
 CACHE_JSON = "movies.json"
 SOURCE_EXCEL_NAME = "source.xlsx"
+MOVIE_DB_FILE = "movies.db"
+# 设为 movies.mvs 使用二进制快照 (加载更快、文件更小); 首次启动时会自动从 movies.json 导入
+MOVIE_SNAPSHOT_FILE = os.environ.get("MOVIE_SNAPSHOT_FILE", CACHE_JSON)
+MOVIE_STORE_BACKEND = os.environ.get("MOVIE_STORE_BACKEND", "json")  # 'json' 或 'sqlite'
+MOVIE_STORE_FLUSH_INTERVAL = float(os.environ.get("MOVIE_STORE_FLUSH_INTERVAL", "2.0"))
+MOVIE_JOURNAL_COMPACT_BYTES = int(os.environ.get("MOVIE_JOURNAL_COMPACT_BYTES", str(512 * 1024)))
+MOVIE_STORE_GROUP_COMMIT_WINDOW = float(os.environ.get("MOVIE_STORE_GROUP_COMMIT_WINDOW", "0.005"))
+# 多进程部署 (gunicorn 多个 worker) 时设为 1, 见 gunicorn.conf.py
+MULTI_PROCESS = os.environ.get("MULTI_PROCESS", "0") == "1"
+HUB_LOCK_FILE = "hub.lock"
+# TMDB 响应的磁盘缓存: 详情和搜索结果分别缓存多久, 以及总大小上限
+TMDB_CACHE_FILE = os.environ.get("TMDB_CACHE_FILE", "tmdb_cache.db")
+TMDB_CACHE_MAX_MB = float(os.environ.get("TMDB_CACHE_MAX_MB", "200"))
+TMDB_DETAILS_TTL = float(os.environ.get("TMDB_DETAILS_TTL", str(7 * 24 * 3600)))
+TMDB_SEARCH_TTL = float(os.environ.get("TMDB_SEARCH_TTL", str(24 * 3600)))
+# 英文标语 (tagline_en) 的来源: 'translations' 让中文详情请求顺带返回各语言译文, 一次请求即可;
+# 'full' 与中文详情并发请求一份完整的 en-US 详情
+TMDB_TAGLINE_SOURCE = os.environ.get("TMDB_TAGLINE_SOURCE", "translations")
+# Excel 导入时同时向 TMDB 查询的行数
+TMDB_IMPORT_CONCURRENCY = int(os.environ.get("TMDB_IMPORT_CONCURRENCY", "8"))
+# 详情页直接返回库中保存的记录; 记录的 enriched_at 早于这么多秒时, 先返回旧记录, 同时在后台从TMDB刷新
+TMDB_REFRESH_AGE = float(os.environ.get("TMDB_REFRESH_AGE", str(7 * 24 * 3600)))
+# 后台刷新没有记录海报语言的旧数据时使用的海报语言 (和前端的默认设置相同)
+DEFAULT_POSTER_LANG = "zh,en,null"
+# 详情页被打开后, 后台每分钟最多预取多少部推荐电影的详情 (0 表示关闭)
+TMDB_PREFETCH_PER_MINUTE = int(os.environ.get("TMDB_PREFETCH_PER_MINUTE", "30"))
 
 # --- 外部 API 配置 ---
 AI_API_URL = "https://jarvisai.deno.dev/v1/chat/completions"
 AI_API_KEY = os.environ.get("AI_API_KEY", " ")
 AI_MODEL_NAME = "gemini-2.5-pro"
 TMDB_API_KEY = os.environ.get("TMDB_API_KEY", " ")
-TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
-TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/original"
+# 指向 fake_tmdb_server.py 可以在离线环境中测试和压测 TMDB 相关的流程
+TMDB_API_BASE_URL = os.environ.get("TMDB_API_BASE_URL", "https://api.themoviedb.org/3")
 
 # --- Gemini Voice Model Config ---
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -40,8 +83,9 @@ if GEMINI_API_KEY:
 # --- Flask 应用实例 ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*")
-file_lock = threading.Lock()
+# 多个 worker 之间转发 Socket.IO 事件需要消息队列 (如 redis://localhost:6379/0), 单进程时留空即可
+socketio = SocketIO(app, async_mode=os.environ.get("SOCKETIO_ASYNC_MODE", "threading"), cors_allowed_origins="*",
+                    message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None)
 sessions = {}
 
 # ==============================================================================
@@ -1528,11 +1572,20 @@ HTML_MOVIES_PAGE = """
     <script>
         // --- CONFIG ---
         const API_BASE_URL = ''; // Relative path to our own Flask server
-        const TMDB_IMAGE_BASE_URL_JS = 'https://image.tmdb.org/t/p/w500';
+        const TMDB_IMAGE_BASE_URL_JS = 'https://image.tmdb.org/t/p/w185'; // 搜索结果里的小海报
+        // 电影墙卡片用 w342 海报, 动态背景用 w780 剧照; 拼接视图的图片也都是缩略图, 原图只在详情页灯箱里加载
+        const GRID_IMAGE_SIZES = { poster_size: 'w342', still_size: 'w780' };
+        const COLLAGE_IMAGE_SIZES = { poster_size: 'w342', still_size: 'w300' };
         const PROXY_API_URL = "/api/chat";
+        const MOVIE_PAGE_SIZE = 60;
+        const MAX_LOAD_ATTEMPTS = 5;
+        // 分页加载期间服务器上的电影库发生了变化, 需要从第一页重新加载
+        const LIBRARY_CHANGED = new Error('电影库在加载过程中发生了变化');
 
         // --- STATE ---
         let movieLists = { watched: [], watching: [], wantToWatch: [] };
+        let collageImages = null; // "已看"列表的全部海报和剧照, 切换到拼接视图时才加载
+        let libraryVersion = null; // 本地 movieLists 对应的服务器版本号, 用于增量同步
         let currentStatus = 'watched';
         let currentView = 'grid';
         let mediaPipeLoaded = false;
@@ -1716,15 +1769,60 @@ HTML_MOVIES_PAGE = """
         }
 
         // --- DATA & API CALLS ---
-        async function fetchMovieData() {
-            setStatus('正在从服务器获取数据...');
-            try {
-                const response = await fetch(`/api/movies`);
+        // 分页加载一个列表的精简数据, 每到一页就刷新一次当前视图。
+        // 所有列表的所有页都固定在 load.version 这个版本上: 中途有修改时偏移量会错位 (重复或漏掉电影),
+        // 服务器对带着旧 version 的请求返回 409, 这时抛出 LIBRARY_CHANGED, 由 fetchMovieData 从头重新加载
+        async function fetchMovieList(listName, load) {
+            const movies = [];
+            let cursor = null;
+            do {
+                const params = new URLSearchParams({ list: listName, fields: 'summary', limit: MOVIE_PAGE_SIZE, ...GRID_IMAGE_SIZES });
+                if (cursor) params.set('cursor', cursor);
+                if (load.version !== null) params.set('version', load.version);
+                const response = await fetch(`/api/movies?${params}`);
+                if (load.stale) throw LIBRARY_CHANGED;
+                if (response.status === 409) {
+                    load.stale = true;
+                    throw LIBRARY_CHANGED;
+                }
                 if (!response.ok) {
                     const errorHeader = response.headers.get('X-Error') || '未知服务器错误';
                     throw new Error(`服务器响应错误: ${response.status} - ${errorHeader}`);
                 }
-                movieLists = await response.json();
+                const page = await response.json();
+                const version = parseInt(response.headers.get('X-Library-Version'));
+                if (!isNaN(version)) {
+                    // 各列表的第一页是并发发出的, 还没带 version, 在这里核对
+                    if (load.version === null) load.version = version;
+                    if (version !== load.version) {
+                        load.stale = true;
+                        throw LIBRARY_CHANGED;
+                    }
+                }
+                movies.push(...page.items);
+                cursor = page.next_cursor;
+                movieLists[listName] = movies;
+                if (listName === currentStatus && currentView === 'grid') render();
+            } while (cursor);
+            return movies;
+        }
+
+        async function fetchMovieData() {
+            setStatus('正在从服务器获取数据...');
+            try {
+                collageImages = null;
+                libraryVersion = null;
+                for (let attempt = 1; ; attempt++) {
+                    const load = { version: null, stale: false };
+                    try {
+                        await Promise.all(Object.keys(movieLists).map(listName => fetchMovieList(listName, load)));
+                        libraryVersion = load.version;
+                        break;
+                    } catch (error) {
+                        load.stale = true; // 让其他还在翻页的列表停下来
+                        if (error !== LIBRARY_CHANGED || attempt >= MAX_LOAD_ATTEMPTS) throw error;
+                    }
+                }
                 setStatus('数据加载成功！', 3000);
                 render();
                 updateDynamicBackground();
@@ -1735,6 +1833,53 @@ HTML_MOVIES_PAGE = """
             }
         }
 
+        // 只拉取 libraryVersion 之后的增量修改并应用到本地; 历史不够时退回全量加载
+        async function syncMovieData() {
+            if (libraryVersion === null) return fetchMovieData();
+            try {
+                const params = new URLSearchParams({ since: libraryVersion, fields: 'summary', ...GRID_IMAGE_SIZES });
+                const response = await fetch(`/api/movies/changes?${params}`);
+                if (!response.ok) throw new Error(`服务器响应错误: ${response.status}`);
+                const result = await response.json();
+                if (result.resync) return fetchMovieData();
+                result.changes.forEach(applyLibraryChange);
+                libraryVersion = result.version;
+                if (result.changes.length > 0) {
+                    collageImages = null;
+                    render();
+                    updateDynamicBackground();
+                }
+            } catch (error) {
+                console.error('增量同步失败:', error);
+                return fetchMovieData();
+            }
+        }
+
+        function applyLibraryChange(change) {
+            const removeFrom = (listName, movieId) => {
+                const movies = movieLists[listName] || [];
+                const index = movies.findIndex(m => m.id === movieId);
+                return index > -1 ? movies.splice(index, 1)[0] : null;
+            };
+            if (change.op === 'add') {
+                removeFrom(change.list, change.movie.id);
+                movieLists[change.list].splice(change.index || 0, 0, change.movie);
+            } else if (change.op === 'update') {
+                const movies = movieLists[change.list] || [];
+                const index = movies.findIndex(m => m.id === change.movie.id);
+                if (index > -1) movies[index] = change.movie;
+            } else if (change.op === 'delete') {
+                removeFrom(change.list, change.id);
+            } else if (change.op === 'move') {
+                const movie = removeFrom(change.from, change.id);
+                if (movie) movieLists[change.to].splice(change.index || 0, 0, { ...movie, id: change.new_id });
+            } else if (change.op === 'batch') {
+                change.ops.forEach(applyLibraryChange);
+            } else if (change.op === 'clear') {
+                movieLists = { watched: [], watching: [], wantToWatch: [] };
+            }
+        }
+
         async function handleFileUpload(event) {
             const file = event.target.files[0];
             if (!file) return;
@@ -1753,7 +1898,7 @@ HTML_MOVIES_PAGE = """
                     throw new Error(result.detail || '上传失败');
                 }
                 setStatus(result.message, 5000);
-                await fetchMovieData();
+                await syncMovieData();
             } catch (error) {
                 setStatus(`上传失败: ${error.message}`);
                 console.error('上传错误:', error);
@@ -1795,7 +1940,7 @@ HTML_MOVIES_PAGE = """
                 
                 setStatus(result.message, 5000);
                 closeSearchModal();
-                await fetchMovieData();
+                await syncMovieData();
 
             } catch (error) {
                 setStatus(`添加失败: ${error.message}`, 5000);
@@ -1826,6 +1971,7 @@ HTML_MOVIES_PAGE = """
                         if (movieIndex > -1) {
                             movieLists[listName].splice(movieIndex, 1);
                         }
+                        if (listName === 'watched') collageImages = null;
                     }, 400);
                 }
             } catch (error) {
@@ -1869,7 +2015,7 @@ HTML_MOVIES_PAGE = """
                 movieCard.dataset.movieId = movie.id;
                 movieCard.dataset.listName = currentStatus;
                 movieCard.style.animationDelay = `${index * 50}ms`;
-                const poster = movie.posters && movie.posters.length > 0 ? movie.posters[0] : 'https://placehold.co/400x600/1c1917/57534e?text=无海报';
+                const poster = movie.poster || 'https://placehold.co/400x600/1c1917/57534e?text=无海报';
                 movieCard.innerHTML = `
                     <button class="delete-btn absolute top-2 right-2 z-20 w-8 h-8 flex items-center justify-center bg-black/50 rounded-full text-white hover:bg-red-600/80 transition-colors" title="删除电影">
                         <svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><polyline points="3 6 5 6 21 6"></polyline><path d="M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"></path><line x1="10" y1="11" x2="10" y2="17"></line><line x1="14" y1="11" x2="14" y2="17"></line></svg>
@@ -1890,11 +2036,28 @@ HTML_MOVIES_PAGE = """
             updateInspirationBtn();
         }
 
-        function renderCollageView() {
-            dom.movieWall.innerHTML = '';
-            const watchedImages = (movieLists.watched || []).flatMap(m => 
+        async function fetchCollageImages() {
+            const params = new URLSearchParams({ list: 'watched', fields: 'title,posters,stills', ...COLLAGE_IMAGE_SIZES });
+            const response = await fetch(`/api/movies?${params}`);
+            if (!response.ok) throw new Error(`服务器响应错误: ${response.status}`);
+            const page = await response.json();
+            return page.items.flatMap(m =>
                 [...(m.posters || []), ...(m.stills || [])].map(imgUrl => ({ src: imgUrl, title: m.title }))
             );
+        }
+
+        async function renderCollageView() {
+            dom.movieWall.innerHTML = '';
+            if (!collageImages) {
+                try {
+                    collageImages = await fetchCollageImages();
+                } catch (error) {
+                    setStatus(`获取图片失败: ${error.message}`);
+                    return;
+                }
+                if (currentView !== 'collage') return;
+            }
+            const watchedImages = [...collageImages];
             if (watchedImages.length === 0) {
                 dom.movieWall.innerHTML = `<p class="text-stone-400 text-center">"已看"列表里没有图片来制作拼接效果。</p>`;
                 return;
@@ -1945,7 +2108,7 @@ HTML_MOVIES_PAGE = """
         }
 
         function updateDynamicBackground() {
-            const allStills = Object.values(movieLists).flat().flatMap(m => (m.stills && m.stills.length > 0 ? m.stills : m.posters) || []);
+            const allStills = Object.values(movieLists).flat().map(m => m.still || m.poster).filter(Boolean);
             if (allStills.length === 0) return;
             const randomStill = allStills[Math.floor(Math.random() * allStills.length)];
             if (!randomStill) return;
@@ -2296,9 +2459,12 @@ HTML_MOVIE_DETAIL_PAGE = """
             const source = pathParts[2]; // Can be 'tmdb' or a list name like 'watched'
             const id = pathParts[3];
             
-            let allImages = [];
+            let allImages = []; // 原图地址, 只在灯箱里加载
             let currentImageIndex = 0;
 
+            // 把 TMDB 图片地址换成指定宽度 (w300 / w342 / w500 / w780 / original), 其他来源的图片原样返回
+            const tmdbImage = (url, size) => url && url.replace(/^(https:\/\/image\.tmdb\.org\/t\/p\/)[^/]+\//, `$1${size}/`);
+
             if (!source || !id) {
                 showError('错误：无效的电影链接。');
                 return;
@@ -2332,8 +2498,9 @@ HTML_MOVIE_DETAIL_PAGE = """
             }
 
             function renderAll(movie) {
-                const posterUrl = movie.posters && movie.posters.length > 0 ? movie.posters[0] : 'https://placehold.co/500x750/334155/ffffff?text=No+Poster';
-                const backgroundUrl = (movie.stills && movie.stills.length > 0 ? movie.stills[0] : posterUrl);
+                const posterUrl = movie.posters && movie.posters.length > 0 ? tmdbImage(movie.posters[0], 'w500') : 'https://placehold.co/500x750/334155/ffffff?text=No+Poster';
+                // 背景图是模糊处理过的, w780 足够
+                const backgroundUrl = (movie.stills && movie.stills.length > 0 ? tmdbImage(movie.stills[0], 'w780') : posterUrl);
 
                 dom.bgImage.style.backgroundImage = `url('${backgroundUrl}')`;
                 dom.poster.src = posterUrl;
@@ -2382,18 +2549,30 @@ HTML_MOVIE_DETAIL_PAGE = """
             }
 
             function renderGallery(posters, stills) {
-                allImages = [...new Set([...posters, ...stills])];
+                // 海报在前、剧照在后; 同一个 TMDB 文件只保留第一次出现的那张 (换成同一尺寸后比较地址)
+                const seen = new Set();
+                const thumbnails = [];
+                allImages = [];
+                for (const [urls, size] of [[posters, 'w342'], [stills, 'w300']]) {
+                    for (const url of urls) {
+                        const file = tmdbImage(url, 'original');
+                        if (seen.has(file)) continue;
+                        seen.add(file);
+                        allImages.push(url);
+                        thumbnails.push(tmdbImage(url, size));
+                    }
+                }
                 dom.gallery.innerHTML = '';
                 if (allImages.length === 0) {
                     dom.gallery.innerHTML = '<p class="text-stone-400">暂无海报或剧照</p>';
                     return;
                 }
                 
-                allImages.forEach((imgUrl, index) => {
+                thumbnails.forEach((thumbnail, index) => {
                     const isHidden = index >= 8 ? 'hidden' : '';
                     dom.gallery.innerHTML += `
                         <div data-index="${index}" class="gallery-item ${isHidden} block rounded-lg overflow-hidden aspect-video transform hover:scale-105 transition-transform duration-300 cursor-pointer">
-                            <img src="${imgUrl}" loading="lazy" class="w-full h-full object-cover" onerror="this.parentElement.style.display='none'">
+                            <img src="${thumbnail}" loading="lazy" class="w-full h-full object-cover" onerror="this.parentElement.style.display='none'">
                         </div>
                     `;
                 });
@@ -2465,94 +2644,211 @@ HTML_MOVIE_DETAIL_PAGE = """
 # ==============================================================================
 # --- TMDB 辅助函数 ---
 # ==============================================================================
-def get_enriched_tmdb_details(tmdb_id: int, media_type: str, poster_lang: str):
-    """获取一个电影的完整中英文信息并合并。"""
-    # Fetch Chinese data (primary)
-    details_zh = get_tmdb_details(tmdb_id, media_type, 'zh-CN', poster_lang)
+# 所有 TMDB 请求共用一个带连接池和自动重试的客户端, 复用 keep-alive 连接
+tmdb_client = TmdbClient(TMDB_API_KEY, TMDB_API_BASE_URL)
+# 成功的详情/搜索响应缓存到磁盘, 重启后以及 Excel 导入时都可以复用
+tmdb_cache = TmdbCache(TMDB_CACHE_FILE, max_bytes=int(TMDB_CACHE_MAX_MB * 1024 * 1024), default_ttl=TMDB_DETAILS_TTL)
+
+TMDB_DETAILS_APPEND = 'credits,images,recommendations'
+# 'full' 模式下英文详情在这个线程池里和中文详情并发获取
+tmdb_lang_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tmdb-en')
+
+def get_enriched_tmdb_details(tmdb_id: int, media_type: str, poster_lang: str, use_cache: bool = True):
+    """获取一个电影的完整中英文信息并合并。use_cache=False 时不读磁盘缓存, 总是请求 TMDB (结果仍写回缓存)。"""
+    if TMDB_TAGLINE_SOURCE != 'full':
+        details_zh = get_tmdb_details(tmdb_id, media_type, 'zh-CN', poster_lang,
+                                      append=TMDB_DETAILS_APPEND + ',translations', use_cache=use_cache)
+        if not details_zh:
+            return None
+        details_zh['tagline_en'] = english_tagline(details_zh.pop('translations', None))
+        return details_zh
+
+    # 英文详情只用来取标语, 和中文详情同时发出, 总耗时约为一次请求
+    future_en = tmdb_lang_executor.submit(get_tmdb_details, tmdb_id, media_type, 'en-US', poster_lang,
+                                          use_cache=use_cache)
+    details_zh = get_tmdb_details(tmdb_id, media_type, 'zh-CN', poster_lang, use_cache=use_cache)
+    details_en = future_en.result()
     if not details_zh:
         return None
-    
-    # Fetch English data (for tagline)
-    details_en = get_tmdb_details(tmdb_id, media_type, 'en-US', poster_lang)
-    
-    # Merge data
     details_zh['tagline_en'] = details_en.get('tagline', '') if details_en else ''
-    
     return details_zh
 
-def convert_excel_to_json(excel_path, json_path, poster_lang):
-    """从Excel文件转换数据到JSON格式, 并用TMDB数据进行丰富。"""
+def is_enriched_details_cached(tmdb_id, media_type, poster_lang):
+    """get_enriched_tmdb_details 需要的响应是否都已在磁盘缓存中。"""
+    if TMDB_TAGLINE_SOURCE != 'full':
+        requests_needed = [('zh-CN', TMDB_DETAILS_APPEND + ',translations')]
+    else:
+        requests_needed = [('zh-CN', TMDB_DETAILS_APPEND), ('en-US', TMDB_DETAILS_APPEND)]
+    return all(tmdb_cache.contains(TmdbCache.make_key('details', tmdb_id, media_type, lang, poster_lang, append))
+               for lang, append in requests_needed)
+
+class RecommendationPrefetcher:
+    """
+    详情页被打开后, 在后台预取它推荐的电影详情, 用户点进推荐时 (/api/tmdb_data) 就能直接命中缓存。
+
+    只有一个低优先级的后台线程, 每分钟最多预取 per_minute 部; 已经缓存的、已经在队列里的都会跳过。
+    队列最多保留 max_queue 部, 满了之后丢弃最早提交的。
+    """
+
+    def __init__(self, fetch, is_cached, per_minute=30, max_queue=100):
+        self.fetch = fetch
+        self.is_cached = is_cached
+        self.per_minute = per_minute
+        self.max_queue = max_queue
+        self.prefetched = 0
+        self.skipped = 0
+        self._queue = OrderedDict()  # (tmdb_id, media_type, poster_lang) -> None
+        self._recent = deque()  # 最近一分钟内每次预取的时间
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, recommendations, poster_lang):
+        if self.per_minute <= 0:
+            return
+        with self._cond:
+            for rec in recommendations or []:
+                key = (rec.get('id'), rec.get('media_type'), poster_lang)
+                if key[0] is None or key[1] not in ('movie', 'tv') or key in self._queue:
+                    continue
+                self._queue[key] = None
+                while len(self._queue) > self.max_queue:
+                    self._queue.popitem(last=False)
+            if self._thread is None:
+                # 第一次用到时才启动, 多进程部署时每个 worker 在 fork 之后各自启动
+                self._thread = threading.Thread(target=self._run, name='recommendation-prefetch', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                key, _ = self._queue.popitem(last=False)
+            try:
+                if self.is_cached(*key):
+                    self.skipped += 1
+                    continue
+                self._wait_for_budget()
+                self.fetch(*key)
+                self.prefetched += 1
+            except Exception as e:
+                print(f"预取推荐 {key[1]}/{key[0]} 失败: {e}")
+
+    def _wait_for_budget(self):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.per_minute:
+            time.sleep(60 - (now - self._recent.popleft()))
+        self._recent.append(time.monotonic())
+
+recommendation_prefetcher = RecommendationPrefetcher(get_enriched_tmdb_details, is_enriched_details_cached,
+                                                     per_minute=TMDB_PREFETCH_PER_MINUTE)
+
+def english_tagline(translations):
+    """从 append_to_response=translations 的结果里取英文标语, 优先 en-US。"""
+    english = [t for t in (translations or {}).get('translations', []) if t.get('iso_639_1') == 'en']
+    english.sort(key=lambda t: t.get('iso_3166_1') != 'US')
+    return (english[0].get('data') or {}).get('tagline', '') if english else ''
+
+EXCEL_SHEET_MAP = {'看过的电影': 'watched', '在看的电影': 'watching', '想看的电影': 'wantToWatch'}
+
+def read_excel_rows(excel_path):
+    """按工作表和行的顺序读出 [(status_key, record), ...], 文件无法读取时返回 None。"""
     try:
         xls = pd.ExcelFile(excel_path)
     except Exception as e:
         print(f"读取Excel文件时发生错误: {e}")
-        return False
+        return None
 
-    all_data = {"watched": [], "watching": [], "wantToWatch": []}
-    sheet_map = {'看过的电影': 'watched', '在看的电影': 'watching', '想看的电影': 'wantToWatch'}
-    
-    existing_tmdb_ids = {}
-    if os.path.exists(json_path):
-        with file_lock:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                try:
-                    all_data = json.load(f)
-                    for status, movies in all_data.items():
-                        for movie in movies:
-                            tmdb_id_str = movie.get('id', '').split('-')[-1]
-                            if tmdb_id_str.isdigit():
-                                existing_tmdb_ids[int(tmdb_id_str)] = True
-                except json.JSONDecodeError:
-                    pass
-
-    for sheet_name, status_key in sheet_map.items():
+    rows = []
+    for sheet_name, status_key in EXCEL_SHEET_MAP.items():
         if sheet_name in xls.sheet_names:
             try:
                 df = pd.read_excel(xls, sheet_name=sheet_name).fillna('')
-                records = df.to_dict('records')
-                print(f"\n--- Processing sheet: {sheet_name} ---")
-                for record in records:
-                    title = record.get('标题')
-                    year = str(record.get('年份', ''))
-                    if not title:
-                        continue
-
-                    print(f"Processing '{title}' ({year})...")
-                    search_results = search_tmdb(title, year)
-                    
-                    if search_results:
-                        top_result = search_results[0]
-                        tmdb_id = top_result['tmdb_id']
-                        media_type = top_result['media_type']
-                        
-                        if tmdb_id in existing_tmdb_ids:
-                            print(f"  -> Skipping '{title}', as TMDB ID {tmdb_id} already exists in the lists.")
-                            continue
-
-                        details = get_enriched_tmdb_details(tmdb_id, media_type, poster_lang)
-                        if details:
-                            movie_object = format_tmdb_details_to_movie_object(details, media_type, f"{status_key}-{tmdb_id}")
-                            if not movie_object['posters']:
-                                movie_object['posters'] = [p for p in str(record.get('海报链接', '')).split() if p.startswith('http')]
-                            if not movie_object['stills']:
-                                movie_object['stills'] = [s for s in str(record.get('剧照链接', '')).split() if s.startswith('http')]
-                            
-                            all_data[status_key].insert(0, movie_object)
-                            existing_tmdb_ids[tmdb_id] = True
-                            print(f"  -> Success: Found and added '{title}' with TMDB ID {tmdb_id}.")
-                        else:
-                            print(f"  -> Warning: Could not fetch details for TMDB ID {tmdb_id}.")
-                    else:
-                        print(f"  -> Warning: Could not find '{title}' ({year}) on TMDB. Skipping.")
-                    time.sleep(0.5)
+                rows.extend((status_key, record) for record in df.to_dict('records') if record.get('标题'))
             except Exception as e:
                 print(f"处理Sheet '{sheet_name}' 时出错: {e}")
-    
+    return rows
+
+def resolve_excel_row(record, store, poster_lang):
+    """
+    为一行 Excel 数据搜索 TMDB 并获取详情, 在工作线程里执行。
+
+    Returns:
+        tuple: (tmdb_id, media_type, details); 搜索不到时为 None, 已在库中时 details 为 None 且不再请求详情。
+    """
+    search_results = search_tmdb(record.get('标题'), str(record.get('年份', '')))
+    if not search_results:
+        return None
+    tmdb_id = search_results[0]['tmdb_id']
+    media_type = search_results[0]['media_type']
+    if store.find_by_tmdb_id(tmdb_id):
+        return tmdb_id, media_type, None
+    return tmdb_id, media_type, get_enriched_tmdb_details(tmdb_id, media_type, poster_lang)
+
+def resolve_excel_rows(rows, store, poster_lang):
+    """
+    在线程池里并发处理所有行, 同时处理的行数受 TMDB_IMPORT_CONCURRENCY 限制;
+    结果顺序与 rows 一致, 处理出错的行对应的结果是异常对象。
+    """
+    def resolve(record):
+        try:
+            return resolve_excel_row(record, store, poster_lang)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=TMDB_IMPORT_CONCURRENCY, thread_name_prefix='excel-import') as pool:
+        return list(pool.map(resolve, [record for _, record in rows]))
+
+def convert_excel_to_json(excel_path, store, poster_lang):
+    """
+    从Excel文件转换数据并用TMDB数据进行丰富, 结果写入电影库。
+
+    各行的 TMDB 请求并发进行 (总速率仍受 tmdb_client 的限流器约束), 写入电影库则按工作表和行的顺序
+    逐条进行, 所以导入结果和逐行处理时完全一样。
+    """
+    rows = read_excel_rows(excel_path)
+    if rows is None:
+        return False
+
+    print(f"\n--- Resolving {len(rows)} rows on TMDB ---")
+    resolved = resolve_excel_rows(rows, store, poster_lang)
+    imported = set()
+    for (status_key, record), result in zip(rows, resolved):
+        title = record.get('标题')
+        year = str(record.get('年份', ''))
+        print(f"Processing '{title}' ({year})...")
+        if isinstance(result, Exception):
+            print(f"  -> Error: {result}")
+            continue
+        if result is None:
+            print(f"  -> Warning: Could not find '{title}' ({year}) on TMDB. Skipping.")
+            continue
+
+        tmdb_id, media_type, details = result
+        if tmdb_id in imported or store.find_by_tmdb_id(tmdb_id):
+            print(f"  -> Skipping '{title}', as TMDB ID {tmdb_id} already exists in the lists.")
+            continue
+        if not details:
+            print(f"  -> Warning: Could not fetch details for TMDB ID {tmdb_id}.")
+            continue
+
+        movie_object = format_tmdb_details_to_movie_object(details, media_type, f"{status_key}-{tmdb_id}", poster_lang)
+        if not movie_object['posters']:
+            movie_object['posters'] = [p for p in str(record.get('海报链接', '')).split() if p.startswith('http')]
+        if not movie_object['stills']:
+            movie_object['stills'] = [s for s in str(record.get('剧照链接', '')).split() if s.startswith('http')]
+
+        # 导入过程不需要逐条等待落盘, 结束时统一 flush
+        store.add(status_key, movie_object, durable=False)
+        imported.add(tmdb_id)
+        print(f"  -> Success: Found and added '{title}' with TMDB ID {tmdb_id}.")
+
     try:
-        with file_lock:
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(all_data, f, ensure_ascii=False, indent=4)
-        print(f"\n成功将数据转换并保存到 {json_path}")
+        store.flush()
+        print(f"\n成功将数据转换并保存到 {store.path}")
         return True
     except Exception as e:
         print(f"写入JSON文件时出错: {e}")
@@ -2560,14 +2856,15 @@ def convert_excel_to_json(excel_path, json_path, poster_lang):
 
 def search_tmdb(query: str, year: str = None):
     """使用TMDB API搜索电影和剧集。"""
-    search_url = f"{TMDB_API_BASE_URL}/search/multi"
-    params = {'api_key': TMDB_API_KEY, 'query': query, 'language': 'zh-CN', 'include_adult': False}
+    cache_key = TmdbCache.make_key('search', query, year)
+    cached = tmdb_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    params = {'query': query, 'language': 'zh-CN', 'include_adult': False}
     if year:
         params['primary_release_year'] = year
     try:
-        response = requests.get(search_url, params=params, timeout=10)
-        response.raise_for_status()
-        results = response.json().get('results', [])
+        results = tmdb_client.get('/search/multi', params, timeout=10).get('results', [])
         formatted_results = []
         for item in results:
             media_type = item.get('media_type')
@@ -2578,29 +2875,42 @@ def search_tmdb(query: str, year: str = None):
                 'tmdb_id': item.get('id'), 'media_type': media_type, 'title': title, 'year': release_year,
                 'overview': item.get('overview', ''), 'poster_path': item.get('poster_path')
             })
+        tmdb_cache.put(cache_key, formatted_results, ttl=TMDB_SEARCH_TTL)
         return formatted_results
     except requests.RequestException as e:
         print(f"Error searching TMDB: {e}")
         return None
 
-def get_tmdb_details(tmdb_id: int, media_type: str, lang: str, poster_lang: str):
-    """获取指定ID的电影或剧集的详细信息, 包含推荐。"""
-    details_url = f"{TMDB_API_BASE_URL}/{media_type}/{tmdb_id}"
+def get_tmdb_details(tmdb_id: int, media_type: str, lang: str, poster_lang: str, append: str = TMDB_DETAILS_APPEND,
+                     use_cache: bool = True):
+    """
+    获取指定ID的电影或剧集的详细信息, append 是随详情一起返回的附加数据 (默认演员、图片和推荐)。
+    use_cache=False 时跳过缓存读取, 但新响应照样写进缓存。
+    """
+    cache_key = TmdbCache.make_key('details', tmdb_id, media_type, lang, poster_lang, append)
+    cached = tmdb_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        return cached
     params = {
-        'api_key': TMDB_API_KEY, 'language': lang,
-        'append_to_response': 'credits,images,recommendations',
+        'language': lang,
+        'append_to_response': append,
         'include_image_language': poster_lang
     }
     try:
-        response = requests.get(details_url, params=params, timeout=15)
-        response.raise_for_status()
-        return response.json()
+        details = tmdb_client.get(f"/{media_type}/{tmdb_id}", params, timeout=15)
+        tmdb_cache.put(cache_key, details)
+        return details
     except requests.RequestException as e:
         print(f"Error getting TMDB details for lang {lang}: {e}")
         return None
 
-def format_tmdb_details_to_movie_object(details, media_type, movie_id=None):
-    """将TMDB的详细信息格式化为我们应用内部的电影对象结构。"""
+def format_tmdb_details_to_movie_object(details, media_type, movie_id=None, poster_lang=None):
+    """
+    将TMDB的详细信息格式化为我们应用内部的电影对象结构。
+
+    要存进电影库的记录应传入获取详情时用的 poster_lang, 它会保存在记录里, 之后的后台刷新沿用同一种海报语言。
+    海报/剧照只保存 TMDB 的 file_path (如 '/abc.jpg'), 返回给客户端之前用 project_movie() 按尺寸拼成完整地址。
+    """
     if not details:
         return None
     
@@ -2614,10 +2924,10 @@ def format_tmdb_details_to_movie_object(details, media_type, movie_id=None):
         rec_media_type = r.get('media_type', media_type)
         recommendations_list.append({'id': r.get('id'), 'title': r.get('title') or r.get('name'), 'poster_path': r.get('poster_path'), 'media_type': rec_media_type})
 
-    posters = [f"{TMDB_IMAGE_BASE_URL}{p['file_path']}" for p in details.get('images', {}).get('posters', [])]
-    stills = [f"{TMDB_IMAGE_BASE_URL}{b['file_path']}" for b in details.get('images', {}).get('backdrops', [])]
+    posters = [p['file_path'] for p in details.get('images', {}).get('posters', [])]
+    stills = [b['file_path'] for b in details.get('images', {}).get('backdrops', [])]
     
-    return {
+    movie = {
         'id': movie_id or f"tmdb-{details.get('id')}",
         'media_type': media_type,
         'title': title, 'year': year, 'director': ', '.join(directors_list), 
@@ -2630,8 +2940,12 @@ def format_tmdb_details_to_movie_object(details, media_type, movie_id=None):
         'rating': details.get('vote_average', 0),
         'budget': details.get('budget', 0),
         'revenue': details.get('revenue', 0),
-        'recommendations': recommendations_list
+        'recommendations': recommendations_list,
+        'enriched_at': int(time.time())
     }
+    if poster_lang:
+        movie['poster_lang'] = poster_lang
+    return movie
 
 # ==============================================================================
 # --- 启动时任务 (STARTUP TASKS) ---
@@ -2650,6 +2964,39 @@ with app.app_context():
             json.dump({"watched": [], "watching": [], "wantToWatch": []}, f, ensure_ascii=False, indent=2)
     print("服务器启动，所有目录和数据文件已准备就绪。")
 
+if MOVIE_STORE_BACKEND == 'sqlite':
+    # 大型电影库: 存放在 SQLite 中 (先用 `python movie_store.py migrate movies.json movies.db` 迁移)
+    movie_store = SqliteMovieStore(MOVIE_DB_FILE)
+else:
+    if MOVIE_SNAPSHOT_FILE != CACHE_JSON:
+        # 多个 worker 同时启动时只让一个去导入
+        with InterProcessLock(os.path.splitext(MOVIE_SNAPSHOT_FILE)[0] + '.lock'):
+            if not os.path.exists(MOVIE_SNAPSHOT_FILE):
+                count = convert_snapshot(CACHE_JSON, MOVIE_SNAPSHOT_FILE)
+                print(f"已将 {count} 部电影从 {CACHE_JSON} 导入到 {MOVIE_SNAPSHOT_FILE}")
+    # 电影库只在启动时解析一次, 之后读写都走内存; 修改以追加日志的形式由后台线程异步落盘
+    movie_store = MovieStore(MOVIE_SNAPSHOT_FILE, flush_interval=MOVIE_STORE_FLUSH_INTERVAL,
+                             compact_bytes=MOVIE_JOURNAL_COMPACT_BYTES,
+                             group_commit_window=MOVIE_STORE_GROUP_COMMIT_WINDOW,
+                             shared=MULTI_PROCESS)
+atexit.register(movie_store.close)
+atexit.register(tmdb_client.close)
+atexit.register(tmdb_cache.close)
+
+# hub_data.json / chat_log.json 的 "读-改-写" 在所有 worker 进程之间串行化
+hub_lock = InterProcessLock(HUB_LOCK_FILE)
+
+# 库内检索的倒排索引: 启动时全量构建, 之后随增删、导入的每条修改记录增量更新
+library_index = LibrarySearchIndex()
+library_index.rebuild(movie_store)
+movie_store.add_listener(library_index.apply_change)
+
+@app.before_request
+def refresh_movie_store():
+    # 多进程部署时其他 worker 可能刚修改过电影库; 没有变化时这里只是一次 stat
+    if request.path.startswith('/api/'):
+        movie_store.refresh()
+
 # ==============================================================================
 # --- 页面路由 (HTML PAGE ROUTES) ---
 # ==============================================================================
@@ -2678,22 +3025,29 @@ def load_hub_data():
     with open(HUB_DATA_FILE, 'r', encoding='utf-8') as f:
         return jsonify(json.load(f))
 
+def write_json_atomic(path, data):
+    """先写临时文件再原子替换, 其他进程读到的要么是旧文件要么是新文件, 不会读到一半。"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
 @app.route('/save_data', methods=['POST'])
 def save_hub_data():
-    with open(HUB_DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(request.json, f, ensure_ascii=False, indent=2)
+    with hub_lock:
+        write_json_atomic(HUB_DATA_FILE, request.json)
     return jsonify({"status": "success"})
 
 @app.route('/save_chat', methods=['POST'])
 def save_chat():
-    logs = []
-    if os.path.exists(CHAT_LOG_FILE):
-        try:
-            with open(CHAT_LOG_FILE, 'r', encoding='utf-8') as f: logs = json.load(f)
-        except json.JSONDecodeError: pass
-    logs.append({"role": request.json.get('role'), "content": request.json.get('content'), "timestamp": datetime.utcnow().isoformat()})
-    with open(CHAT_LOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(logs, f, ensure_ascii=False, indent=2)
+    with hub_lock:
+        logs = []
+        if os.path.exists(CHAT_LOG_FILE):
+            try:
+                with open(CHAT_LOG_FILE, 'r', encoding='utf-8') as f: logs = json.load(f)
+            except json.JSONDecodeError: pass
+        logs.append({"role": request.json.get('role'), "content": request.json.get('content'), "timestamp": datetime.utcnow().isoformat()})
+        write_json_atomic(CHAT_LOG_FILE, logs)
     return jsonify({"status": "ok"})
 
 @app.route('/load_chat', methods=['GET'])
@@ -2776,48 +3130,417 @@ def handle_disconnect():
 # ==============================================================================
 # --- MOVIE API 端点 ---
 # ==============================================================================
+# 电影墙卡片只用得到这些字段, 大字段 (全部海报/剧照、演员、推荐) 留给详情接口
+SUMMARY_FIELDS = ('id', 'media_type', 'title', 'year', 'director', 'actors_string', 'rating', 'poster', 'still')
+MAX_PAGE_SIZE = 500
+
+def library_etag(variant=b''):
+    """由存储实例ID和版本号组成的强 ETag, 电影库内容不变时它也不变; variant 区分同一版本的不同表示。"""
+    etag = f"{movie_store.instance_id}-{movie_store.version}"
+    if variant:
+        etag += '-' + hashlib.md5(variant).hexdigest()[:8]
+    return etag
+
+# 不指定尺寸时海报和剧照都返回原图地址
+ORIGINAL_IMAGE_SIZES = ('original', 'original')
+
+def project_movie(movie, fields, sizes=ORIGINAL_IMAGE_SIZES):
+    """
+    把电影库记录 (MovieRecord 或 dict) 转成响应里的 dict。
+
+    只保留 fields 中列出的字段, fields 为空时返回完整对象; poster / still 是第一张海报 / 剧照的派生字段。
+    sizes 是 (海报尺寸, 剧照尺寸), 图片地址按这个尺寸拼接。dict 里的海报/剧照可以是完整地址,
+    也可以只有 file_path (修改记录和 format_tmdb_details_to_movie_object 的结果)。
+    """
+    poster_size, still_size = sizes
+    if not fields:
+        return MovieRecord.coerce(movie).to_dict(image_base(poster_size), image_base(still_size))
+    projected = {'id': movie.get('id')}
+    for field in fields:
+        if field == 'poster':
+            projected['poster'] = first_image(movie, 'posters', poster_size)
+        elif field == 'still':
+            projected['still'] = first_image(movie, 'stills', still_size)
+        elif field in ('posters', 'stills') and field in movie:
+            projected[field] = images(movie, field, poster_size if field == 'posters' else still_size)
+        elif field == 'actors_string' and 'actors_string' not in movie:
+            # 旧的Excel导入数据里 actors 本身就是字符串
+            actors = movie.get('actors', '')
+            projected['actors_string'] = actors if isinstance(actors, str) else ', '.join(a.get('name', '') for a in actors)
+        elif field in movie:
+            projected[field] = movie[field]
+    return projected
+
+def parse_image_sizes(args):
+    """
+    解析 poster_size / still_size 参数 (TMDB 的图片宽度, 如 w342 / w780), 默认都是原图。
+
+    电影墙和拼接视图只需要缩略图, 请求较小的尺寸可以省掉大量原图流量; 尺寸不合法时抛出 ValueError。
+    """
+    poster_size = args.get('poster_size', 'original')
+    still_size = args.get('still_size', 'original')
+    if poster_size not in POSTER_SIZES:
+        raise ValueError(f"poster_size must be one of {', '.join(POSTER_SIZES)}")
+    if still_size not in STILL_SIZES:
+        raise ValueError(f"still_size must be one of {', '.join(STILL_SIZES)}")
+    return poster_size, still_size
+
+def parse_listing_args(args):
+    """解析 /api/movies 的 fields / list / limit / cursor / poster_size / still_size 参数, 参数不合法时抛出 ValueError。"""
+    fields = args.get('fields')
+    if fields == 'summary':
+        fields = SUMMARY_FIELDS
+    elif fields:
+        fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+    list_name = args.get('list')
+    if list_name is not None and list_name not in LIST_NAMES:
+        raise ValueError(f"Unknown list '{list_name}'")
+    limit = args.get('limit', type=int)
+    offset = int(args.get('cursor') or 0)
+    if (limit is not None or offset) and list_name is None:
+        raise ValueError("Pagination requires the 'list' parameter")
+    if (limit is not None and not 0 < limit <= MAX_PAGE_SIZE) or offset < 0:
+        raise ValueError("Invalid limit or cursor")
+    return fields, list_name, limit, offset, parse_image_sizes(args)
+
+def build_listing(fields, list_name, limit, offset, sizes=ORIGINAL_IMAGE_SIZES):
+    """
+    按查询参数构造电影列表响应。
+
+    不带 list 时保持原来的 {watched: [...], watching: [...], wantToWatch: [...]} 结构;
+    带 list 时返回单个列表的一页: {"items": [...], "total": n, "next_cursor": "..." 或 null}。
+    """
+    if list_name is None:
+        return {name: [project_movie(m, fields, sizes) for m in movies] for name, movies in movie_store.snapshot().items()}
+    movies, total = movie_store.page(list_name, offset, limit)
+    movies = [project_movie(m, fields, sizes) for m in movies]
+    next_offset = offset + len(movies)
+    return {"items": movies, "total": total, "next_cursor": str(next_offset) if next_offset < total else None}
+
+class LibraryResponseCache:
+    """
+    按电影库版本缓存序列化好的 JSON 响应体, 以及它的 gzip / brotli 压缩版本。
+
+    条目以完整 ETag (实例ID + 版本号 + 查询参数) 为键; 一旦版本号变化 (增删、上传),
+    旧版本的条目会在下一次访问时被整体丢弃, 不会出现新旧数据混杂的情况。
+    压缩版本在第一次被请求时生成, 之后同一版本的请求直接复用。
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._generation = None
+        self._entries = OrderedDict()
+
+    def get(self, generation, key):
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, generation, key, body):
+        entry = {'identity': body}
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def encode(entry, encoding):
+        body = entry.get(encoding)
+        if body is None:
+            if encoding == 'br':
+                body = brotli.compress(entry['identity'], quality=9)
+            else:
+                body = gzip.compress(entry['identity'], compresslevel=6)
+            entry[encoding] = body
+        return body
+
+library_response_cache = LibraryResponseCache()
+
+def negotiate_encoding():
+    """按 Accept-Encoding 选择响应的压缩方式: 优先 brotli, 其次 gzip。"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+def http_last_modified(last_modified):
+    """
+    Last-Modified 头的值。HTTP 日期只精确到秒, 最后一次修改所在的那一秒还没过完时,
+    同一秒内可能还会有修改, 这时返回 None, 不发送这个头, 客户端也就不会拿它来做条件请求。
+    """
+    if int(last_modified) >= int(time.time()):
+        return None
+    return datetime.fromtimestamp(int(last_modified), timezone.utc)
+
+def is_library_not_modified(etag, modified):
+    """按 If-None-Match (优先) 或 If-Modified-Since 判断客户端手里的电影库是否仍然有效, modified 见 http_last_modified()。"""
+    if request.if_none_match:
+        # 带了 If-None-Match 时只看 ETag; 压缩后的表示使用带编码后缀的 ETag, 它们对应的内容同样没有变化
+        return any(request.if_none_match.contains(tag) for tag in (etag, f"{etag}-gzip", f"{etag}-br"))
+    if request.if_modified_since:
+        return modified is not None and request.if_modified_since >= modified
+    return False
+
 @app.route('/api/movies', methods=['GET'])
 def get_movies():
-    if not os.path.exists(CACHE_JSON):
-        return jsonify({"watched": [], "watching": [], "wantToWatch": []}), HTTPStatus.NOT_FOUND, {"X-Error": "Cache file not found. Please upload an Excel file first."}
     try:
-        with file_lock:
-            with open(CACHE_JSON, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        return jsonify(data)
+        listing_args = parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), HTTPStatus.BAD_REQUEST
+    # 分页时后续各页带上第一页的版本号; 版本已经变化时偏移量会错位, 让客户端从头重新加载
+    pinned_version = request.args.get('version', type=int)
+    try:
+        encoding = negotiate_encoding()
+        with movie_store.lock:
+            generation, version = library_etag(), movie_store.version
+            if pinned_version is not None and pinned_version != version:
+                return jsonify({"detail": "Library changed during pagination, restart from the first page.",
+                                "version": version}), HTTPStatus.CONFLICT
+            # 和 version 在同一把锁里读取, 保证 Last-Modified 与这次返回的内容对应
+            etag, modified = library_etag(request.query_string), http_last_modified(movie_store.last_modified)
+            not_modified = is_library_not_modified(etag, modified)
+            entry = None if not_modified else library_response_cache.get(generation, etag)
+            data = None if (not_modified or entry) else build_listing(*listing_args)
+        if not_modified:
+            response = Response(status=HTTPStatus.NOT_MODIFIED)
+        else:
+            if entry is None:
+                body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                entry = library_response_cache.put(generation, etag, body)
+            if encoding == 'identity':
+                response = Response(entry['identity'], mimetype='application/json')
+            else:
+                response = Response(LibraryResponseCache.encode(entry, encoding), mimetype='application/json')
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag if encoding == 'identity' else f"{etag}-{encoding}")
+        if modified is not None:
+            response.last_modified = modified
+        response.headers['Vary'] = 'Accept-Encoding'
+        # 浏览器每次都带着 ETag 回来确认, 没变化时只需要一个 304
+        response.headers['Cache-Control'] = 'no-cache'
+        # 客户端据此调用 /api/movies/changes 做增量同步
+        response.headers['X-Library-Version'] = str(version)
+        return response
     except Exception as e:
-        return jsonify({"detail": f"Error reading cache file: {e}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+        return jsonify({"detail": f"Error reading movie library: {e}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+def project_change(change, fields, sizes):
+    """按 fields / sizes 精简修改记录中的电影对象, batch 记录逐项处理。"""
+    if change.get('op') == 'batch':
+        return dict(change, ops=[project_change(op, fields, sizes) for op in change['ops']])
+    if 'movie' in change:
+        return dict(change, movie=project_movie(change['movie'], fields, sizes))
+    return change
+
+@app.route('/api/movies/changes', methods=['GET'])
+def get_movie_changes():
+    """
+    返回 since 版本之后的增量修改 (add / delete / move / clear)。
+
+    历史已被压缩掉时返回 {"resync": true}, 客户端应该重新拉取 /api/movies。
+    可选的 fields / poster_size / still_size 参数和 /api/movies 一样, 用于精简 add / update 记录中的电影对象。
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"detail": "Query parameter 'since' is required."}), HTTPStatus.BAD_REQUEST
+    try:
+        fields, _, _, _, sizes = parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), HTTPStatus.BAD_REQUEST
+    with movie_store.lock:
+        version = movie_store.version
+        changes = movie_store.changes_since(since)
+    if changes is None:
+        return jsonify({"version": version, "resync": True})
+    # 修改记录里的海报/剧照只有 file_path, 总要拼成完整地址
+    changes = [project_change(c, fields, sizes) for c in changes]
+    return jsonify({"version": version, "resync": False, "changes": changes})
+
+@app.route('/api/library/search', methods=['GET'])
+def search_library():
+    """
+    在自己的电影库中检索 (不访问TMDB)。
+
+    参数: q, year_from, year_to, min_rating, media_type, list, sort (relevance/year/rating/title),
+    order (asc/desc), limit, cursor, poster_size, still_size。返回 {"items": [...], "total": n, "next_cursor": ...},
+    items 使用 summary 投影并带上所在列表 list。
+    """
+    args = request.args
+    sort = args.get('sort', 'relevance')
+    list_name = args.get('list')
+    limit = args.get('limit', 50, type=int)
+    offset = args.get('cursor', 0, type=int)
+    if sort not in SORT_KEYS or (list_name and list_name not in LIST_NAMES):
+        return jsonify({"detail": "Invalid sort or list."}), HTTPStatus.BAD_REQUEST
+    if not 0 < limit <= MAX_PAGE_SIZE or offset < 0:
+        return jsonify({"detail": "Invalid limit or cursor."}), HTTPStatus.BAD_REQUEST
+    try:
+        sizes = parse_image_sizes(args)
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), HTTPStatus.BAD_REQUEST
+    default_order = 'asc' if sort == 'title' else 'desc'
+    hits, total = library_index.search(
+        query=args.get('q', ''),
+        year_from=args.get('year_from', type=int),
+        year_to=args.get('year_to', type=int),
+        min_rating=args.get('min_rating', type=float),
+        media_type=args.get('media_type'),
+        list_name=list_name,
+        sort=sort,
+        descending=args.get('order', default_order) == 'desc',
+        offset=offset,
+        limit=limit,
+    )
+    items = []
+    for hit_list, movie_id, score in hits:
+        movie = movie_store.get(hit_list, movie_id)
+        if movie:
+            items.append(dict(project_movie(movie, SUMMARY_FIELDS, sizes), list=hit_list, score=round(score, 2)))
+    next_offset = offset + len(hits)
+    return jsonify({"items": items, "total": total, "next_cursor": str(next_offset) if next_offset < total else None})
+
+def resolve_movie(list_name, movie_id):
+    """
+    按 (列表名, ID) 找到电影现在的位置, 返回 (list_name, movie_id), 找不到时返回 None。
+
+    电影换过列表后, 旧链接里的列表名和ID (如 wantToWatch/wantToWatch-123) 仍然能解析:
+    带TMDB ID的通过TMDB ID索引找到新ID, 旧的Excel导入ID移动时不改写, 按ID找到所在列表。
+    """
+    if movie_store.get(list_name, movie_id) is not None:
+        return list_name, movie_id
+    tmdb_id = parse_tmdb_id(movie_id)
+    if tmdb_id is not None:
+        return movie_store.find_by_tmdb_id(tmdb_id)
+    current_list = movie_store.locate(movie_id)
+    return (current_list, movie_id) if current_list else None
+
+def refresh_stored_movie(list_name, movie_id):
+    """
+    重新从TMDB获取库中一部电影的详情并写回, 返回新记录; 电影已不在原处、没有TMDB ID或获取失败时返回 None。
+
+    海报语言沿用记录里保存的 poster_lang, 而不是触发刷新的那个用户的设置: 库里的记录是所有用户共用的。
+    """
+    movie = movie_store.get(list_name, movie_id)
+    tmdb_id = parse_tmdb_id(movie_id)
+    if movie is None or tmdb_id is None or not movie.get('media_type'):
+        return None
+    media_type = movie.get('media_type')
+    poster_lang = movie.get('poster_lang') or DEFAULT_POSTER_LANG
+
+    # 缓存里的详情可能比 enriched_at 还旧, 刷新必须真正请求 TMDB
+    details = get_enriched_tmdb_details(tmdb_id, media_type, poster_lang, use_cache=False)
+    if not details:
+        return None
+    enriched_movie = format_tmdb_details_to_movie_object(details, media_type, movie_id, poster_lang)
+    if not enriched_movie['posters']: enriched_movie['posters'] = movie.get('posters', [])
+    if not enriched_movie['stills']: enriched_movie['stills'] = movie.get('stills', [])
+    # 刷新期间电影可能被删除或移走, update 会返回 False, 不会把它加回来
+    if not movie_store.update(list_name, enriched_movie):
+        return None
+    return enriched_movie
+
+movie_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='movie-refresh')
+_refreshing_movies = set()
+_refreshing_lock = threading.Lock()
+
+def schedule_movie_refresh(list_name, movie_id, poster_lang=None):
+    """
+    在后台刷新一部电影; 同一部电影已经在刷新时不重复提交。
+
+    带TMDB ID的记录刷新后写回电影库; 没有TMDB ID的旧Excel导入数据只把搜索结果和详情预取进TMDB缓存
+    (见 prefetch_unmatched_movie), poster_lang 是预取详情时用的海报语言。
+    """
+    with _refreshing_lock:
+        if movie_id in _refreshing_movies:
+            return
+        _refreshing_movies.add(movie_id)
+
+    def run():
+        try:
+            if parse_tmdb_id(movie_id) is None:
+                prefetch_unmatched_movie(list_name, movie_id, poster_lang or DEFAULT_POSTER_LANG)
+            else:
+                refresh_stored_movie(list_name, movie_id)
+        except Exception as e:
+            print(f"后台刷新 {movie_id} 失败: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing_movies.discard(movie_id)
+
+    movie_refresh_executor.submit(run)
+
+def prefetch_unmatched_movie(list_name, movie_id, poster_lang):
+    """在后台按标题和年份搜索一部旧Excel导入数据, 把搜索结果和第一个结果的详情存进TMDB缓存, 不修改电影库。"""
+    movie = movie_store.get(list_name, movie_id)
+    if movie is None:
+        return
+    search_results = search_tmdb(movie.get('title'), movie.get('year'))
+    if search_results:
+        get_enriched_tmdb_details(search_results[0]['tmdb_id'], search_results[0]['media_type'], poster_lang)
+
+def enrich_unmatched_movie(movie, poster_lang):
+    """
+    旧的Excel导入数据没有TMDB ID: 用按标题和年份搜索到的第一个结果的详情补全这一次的响应。
+
+    只读TMDB缓存, 不发请求; 搜索结果或详情还不在缓存里时返回 None, 由 prefetch_unmatched_movie 在后台获取。
+    搜索结果只是猜测, 不写回电影库, 用户保存的标题、年份和图片保持原样。
+    """
+    movie = movie.to_dict()
+    search_results = tmdb_cache.get(TmdbCache.make_key('search', movie.get('title'), movie.get('year')))
+    if search_results is None:
+        return None
+    if not search_results:
+        return movie
+    media_type, tmdb_id = search_results[0]['media_type'], search_results[0]['tmdb_id']
+    if not is_enriched_details_cached(tmdb_id, media_type, poster_lang):
+        return None
+    details = get_enriched_tmdb_details(tmdb_id, media_type, poster_lang)
+    if not details:
+        return None
+    enriched_movie = format_tmdb_details_to_movie_object(details, media_type, movie['id'])
+    if not enriched_movie['posters']: enriched_movie['posters'] = movie.get('posters', [])
+    if not enriched_movie['stills']: enriched_movie['stills'] = movie.get('stills', [])
+    return enriched_movie
 
 @app.route('/api/movie_data/<list_name>/<movie_id>', methods=['GET'])
 def get_single_movie_data(list_name, movie_id):
+    """
+    详情页数据, 直接由库中保存的记录返回。
+
+    带TMDB ID的记录的 enriched_at 超过 TMDB_REFRESH_AGE 时先返回旧记录, 同时在后台刷新
+    (stale-while-revalidate)。没有TMDB ID的旧Excel导入数据用TMDB缓存里已有的详情补全响应, 不写回;
+    缓存里还没有时直接返回保存的记录, 同时在后台获取 (见 enrich_unmatched_movie)。
+    """
     poster_lang = request.args.get('posterLang', 'zh,en,null')
     try:
-        with file_lock:
-            with open(CACHE_JSON, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        
-        movie = next((m for m in data.get(list_name, []) if m.get('id') == movie_id), None)
+        location = resolve_movie(list_name, movie_id)
+        movie = movie_store.get(*location) if location else None
         if not movie:
             return jsonify({"detail": "Movie not found"}), HTTPStatus.NOT_FOUND
 
-        tmdb_id_str = movie.get('id', '').split('-')[-1]
-        media_type = movie.get('media_type')
-        
-        if not (tmdb_id_str.isdigit() and media_type):
-            search_results = search_tmdb(movie.get('title'), movie.get('year'))
-            if not search_results:
-                return jsonify(movie) # Return basic data if not found
-            top_result = search_results[0]
-            media_type = top_result['media_type']
-            tmdb_id_str = str(top_result['tmdb_id'])
-        
-        details = get_enriched_tmdb_details(int(tmdb_id_str), media_type, poster_lang)
-        if details:
-            enriched_movie = format_tmdb_details_to_movie_object(details, media_type, movie_id)
-            if not enriched_movie['posters']: enriched_movie['posters'] = movie.get('posters', [])
-            if not enriched_movie['stills']: enriched_movie['stills'] = movie.get('stills', [])
-            return jsonify(enriched_movie)
-        
+        if parse_tmdb_id(location[1]) is None:
+            enriched_movie = enrich_unmatched_movie(movie, poster_lang)
+            if enriched_movie is None:
+                schedule_movie_refresh(*location, poster_lang=poster_lang)
+                movie = movie.to_dict()
+            else:
+                movie = project_movie(enriched_movie, None)
+        else:
+            enriched_at = movie.get('enriched_at')
+            if enriched_at is None or time.time() - enriched_at > TMDB_REFRESH_AGE:
+                schedule_movie_refresh(*location)
+            movie = movie.to_dict()
+        recommendation_prefetcher.submit(movie.get('recommendations'), poster_lang)
         return jsonify(movie)
     except Exception as e:
         print(f"Error in get_single_movie_data: {e}")
@@ -2828,7 +3551,9 @@ def get_tmdb_movie_data(media_type, tmdb_id):
     poster_lang = request.args.get('posterLang', 'zh,en,null')
     details = get_enriched_tmdb_details(tmdb_id, media_type, poster_lang)
     if details:
-        return jsonify(format_tmdb_details_to_movie_object(details, media_type))
+        movie = project_movie(format_tmdb_details_to_movie_object(details, media_type), None)
+        recommendation_prefetcher.submit(movie['recommendations'], poster_lang)
+        return jsonify(movie)
     return jsonify({"detail": "Failed to fetch data from TMDB"}), HTTPStatus.NOT_FOUND
 
 @app.route('/api/upload', methods=['POST'])
@@ -2843,7 +3568,7 @@ def upload_file():
     source_excel_path = os.path.join(UPLOAD_DIR, SOURCE_EXCEL_NAME)
     try:
         file.save(source_excel_path)
-        success = convert_excel_to_json(source_excel_path, CACHE_JSON, poster_lang)
+        success = convert_excel_to_json(source_excel_path, movie_store, poster_lang)
         if success:
             return jsonify({"message": f"文件 '{file.filename}' 上传成功并已处理。"})
         else:
@@ -2851,6 +3576,13 @@ def upload_file():
     except Exception as e:
         return jsonify({"detail": f"An error occurred during upload: {e}"}), HTTPStatus.INTERNAL_SERVER_ERROR
 
+@app.route('/api/tmdb_cache', methods=['GET'])
+def tmdb_cache_stats():
+    return jsonify(dict(tmdb_cache.stats(), coalesced=tmdb_client.coalesced,
+                        rate_limit=tmdb_client.limiter.rate, throttled=tmdb_client.limiter.throttled,
+                        prefetched=recommendation_prefetcher.prefetched,
+                        prefetch_skipped=recommendation_prefetcher.skipped))
+
 @app.route('/api/search', methods=['GET'])
 def search_movies_endpoint():
     query = request.args.get('query')
@@ -2859,37 +3591,69 @@ def search_movies_endpoint():
     results = search_tmdb(query)
     return jsonify(results) if results is not None else (jsonify({"detail": "Failed to fetch from TMDB."}), HTTPStatus.SERVICE_UNAVAILABLE)
 
+def not_yet_durable(body, error):
+    """修改已经生效但还没落盘 (写线程会继续重试): 返回 202 而不是 500, 免得客户端以为修改没有发生。"""
+    return jsonify({**body, "durable": False, "detail": str(error)}), HTTPStatus.ACCEPTED
+
+def commit_movie_change(change):
+    """
+    在电影库事务里执行 change(), 等修改落盘后再返回响应; 修改电影库的路由都经过这里。
+
+    change() 在锁内做 "先检查再修改", 修改应传 durable=False。它返回 dict 时这就是成功响应的 body;
+    返回其他响应 (如 404 / 409) 时原样返回, 不等待落盘。锁外等待落盘, 同时到达的请求合并进同一次 fsync。
+    修改已生效但还没落盘时返回 202 (见 not_yet_durable); 事务里的写入错误 (共享模式下追加 journal 失败)
+    和等待时的其他 I/O 错误返回 JSON 格式的 500。
+    """
+    body = None
+    try:
+        with movie_store.transaction():
+            body = change()
+            version = movie_store.version
+        if not isinstance(body, dict):
+            return body
+        movie_store.wait_durable(version)
+    except DurabilityError as e:
+        if body is None:
+            return jsonify({"detail": f"Error writing to cache: {e}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+        return not_yet_durable(body, e)
+    except OSError as e:
+        return jsonify({"detail": f"Error writing to cache: {e}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+    return jsonify(body)
+
 @app.route('/api/add', methods=['POST'])
 def add_movie_to_list():
     req = request.get_json()
-    poster_lang = req.get('posterLang', 'zh,en,null')
-    if not req or 'tmdb_id' not in req or 'media_type' not in req or 'target_list' not in req:
+    if not req or 'tmdb_id' not in req or 'media_type' not in req or req.get('target_list') not in LIST_NAMES:
         return jsonify({"detail": "Invalid JSON"}), HTTPStatus.BAD_REQUEST
+    poster_lang = req.get('posterLang', 'zh,en,null')
+
+    def already_added():
+        location = movie_store.find_by_tmdb_id(req['tmdb_id'])
+        existing = movie_store.get(*location) if location else None
+        if existing is None:
+            return None
+        return jsonify({"detail": f"'{existing.get('title')}' 已存在于列表中。"}), HTTPStatus.CONFLICT
+
+    # 已经在库里的不必请求TMDB; 同时添加同一部电影的请求由事务里的再次检查挡住
+    duplicate = already_added()
+    if duplicate:
+        return duplicate
 
     details = get_enriched_tmdb_details(req['tmdb_id'], req['media_type'], poster_lang)
     if not details:
         return jsonify({"detail": "Failed to fetch from TMDB."}), HTTPStatus.SERVICE_UNAVAILABLE
 
-    new_movie = format_tmdb_details_to_movie_object(details, req['media_type'], f"{req['target_list']}-{req['tmdb_id']}")
-
-    with file_lock:
-        data = {"watched": [], "watching": [], "wantToWatch": []}
-        if os.path.exists(CACHE_JSON):
-            try:
-                with open(CACHE_JSON, 'r', encoding='utf-8') as f: data = json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError): pass
+    new_movie = format_tmdb_details_to_movie_object(details, req['media_type'], f"{req['target_list']}-{req['tmdb_id']}",
+                                                    poster_lang)
 
-        if any(movie.get('id', '').split('-')[-1] == str(req['tmdb_id']) for lst in data.values() for movie in lst):
-            return jsonify({"detail": f"'{new_movie['title']}' 已存在于列表中。"}), HTTPStatus.CONFLICT
-        
-        data[req['target_list']].insert(0, new_movie)
-        
-        try:
-            with open(CACHE_JSON, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            return jsonify({"detail": f"Error writing to cache: {e}"}), HTTPStatus.INTERNAL_SERVER_ERROR
+    def change():
+        duplicate = already_added()
+        if duplicate:
+            return duplicate
+        movie_store.add(req['target_list'], new_movie, durable=False)
+        return {"message": f"'{new_movie['title']}' 已成功添加。"}
 
-    return jsonify({"message": f"'{new_movie['title']}' 已成功添加。"})
+    return commit_movie_change(change)
 
 @app.route('/api/delete', methods=['POST'])
 def delete_movie():
@@ -2897,34 +3661,190 @@ def delete_movie():
     if not req or 'list_name' not in req or 'movie_id' not in req:
         return jsonify({"detail": "Invalid JSON"}), HTTPStatus.BAD_REQUEST
     
-    with file_lock:
-        if not os.path.exists(CACHE_JSON):
-            return jsonify({"detail": "Cache file not found"}), HTTPStatus.NOT_FOUND
-        
-        with open(CACHE_JSON, 'r', encoding='utf-8') as f: data = json.load(f)
-        
-        movie_list = data.get(req['list_name'], [])
-        original_length = len(movie_list)
-        data[req['list_name']] = [m for m in movie_list if m.get('id') != req['movie_id']]
-        
-        if len(data[req['list_name']]) == original_length:
+    def change():
+        if not movie_store.delete(req['list_name'], req['movie_id'], durable=False):
             return jsonify({"detail": "Movie not found to delete"}), HTTPStatus.NOT_FOUND
-            
-        with open(CACHE_JSON, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False, indent=4)
+        return {"message": "电影已删除"}
+
+    return commit_movie_change(change)
+
+@app.route('/api/move', methods=['POST'])
+def move_movie():
+    """
+    把电影移到另一个列表, 直接搬动库里已经保存的记录, 不再请求TMDB。
+
+    请求体: {"movie_id", "from_list", "to_list"}; 带TMDB ID的电影会改写成新列表前缀的ID,
+    旧ID仍可通过 /api/movie_data 解析 (见 resolve_movie)。
+    """
+    req = request.get_json(silent=True)
+    if not req or 'movie_id' not in req or 'from_list' not in req or req.get('to_list') not in LIST_NAMES:
+        return jsonify({"detail": "Invalid JSON"}), HTTPStatus.BAD_REQUEST
+    to_list = req['to_list']
+
+    def change():
+        location = resolve_movie(req['from_list'], req['movie_id'])
+        if not location:
+            return jsonify({"detail": "Movie not found to move"}), HTTPStatus.NOT_FOUND
+        from_list, movie_id = location
+        if from_list == to_list:
+            return jsonify({"message": "电影已在该列表中。", "id": movie_id, "list": to_list})
+        tmdb_id = parse_tmdb_id(movie_id)
+        new_id = f"{to_list}-{tmdb_id}" if tmdb_id is not None else movie_id
+        if not movie_store.move(movie_id, from_list, to_list, new_id, durable=False):
+            return jsonify({"detail": f"ID '{new_id}' 已被占用。"}), HTTPStatus.CONFLICT
+        return {"message": "电影已移动。", "id": new_id, "list": to_list}
+
+    return commit_movie_change(change)
+
+MAX_BATCH_OPERATIONS = 500
+BATCH_FETCH_WORKERS = 8
+
+def parse_batch_operation(item):
+    """校验 /api/batch 中的一项操作, 不合法时返回错误信息。"""
+    if not isinstance(item, dict):
+        return "Invalid operation"
+    op = item.get('op')
+    if op == 'add':
+        if not str(item.get('tmdb_id', '')).isdigit() or 'media_type' not in item or item.get('target_list') not in LIST_NAMES:
+            return "add requires tmdb_id, media_type and a valid target_list"
+    elif op == 'delete':
+        if 'list_name' not in item or 'movie_id' not in item:
+            return "delete requires list_name and movie_id"
+    elif op == 'move':
+        if 'movie_id' not in item or 'from_list' not in item or item.get('to_list') not in LIST_NAMES:
+            return "move requires movie_id, from_list and a valid to_list"
+    else:
+        return f"Unknown op '{op}'"
+    return None
+
+@app.route('/api/batch', methods=['POST'])
+def batch_update():
+    """
+    一次请求执行多项 add / delete / move, 整批只提交一条修改记录、只等一次落盘。
+
+    请求体: {"operations": [{"op": "add", "tmdb_id", "media_type", "target_list"} |
+                            {"op": "delete", "list_name", "movie_id"} |
+                            {"op": "move", "movie_id", "from_list", "to_list"}, ...],
+             "atomic": true, "posterLang": "zh,en,null"}
+    atomic 为 true (默认) 时只要有一项失败整批都不执行; 为 false 时跳过失败项。
+    各项按顺序执行, 后面的项看得到前面各项的效果: 例如先 delete 再 add 同一部电影不算重复。
+    add 需要的 TMDB 详情在进入锁之前并发获取。
+    """
+    req = request.get_json(silent=True)
+    operations = req.get('operations') if isinstance(req, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"detail": "Invalid JSON"}), HTTPStatus.BAD_REQUEST
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"detail": f"At most {MAX_BATCH_OPERATIONS} operations per batch"}), HTTPStatus.BAD_REQUEST
+    atomic = req.get('atomic', True) is not False
+    poster_lang = req.get('posterLang', 'zh,en,null')
 
-    return jsonify({"message": "电影已删除"})
+    results = [{"index": i, "op": item.get('op') if isinstance(item, dict) else None, "status": "ok"}
+               for i, item in enumerate(operations)]
+    for result, item in zip(results, operations):
+        error = parse_batch_operation(item)
+        if error:
+            result.update(status="error", detail=error)
+
+    # 已经在库里、本批次也不会删除的不再请求 TMDB, 进入锁之后还会按批次的执行顺序再检查一次
+    deleting = {parse_tmdb_id(item['movie_id']) for result, item in zip(results, operations)
+                if result['status'] == 'ok' and item['op'] == 'delete'}
+    to_fetch = {}
+    for result, item in zip(results, operations):
+        if result['status'] == 'ok' and item['op'] == 'add':
+            if int(item['tmdb_id']) not in deleting and movie_store.find_by_tmdb_id(item['tmdb_id']):
+                result.update(status="error", detail="已存在于列表中")
+            else:
+                to_fetch.setdefault((int(item['tmdb_id']), item['media_type']), []).append(result['index'])
+    fetched = {}
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=min(BATCH_FETCH_WORKERS, len(to_fetch))) as pool:
+            futures = {key: pool.submit(get_enriched_tmdb_details, key[0], key[1], poster_lang) for key in to_fetch}
+            fetched = {key: future.result() for key, future in futures.items()}
+
+    def change():
+        store_ops, op_indexes = [], []
+        # 本批次前面各项执行之后的状态, 和 MovieStore._check_batch 的规则相同:
+        # 位置变化过的ID -> 所在列表 (删除后为 None); 增删移动过的 TMDB ID -> 现在的电影ID (删除后为 None)
+        located, by_tmdb_id = {}, {}
+
+        def where(movie_id):
+            return located[movie_id] if movie_id in located else movie_store.locate(movie_id)
+
+        def holder(tmdb_id):
+            if tmdb_id in by_tmdb_id:
+                return by_tmdb_id[tmdb_id]
+            location = movie_store.find_by_tmdb_id(tmdb_id)
+            return location[1] if location else None
+
+        for result, item in zip(results, operations):
+            if result['status'] != 'ok':
+                continue
+            if item['op'] == 'add':
+                tmdb_id = int(item['tmdb_id'])
+                details = fetched.get((tmdb_id, item['media_type']))
+                if not details:
+                    result.update(status="error", detail="Failed to fetch from TMDB.")
+                    continue
+                if holder(tmdb_id) is not None:
+                    result.update(status="error", detail="已存在于列表中")
+                    continue
+                movie = format_tmdb_details_to_movie_object(details, item['media_type'], f"{item['target_list']}-{tmdb_id}",
+                                                            poster_lang)
+                result['id'] = movie['id']
+                located[movie['id']], by_tmdb_id[tmdb_id] = item['target_list'], movie['id']
+                store_ops.append({'op': 'add', 'list': item['target_list'], 'index': 0, 'movie': movie})
+            elif item['op'] == 'delete':
+                movie_id = result['id'] = item['movie_id']
+                if where(movie_id) == item['list_name']:
+                    located[movie_id] = None
+                    if parse_tmdb_id(movie_id) is not None:
+                        by_tmdb_id[parse_tmdb_id(movie_id)] = None
+                store_ops.append({'op': 'delete', 'list': item['list_name'], 'id': movie_id})
+            else:
+                movie_id, tmdb_id = item['movie_id'], parse_tmdb_id(item['movie_id'])
+                new_id = f"{item['to_list']}-{tmdb_id}" if tmdb_id is not None else movie_id
+                result['id'] = new_id
+                if where(movie_id) == item['from_list'] and (new_id == movie_id or where(new_id) is None):
+                    located[movie_id] = None
+                    located[new_id] = item['to_list']
+                    if tmdb_id is not None:
+                        by_tmdb_id[tmdb_id] = new_id
+                store_ops.append({'op': 'move', 'from': item['from_list'], 'to': item['to_list'],
+                                  'id': movie_id, 'new_id': new_id, 'index': 0})
+            op_indexes.append(result['index'])
+
+        failed = any(result['status'] != 'ok' for result in results)
+        if atomic and failed:
+            store_ops = []
+        errors = movie_store.apply_batch(store_ops, atomic=atomic, durable=False) if store_ops else []
+        for index, error in zip(op_indexes, errors):
+            if error:
+                results[index].update(status="error", detail=error)
+
+        applied = any(error is None for error in errors) and not (atomic and any(errors))
+        if not applied:
+            for result in results:
+                if result['status'] == 'ok':
+                    result.update(status="skipped", detail="整批未执行")
+            return jsonify({"applied": False, "version": movie_store.version, "results": results}), HTTPStatus.CONFLICT
+        # 整批只需要一次 fsync
+        return {"applied": applied, "version": movie_store.version, "results": results}
+
+    return commit_movie_change(change)
 
 @app.route('/api/clear_cache', methods=['POST'])
 def clear_cache():
-    with file_lock:
-        if os.path.exists(CACHE_JSON):
-            os.remove(CACHE_JSON)
+    movie_store.clear()
+    movie_store.compact()
     return jsonify({"message": "所有电影数据已清空。"})
 
 # ==============================================================================
 # --- 主程序入口 ---
 # ==============================================================================
 if __name__ == '__main__':
+    # 让 SIGTERM 也走正常退出流程, 以便 atexit 把电影库落盘
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     print("启动 Flask 服务器...")
     print("请在浏览器访问 http://127.0.0.1:7860")
     socketio.run(app, host='0.0.0.0', port=7860, debug=False)
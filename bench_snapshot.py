@@ -0,0 +1,78 @@
+"""
+比较 JSON 快照和二进制快照 (.mvs) 的加载速度与文件大小。
+
+用法: python bench_snapshot.py [电影数量 ...]      (默认 1000 10000 100000)
+
+测试数据由 movies.json 中的真实条目复制而成 (每条换一个ID和各自的图片地址), 加载时间为 MovieStore
+完成初始化 (读快照 + 建立ID索引) 的耗时, 取 3 次中最快的一次。
+10 万部电影的 JSON 快照约 800 MB, 需要几 GB 内存。
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+
+from movie_store import MovieStore, LIST_NAMES, encode_snapshot
+
+SOURCE_JSON = "movies.json"
+DEFAULT_SIZES = (1000, 10000, 100000)
+ROUNDS = 3
+
+
+def build_library(templates, count):
+    """用模板条目生成 count 部电影, 平均分配到三个列表。"""
+    data = {name: [] for name in LIST_NAMES}
+    for i in range(count):
+        name = LIST_NAMES[i % len(LIST_NAMES)]
+        movie = dict(templates[i % len(templates)], id=f"{name}-{10_000_000 + i}")
+        # 复制出来的条目换上各自不同的图片地址, 避免重复字符串让二进制格式显得过于好看
+        for field in ('posters', 'stills'):
+            movie[field] = [url.replace('/original/', f'/original/{i}-') for url in movie.get(field) or []]
+        data[name].append(movie)
+    # 经过一次序列化, 让每条记录都拥有独立的字符串对象, 和真实加载的结果一致
+    return json.loads(json.dumps(data, ensure_ascii=False))
+
+
+def time_load(path):
+    best = None
+    for _ in range(ROUNDS):
+        gc.collect()
+        start = time.perf_counter()
+        store = MovieStore(path)
+        elapsed = time.perf_counter() - start
+        store.close()
+        del store
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    with open(SOURCE_JSON, 'r', encoding='utf-8') as f:
+        templates = [movie for movies in json.load(f).values() for movie in movies]
+    if not templates:
+        print(f"{SOURCE_JSON} 中没有电影, 无法生成测试数据")
+        return
+
+    print(f"{'电影数':>8} {'格式':>6} {'文件大小':>12} {'加载耗时':>10} {'加速':>6}")
+    for count in sizes:
+        data = build_library(templates, count)
+        with tempfile.TemporaryDirectory() as tmp:
+            results = {}
+            for ext in ('.json', '.mvs'):
+                # 两种格式放在各自的子目录里, 避免共用同一个 journal
+                path = os.path.join(tmp, ext.lstrip('.'), 'movies' + ext)
+                os.makedirs(os.path.dirname(path))
+                with open(path, 'wb') as f:
+                    f.write(encode_snapshot(path, data))
+                results[ext] = (os.path.getsize(path), time_load(path))
+            del data
+            json_seconds = results['.json'][1]
+            for ext, (size, seconds) in results.items():
+                print(f"{count:>8} {ext:>6} {size / 1024 / 1024:>9.1f} MB {seconds:>9.3f}s {json_seconds / seconds:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+本地的 TMDB 替身服务器, 用于在没有外网的机器上测试和压测 TMDB 相关的流程
+(search_tmdb / get_tmdb_details / Excel 导入 / /api/add)。
+
+用法:
+    python fake_tmdb_server.py [--port 8765] [--fixtures tmdb_fixtures]
+    TMDB_API_BASE_URL=http://127.0.0.1:8765/3 python app.py
+
+    # 录制模式: 把请求转发给真实的 TMDB, 并把成功 (2xx) 的 JSON 响应保存成 fixture;
+    # 429 / 5xx 等错误响应原样返回给客户端, 不保存
+    TMDB_API_KEY=... python fake_tmdb_server.py --record
+
+响应来源 (按顺序):
+    1. fixtures 目录中录制好的响应, 以 (路径, 除 api_key 以外的查询参数) 为键;
+    2. 没有录制过的请求按 ID / 关键词生成确定性的假数据 (--no-synthetic 时返回 404)。
+
+故障注入:
+    --latency / --jitter      每个请求的延迟 (秒), 实际延迟在 latency ± jitter 之间
+    --error-429 0.05          以这个概率返回 429 (带 Retry-After)
+    --max-rps 40              模拟 TMDB 的速率上限, 超过时返回 429
+    --timeout-rate 0.01       以这个概率挂起 --timeout-delay 秒后才响应, 用来触发客户端超时
+    --seed                    随机数种子, 相同的种子和请求顺序得到相同的故障序列
+
+GET /__stats 返回各类请求的计数。
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
+API_PREFIX = "/3"
+
+
+def fixture_key(path, params):
+    """fixture 的键: 路径 + 排好序的查询参数, 不含 api_key。"""
+    query = urllib.parse.urlencode(sorted((k, v) for k, v in params.items() if k != 'api_key'))
+    return f"{path}?{query}"
+
+
+def fixture_path(directory, key):
+    return os.path.join(directory, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.json')
+
+
+def _stable_int(text, low=100000, high=999999):
+    return low + int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:8], 16) % (high - low)
+
+
+# --- 确定性的假数据 ---
+def synthetic_search(params):
+    query = params.get('query', '')
+    year = params.get('primary_release_year') or str(1980 + _stable_int(query, 0, 45))
+    results = []
+    for i in range(3):
+        tmdb_id = _stable_int(f"{query}#{i}")
+        results.append({
+            'id': tmdb_id, 'media_type': 'movie' if i != 2 else 'tv',
+            'title' if i != 2 else 'name': query if i == 0 else f"{query} {i + 1}",
+            'release_date' if i != 2 else 'first_air_date': f"{year}-01-01",
+            'overview': f"{query} 的剧情简介。", 'poster_path': f"/poster-{tmdb_id}.jpg",
+        })
+    return {'page': 1, 'results': results, 'total_results': len(results), 'total_pages': 1}
+
+
+def synthetic_details(media_type, tmdb_id, params):
+    title_key, date_key = ('title', 'release_date') if media_type == 'movie' else ('name', 'first_air_date')
+    lang = params.get('language', 'zh-CN')
+    title = f"电影 {tmdb_id}" if lang.startswith('zh') else f"Movie {tmdb_id}"
+    details = {
+        'id': tmdb_id, title_key: title, date_key: f"{1980 + tmdb_id % 45}-06-01",
+        'overview': f"{title} 的剧情简介。", 'tagline': f"Tagline {tmdb_id}" if lang.startswith('en') else f"标语 {tmdb_id}",
+        'vote_average': round(5 + tmdb_id % 50 / 10, 1), 'budget': tmdb_id * 100, 'revenue': tmdb_id * 300,
+    }
+    appended = set(filter(None, params.get('append_to_response', '').split(',')))
+    if 'credits' in appended:
+        details['credits'] = {
+            'cast': [{'name': f"Actor {tmdb_id}-{i}", 'character': f"Role {i}", 'profile_path': f"/actor-{tmdb_id}-{i}.jpg"}
+                     for i in range(12)],
+            'crew': [{'name': f"Director {tmdb_id}", 'job': 'Director'}, {'name': f"Writer {tmdb_id}", 'job': 'Writer'}],
+        }
+    if 'images' in appended:
+        details['images'] = {
+            'posters': [{'file_path': f"/poster-{tmdb_id}-{i}.jpg"} for i in range(3)],
+            'backdrops': [{'file_path': f"/backdrop-{tmdb_id}-{i}.jpg"} for i in range(5)],
+        }
+    if 'recommendations' in appended:
+        details['recommendations'] = {'results': [
+            {'id': _stable_int(f"{tmdb_id}>{i}"), 'title': f"电影 {_stable_int(f'{tmdb_id}>{i}')}",
+             'poster_path': f"/poster-{_stable_int(f'{tmdb_id}>{i}')}-0.jpg", 'media_type': media_type}
+            for i in range(10)]}
+    if 'translations' in appended:
+        details['translations'] = {'translations': [
+            {'iso_639_1': 'en', 'iso_3166_1': 'US', 'data': {'tagline': f"Tagline {tmdb_id}", 'overview': ''}},
+            {'iso_639_1': 'zh', 'iso_3166_1': 'CN', 'data': {'tagline': f"标语 {tmdb_id}", 'overview': ''}},
+        ]}
+    return details
+
+
+def synthetic_response(path, params):
+    """返回 (状态码, 响应对象)。"""
+    parts = path.strip('/').split('/')
+    if parts == ['search', 'multi']:
+        return HTTPStatus.OK, synthetic_search(params)
+    if len(parts) == 2 and parts[0] in ('movie', 'tv') and parts[1].isdigit():
+        return HTTPStatus.OK, synthetic_details(parts[0], int(parts[1]), params)
+    return HTTPStatus.NOT_FOUND, {'success': False, 'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+
+
+class FakeTmdb:
+    """服务器的共享状态: 配置、随机数、速率窗口和计数器。"""
+
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {'requests': 0, 'fixture': 0, 'synthetic': 0, 'recorded': 0, 'passed_through': 0,
+                      'not_found': 0, 'error_429': 0, 'rate_limited': 0, 'timeouts': 0}
+        if args.record:
+            os.makedirs(args.fixtures, exist_ok=True)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def draw_faults(self):
+        """为一个请求抽取延迟和故障, 返回 (延迟秒数, 故障类型或 None)。"""
+        with self.lock:
+            latency = max(0.0, self.args.latency + self.random.uniform(-self.args.jitter, self.args.jitter))
+            roll = self.random.random()
+            if self.args.max_rps:
+                now = time.monotonic()
+                if now - self.window_start >= 1:
+                    self.window_start, self.window_count = now, 0
+                self.window_count += 1
+                if self.window_count > self.args.max_rps:
+                    return latency, 'rate_limited'
+        if roll < self.args.timeout_rate:
+            return latency, 'timeout'
+        if roll < self.args.timeout_rate + self.args.error_429:
+            return latency, 'error_429'
+        return latency, None
+
+    def respond(self, path, params):
+        """按 fixture -> 录制 -> 假数据的顺序得到响应, 返回 (状态码, 响应体 bytes)。"""
+        key = fixture_key(path, params)
+        fixture_file = fixture_path(self.args.fixtures, key)
+        if not self.args.record and os.path.exists(fixture_file):
+            with open(fixture_file, 'r', encoding='utf-8') as f:
+                fixture = json.load(f)
+            self.count('fixture')
+            return fixture['status'], json.dumps(fixture['body'], ensure_ascii=False).encode('utf-8')
+        if self.args.record:
+            status, body = self.forward(path, params)
+            try:
+                recorded = json.loads(body) if 200 <= status < 300 else None
+            except ValueError:
+                recorded = None
+            if recorded is None:
+                # 限流、服务器错误、非 JSON 的响应只转发不保存, 否则回放时会一直返回这个错误
+                self.count('passed_through')
+                return status, body
+            with open(fixture_file, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'status': status, 'body': recorded}, f, ensure_ascii=False, indent=2)
+            self.count('recorded')
+            return status, body
+        if not self.args.synthetic:
+            self.count('not_found')
+            return HTTPStatus.NOT_FOUND, b'{"success": false, "status_message": "no fixture"}'
+        status, body = synthetic_response(path, params)
+        self.count('synthetic' if status == HTTPStatus.OK else 'not_found')
+        return status, json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+    def forward(self, path, params):
+        """录制模式: 把请求转发给真实的 TMDB。"""
+        params = dict(params)
+        if self.args.api_key:
+            params['api_key'] = self.args.api_key
+        url = f"{self.args.upstream.rstrip('/')}{path}?{urllib.parse.urlencode(params)}"
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except OSError as e:  # 连不上上游 (URLError 也是 OSError)
+            return HTTPStatus.BAD_GATEWAY, json.dumps({'success': False, 'status_message': str(e)}).encode('utf-8')
+
+
+class FakeTmdbHandler(BaseHTTPRequestHandler):
+    server_version = "FakeTMDB/1.0"
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive, 和真实 TMDB 一样可以复用连接
+
+    def do_GET(self):
+        tmdb = self.server.tmdb
+        parsed = urllib.parse.urlsplit(self.path)
+        if parsed.path == '/__stats':
+            with tmdb.lock:
+                return self.send_json(HTTPStatus.OK, json.dumps(tmdb.stats).encode('utf-8'))
+        path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX + '/') else parsed.path
+        params = dict(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+        tmdb.count('requests')
+
+        latency, fault = tmdb.draw_faults()
+        if fault == 'timeout':
+            tmdb.count('timeouts')
+            time.sleep(tmdb.args.timeout_delay)
+        elif latency:
+            time.sleep(latency)
+        if fault in ('error_429', 'rate_limited'):
+            tmdb.count(fault)
+            body = b'{"success": false, "status_code": 25, "status_message": "Your request count is over the allowed limit."}'
+            return self.send_json(HTTPStatus.TOO_MANY_REQUESTS, body, {'Retry-After': str(tmdb.args.retry_after)})
+        status, body = tmdb.respond(path, params)
+        self.send_json(status, body)
+
+    def send_json(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.tmdb.args.quiet:
+            super().log_message(format, *args)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="本地 TMDB 替身服务器 (录制 / 回放 / 故障注入)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', default='tmdb_fixtures', help="fixture 目录")
+    parser.add_argument('--record', action='store_true', help="转发到真实 TMDB 并保存响应")
+    parser.add_argument('--upstream', default=TMDB_API_BASE_URL)
+    parser.add_argument('--api-key', default=os.environ.get('TMDB_API_KEY'), help="录制时使用的 TMDB API key")
+    parser.add_argument('--no-synthetic', dest='synthetic', action='store_false', help="没有 fixture 时返回 404")
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--max-rps', type=int, default=0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-delay', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quiet', action='store_true', help="不打印每个请求的日志")
+    return parser.parse_args(argv)
+
+
+def make_server(args):
+    server = ThreadingHTTPServer((args.host, args.port), FakeTmdbHandler)
+    server.daemon_threads = True
+    server.tmdb = FakeTmdb(args)
+    return server
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    server = make_server(args)
+    mode = "录制" if args.record else "回放"
+    print(f"TMDB 替身服务器 ({mode}) 运行在 http://{args.host}:{server.server_port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,30 @@
+# 多进程部署配置:  gunicorn -c gunicorn.conf.py app:app
+#
+# 每个 worker 进程都有自己的内存电影库和检索索引, 通过 movies.lock 文件锁串行化写入,
+# 并在每个 /api/ 请求开始时重放其他 worker 追加到 movies.journal 的修改 (见 MovieStore.refresh)。
+# 不要打开 preload_app: 电影库的后台写线程和文件锁都必须在 fork 之后、在各自的 worker 里创建。
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:7860")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# gthread: 每个 worker 多个线程, 和默认的 async_mode='threading' 配合;
+# eventlet: 需要 `pip install eventlet`, 适合大量长连接 (语音助手的 Socket.IO)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+worker_connections = 1000
+timeout = 120
+graceful_timeout = 30
+
+raw_env = ["MULTI_PROCESS=1"]
+if worker_class == "eventlet":
+    raw_env.append("SOCKETIO_ASYNC_MODE=eventlet")
+
+
+def worker_exit(server, worker):
+    # 正常退出时把本 worker 尚未 fsync 的修改落盘 (atexit 在被信号终止时不一定会执行)
+    app_module = sys.modules.get("app")
+    if app_module is not None:
+        app_module.movie_store.close()
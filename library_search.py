@@ -0,0 +1,191 @@
+import re
+import threading
+from collections import defaultdict
+
+# 拉丁字母/数字按单词切分; 中日韩文字按单字 + 相邻二字 (bigram) 切分, 不依赖分词词典
+_TOKEN_RE = re.compile(r'[0-9a-z]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+')
+
+# 各字段命中时的权重
+FIELD_WEIGHTS = {'title': 3.0, 'director': 2.0, 'actors': 1.5, 'plot': 1.0}
+
+SORT_KEYS = ('relevance', 'year', 'rating', 'title')
+
+
+def tokenize(text, for_query=False):
+    """
+    把文本切成检索词。
+
+    索引时中日韩文字同时产出单字和二字组; 查询时长度大于 1 的中日韩片段只用二字组,
+    这样 "星际穿越" 只会匹配连续出现这几个字的条目, 而单字查询 "爱" 也能命中。
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if run[0].isascii():
+            tokens.append(run)
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if for_query:
+            tokens.extend(bigrams or [run])
+        else:
+            tokens.extend(run)
+            tokens.extend(bigrams)
+    return tokens
+
+
+def _parse_year(value):
+    value = str(value or '')[:4]
+    return int(value) if value.isdigit() else None
+
+
+def _actor_names(movie):
+    actors = movie.get('actors') or ''
+    if isinstance(actors, str):
+        return actors
+    return ' '.join(a.get('name', '') for a in actors if isinstance(a, dict))
+
+
+class LibrarySearchIndex:
+    """
+    电影库的进程内倒排索引, 覆盖标题、导演、演员和剧情简介。
+
+    通过 rebuild() 从存储全量构建, 之后由 apply_change() 接收存储的每一条修改记录
+    (add / delete / move / update / batch / clear) 增量更新, 查询时不需要再扫描整个电影库。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # token -> {movie_id: score}
+        self._doc_tokens = {}  # movie_id -> set(token), 删除时用来清理 postings
+        self._docs = {}  # movie_id -> 过滤/排序用的元数据
+
+    def rebuild(self, store):
+        """从存储中全量重建索引。"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._docs.clear()
+            for list_name, movie in store.iter_movies():
+                self._add(list_name, movie)
+
+    def apply_change(self, change):
+        """应用一条存储修改记录, 可以直接注册为存储的监听器。"""
+        with self._lock:
+            op = change.get('op')
+            if op in ('add', 'update'):
+                self._remove(change['movie'].get('id'))
+                self._add(change['list'], change['movie'])
+            elif op == 'delete':
+                self._remove(change['id'])
+            elif op == 'move':
+                doc = self._docs.get(change['id'])
+                if doc is None:
+                    return
+                tokens = self._remove(change['id'])
+                new_id = change.get('new_id') or change['id']
+                self._docs[new_id] = dict(doc, list=change['to'])
+                self._doc_tokens[new_id] = set(tokens)
+                for token, score in tokens.items():
+                    self._postings[token][new_id] = score
+            elif op == 'batch':
+                for sub_change in change['ops']:
+                    self.apply_change(sub_change)
+            elif op == 'clear':
+                self._postings.clear()
+                self._doc_tokens.clear()
+                self._docs.clear()
+
+    def _add(self, list_name, movie):
+        movie_id = movie.get('id')
+        scores = defaultdict(float)
+        fields = {
+            'title': movie.get('title'),
+            'director': movie.get('director'),
+            'actors': _actor_names(movie),
+            'plot': movie.get('plot'),
+        }
+        for field, text in fields.items():
+            for token in tokenize(text):
+                scores[token] += FIELD_WEIGHTS[field]
+        for token, score in scores.items():
+            self._postings[token][movie_id] = score
+        self._doc_tokens[movie_id] = set(scores)
+        rating = movie.get('rating')
+        self._docs[movie_id] = {
+            'list': list_name,
+            'title': movie.get('title') or '',
+            'year': _parse_year(movie.get('year')),
+            'rating': float(rating) if isinstance(rating, (int, float)) else None,
+            'media_type': movie.get('media_type'),
+        }
+
+    def _remove(self, movie_id):
+        """从索引中移除一部电影, 返回它原来的 {token: score}。"""
+        removed = {}
+        for token in self._doc_tokens.pop(movie_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            removed[token] = postings.pop(movie_id, 0.0)
+            if not postings:
+                del self._postings[token]
+        self._docs.pop(movie_id, None)
+        return removed
+
+    def search(self, query='', year_from=None, year_to=None, min_rating=None, media_type=None,
+               list_name=None, sort='relevance', descending=True, offset=0, limit=50):
+        """
+        检索电影库。
+
+        Args:
+            query (str): 关键词, 所有检索词都必须命中; 为空时只按条件过滤。
+            year_from / year_to (int): 年份范围 (含边界)。
+            min_rating (float): 最低评分。
+            media_type (str): 'movie' 或 'tv'。
+            list_name (str): 只在某个列表中检索。
+            sort (str): 'relevance' / 'year' / 'rating' / 'title'。
+
+        Returns:
+            tuple: ([(list_name, movie_id, score), ...] 当前页, 命中总数)
+        """
+        with self._lock:
+            scores = self._match(query)
+            hits = []
+            for movie_id, score in scores.items():
+                doc = self._docs.get(movie_id)
+                if doc is None:
+                    continue
+                if list_name and doc['list'] != list_name:
+                    continue
+                if media_type and doc['media_type'] != media_type:
+                    continue
+                if year_from is not None and (doc['year'] is None or doc['year'] < year_from):
+                    continue
+                if year_to is not None and (doc['year'] is None or doc['year'] > year_to):
+                    continue
+                if min_rating is not None and (doc['rating'] is None or doc['rating'] < min_rating):
+                    continue
+                hits.append((movie_id, score, doc))
+
+        if sort == 'relevance':
+            hits.sort(key=lambda h: (-h[1], h[2]['title']))
+        else:
+            # 缺少年份/评分的条目总是排在最后
+            present = [h for h in hits if h[2][sort] is not None]
+            missing = [h for h in hits if h[2][sort] is None]
+            present.sort(key=lambda h: h[2][sort], reverse=descending)
+            hits = present + missing
+        page = hits[offset:offset + limit]
+        return [(doc['list'], movie_id, score) for movie_id, score, doc in page], len(hits)
+
+    def _match(self, query):
+        tokens = set(tokenize(query, for_query=True))
+        if not tokens:
+            return dict.fromkeys(self._docs, 0.0)
+        # 从最短的 posting 开始求交集
+        postings = sorted((self._postings.get(token, {}) for token in tokens), key=len)
+        scores = dict(postings[0])
+        for posting in postings[1:]:
+            scores = {movie_id: score + posting[movie_id] for movie_id, score in scores.items() if movie_id in posting}
+            if not scores:
+                break
+        return scores
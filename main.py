@@ -9,15 +9,19 @@ from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from converter import convert_excel_to_json
+from tmdb_client import TmdbClient
 
 # --- 配置 ---
 UPLOAD_DIR = "uploads"
 CACHE_JSON = "movies.json"
 SOURCE_EXCEL_NAME = "source.xlsx"
 TMDB_API_KEY = " "
-TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
+# 指向 fake_tmdb_server.py 可以在离线环境中测试和压测 TMDB 相关的流程
+TMDB_API_BASE_URL = os.environ.get("TMDB_API_BASE_URL", "https://api.themoviedb.org/3")
 TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/original"
 
+tmdb_client = TmdbClient(TMDB_API_KEY, TMDB_API_BASE_URL)
+
 # --- Pydantic 数据模型 ---
 class AddMovieRequest(BaseModel):
     tmdb_id: int
@@ -38,12 +42,9 @@ app.add_middleware(
 
 # --- 辅助函数 ---
 def search_tmdb(query: str):
-    search_url = f"{TMDB_API_BASE_URL}/search/multi"
-    params = {'api_key': TMDB_API_KEY, 'query': query, 'language': 'zh-CN', 'include_adult': False}
+    params = {'query': query, 'language': 'zh-CN', 'include_adult': False}
     try:
-        response = requests.get(search_url, params=params, timeout=10)
-        response.raise_for_status()
-        results = response.json().get('results', [])
+        results = tmdb_client.get('/search/multi', params, timeout=10).get('results', [])
         formatted_results = []
         for item in results:
             media_type = item.get('media_type')
@@ -61,16 +62,13 @@ def search_tmdb(query: str):
         return None
 
 def get_tmdb_details(tmdb_id: int, media_type: str):
-    details_url = f"{TMDB_API_BASE_URL}/{media_type}/{tmdb_id}"
     params = {
-        'api_key': TMDB_API_KEY, 'language': 'zh-CN',
+        'language': 'zh-CN',
         'append_to_response': 'credits,images',
         'include_image_language': 'zh,en,null'
     }
     try:
-        response = requests.get(details_url, params=params, timeout=15)
-        response.raise_for_status()
-        return response.json()
+        return tmdb_client.get(f"/{media_type}/{tmdb_id}", params, timeout=15)
     except requests.RequestException as e:
         print(f"Error getting TMDB details: {e}")
         return None
@@ -0,0 +1,246 @@
+import sys
+
+# TMDB 图片地址 = IMAGE_HOST + 尺寸 + file_path; 记录里的海报/剧照只保存 file_path (如 '/abc.jpg')
+IMAGE_HOST = "https://image.tmdb.org/t/p/"
+IMAGE_URL_PREFIX = IMAGE_HOST + "original"
+
+# TMDB 提供的图片宽度: 海报和剧照 (backdrop) 各有一组
+POSTER_SIZES = ('w92', 'w154', 'w185', 'w342', 'w500', 'w780', 'original')
+STILL_SIZES = ('w300', 'w780', 'w1280', 'original')
+
+# 演员表 / 推荐列表的每一项在内存里是一个 tuple, 字段顺序如下
+CAST_KEYS = ('name', 'character', 'profile_path')
+RECOMMENDATION_KEYS = ('id', 'title', 'poster_path', 'media_type')
+
+# 这些字段在很多部电影之间重复, 用 sys.intern 让它们共享同一个字符串对象
+_INTERNED_FIELDS = frozenset(('media_type', 'year', 'director', 'poster_lang'))
+
+_MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def image_path(url):
+    """把 TMDB 原图地址还原成 file_path; 其他地址原样返回。"""
+    if type(url) is str and url.startswith(IMAGE_URL_PREFIX + '/'):
+        # 每张海报/剧照的路径基本都不重复, 不做 intern (intern 表本身也要占内存)
+        return url[len(IMAGE_URL_PREFIX):]
+    return url
+
+
+def image_url(path, base=IMAGE_URL_PREFIX):
+    """把 file_path 拼成完整地址; 已经是完整地址的原样返回。"""
+    if type(path) is str and path.startswith('/'):
+        return base + path
+    return path
+
+
+def image_base(size='original'):
+    """指定尺寸的图片地址前缀, 如 image_base('w342') -> 'https://image.tmdb.org/t/p/w342'。"""
+    return IMAGE_HOST + size
+
+
+def resize_image(url, size):
+    """把 TMDB 原图地址换成指定尺寸; 其他来源的地址 (如 Excel 里的链接) 原样返回。"""
+    return image_url(image_path(url), image_base(size))
+
+
+def _pack_entries(items, keys):
+    """[{name:.., character:..}, ...] -> ((name, character, ..), ...); 结构不符时返回 None。"""
+    if not isinstance(items, list):
+        return None
+    packed = []
+    for item in items:
+        if not isinstance(item, dict) or len(item) != len(keys) or not all(k in item for k in keys):
+            return None
+        packed.append(tuple(_intern(item[k]) for k in keys))
+    return tuple(packed)
+
+
+class MovieRecord:
+    """
+    电影库中一部电影的内存表示。
+
+    和 dict 相比: 字段存在 __slots__ 里; 海报/剧照只保存 TMDB file_path, 序列化时才拼上
+    图片地址前缀; 演员表和推荐列表是 tuple 而不是一串 dict; 导演、演员名、推荐海报等在
+    多部电影之间重复出现的字符串都经过 intern。没有出现过的字段保持未赋值, to_dict() 时也不会输出,
+    所以 from_dict() / to_dict() 可以原样往返。
+
+    对外提供 get() / [] / in 这些只读的 dict 接口, 返回值和原来 dict 里的一样 (完整图片地址)。
+    """
+
+    __slots__ = ('id', 'media_type', 'title', 'year', 'director', 'actors_string', 'actors', 'plot',
+                 'tagline', 'tagline_en', 'posters', 'stills', 'rating', 'budget', 'revenue',
+                 'recommendations', 'enriched_at', 'poster_lang', 'extra')
+
+    FIELDS = __slots__[:-1]
+    _FIELD_SET = frozenset(FIELDS)
+    _SLOT_SET = frozenset(__slots__)
+    _STATE_NAMES = {}  # (快照的字段表, 字段位图) -> 字段名, 见 to_state()
+
+    @classmethod
+    def from_dict(cls, movie):
+        record = cls.__new__(cls)
+        extra = None
+        for key, value in movie.items():
+            if key not in cls._FIELD_SET:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if key in ('posters', 'stills') and isinstance(value, list):
+                value = tuple(image_path(url) for url in value)
+            elif key == 'actors':
+                value = _pack_entries(value, CAST_KEYS) or value
+            elif key == 'recommendations':
+                value = _pack_entries(value, RECOMMENDATION_KEYS) or value
+            elif key in _INTERNED_FIELDS:
+                value = _intern(value)
+            setattr(record, key, value)
+        if extra is not None:
+            record.extra = extra
+        return record
+
+    @classmethod
+    def coerce(cls, movie):
+        """dict 转成 MovieRecord, 已经是 MovieRecord 的原样返回。"""
+        return movie if isinstance(movie, cls) else cls.from_dict(movie)
+
+    @staticmethod
+    def _export(key, value, image_base=IMAGE_URL_PREFIX, still_base=None):
+        if key in ('posters', 'stills') and type(value) is tuple:
+            base = still_base if key == 'stills' and still_base else image_base
+            return [image_url(path, base) for path in value]
+        if key == 'actors' and type(value) is tuple:
+            return [dict(zip(CAST_KEYS, item)) for item in value]
+        if key == 'recommendations' and type(value) is tuple:
+            return [dict(zip(RECOMMENDATION_KEYS, item)) for item in value]
+        return value
+
+    def to_dict(self, image_base=IMAGE_URL_PREFIX, still_base=None):
+        """转成和 movies.json 中相同结构的 dict, 图片地址用 image_base 拼接 (剧照可以用 still_base 单独指定)。"""
+        movie = {}
+        for key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                movie[key] = self._export(key, value, image_base, still_base)
+        extra = getattr(self, 'extra', None)
+        if extra:
+            movie.update(extra)
+        return movie
+
+    def to_stored_dict(self):
+        """写进 journal / SQLite 用的 dict: 结构和 to_dict() 相同, 但 TMDB 海报/剧照只有 file_path, 与图片尺寸无关。"""
+        return self.to_dict(image_base='')
+
+    def first_image(self, field, image_base=IMAGE_URL_PREFIX):
+        """第一张海报/剧照的完整地址, 不需要拼出整个列表。"""
+        paths = getattr(self, field, None)
+        return image_url(paths[0], image_base) if paths else None
+
+    def with_id(self, movie_id):
+        """返回换了ID的副本, 其余字段共享。"""
+        record = MovieRecord.__new__(MovieRecord)
+        for key in self.__slots__:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                setattr(record, key, value)
+        record.id = movie_id
+        return record
+
+    # --- 只读的 dict 接口 ---
+    def get(self, key, default=None):
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            return default if value is _MISSING else self._export(key, value)
+        return (getattr(self, 'extra', None) or {}).get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __eq__(self, other):
+        if not isinstance(other, MovieRecord):
+            return NotImplemented
+        return self.to_state() == other.to_state()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"MovieRecord(id={getattr(self, 'id', None)!r}, title={getattr(self, 'title', None)!r})"
+
+    # --- 二进制快照 ---
+    def to_state(self):
+        """
+        (字段位图, 各字段的值...), 只含基本类型, 供二进制快照直接 pickle。
+        位图的第 i 位对应 __slots__[i], 所以快照头里要一起保存当时的 __slots__, 见 from_state()。
+        """
+        mask = 0
+        values = []
+        for bit, key in enumerate(self.__slots__):
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                mask |= 1 << bit
+                values.append(value)
+        return (mask, *values)
+
+    @classmethod
+    def from_state(cls, state, fields=None):
+        """
+        to_state() 的逆操作。fields 是写快照时的 __slots__ (保存在快照头里), 位图按它还原成字段名,
+        省略时使用当前的 __slots__。之后增删、调整过的字段都能正确对应: 已经不存在的字段放进 extra,
+        以前放在 extra 里、现在有了 slot 的字段移回 slot。
+        """
+        fields = cls.__slots__ if fields is None else tuple(fields)
+        plan = cls._STATE_NAMES.get((fields, state[0]))
+        if plan is None:
+            names = tuple(key for bit, key in enumerate(fields) if state[0] >> bit & 1)
+            plan = cls._STATE_NAMES[(fields, state[0])] = (names, cls._SLOT_SET.issuperset(names))
+        names, all_slots = plan
+        if not all_slots:
+            return cls.from_dict(cls._state_dict(names, state[1:]))
+        record = cls.__new__(cls)
+        for key, value in zip(names, state[1:]):
+            setattr(record, key, value)
+        extra = getattr(record, 'extra', None)
+        if extra and not cls._FIELD_SET.isdisjoint(extra):
+            return cls.from_dict(record.to_dict())
+        return record
+
+    @classmethod
+    def _state_dict(cls, names, values):
+        """按字段名把快照里的值还原成 to_dict() 的结构 (from_state 遇到字段表变化时使用)。"""
+        movie = {}
+        for key, value in zip(names, values):
+            if key == 'extra':
+                movie.update(value or {})
+            else:
+                movie[key] = cls._export(key, value)
+        return movie
+
+
+def first_image(movie, field, size='original'):
+    """第一张海报/剧照指定尺寸的地址, movie 可以是 MovieRecord 或 dict。"""
+    if isinstance(movie, MovieRecord):
+        return movie.first_image(field, image_base(size))
+    url = (movie.get(field) or [None])[0]
+    # dict 里可能是完整地址, 也可能只有 file_path, 两种都按 size 拼成完整地址
+    return resize_image(url, size) if url else url
+
+
+def images(movie, field, size='original'):
+    """全部海报/剧照指定尺寸的地址列表, movie 可以是 MovieRecord 或 dict。"""
+    if isinstance(movie, MovieRecord):
+        paths = getattr(movie, field, None) or ()
+        if type(paths) is not tuple:
+            return movie.get(field)
+        base = image_base(size)
+        return [image_url(path, base) for path in paths]
+    return [resize_image(url, size) for url in movie.get(field) or []]
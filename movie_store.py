@@ -0,0 +1,1205 @@
+import os
+import io
+import sys
+import json
+import pickle
+import struct
+import sqlite3
+import threading
+import tempfile
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from movie_record import MovieRecord
+from sqlite_connections import ThreadConnections
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LIST_NAMES = ('watched', 'watching', 'wantToWatch')
+
+
+def empty_library():
+    """返回一个空的电影库结构。"""
+    return {name: [] for name in LIST_NAMES}
+
+
+def parse_tmdb_id(movie_id):
+    """从 'watched-12345' 形式的ID中取出TMDB ID, 旧的Excel导入ID (如 'watched-xl-0') 返回 None。"""
+    prefix, _, tmdb_id_str = (movie_id or '').rpartition('-')
+    if prefix in LIST_NAMES + ('tmdb',) and tmdb_id_str.isdigit():
+        return int(tmdb_id_str)
+    return None
+
+
+# 快照文件格式:
+# .json: 和以前一样的缩进 JSON, 方便人工查看和导入导出。
+# .mvs:  紧凑的二进制格式, 结构如下 (整数均为小端 uint32):
+#     b'MVSNAP\x02\n'                    魔数 + 格式版本
+#     <len><header JSON>                  {"fields": MovieRecord.__slots__, "lists": {"watched": 数量, ...}}
+#     <len><pickle> × len(LIST_NAMES)     每个列表一块, 按 LIST_NAMES 的顺序
+# 每块是该列表所有电影的 MovieRecord.to_state() 列表, 海报/剧照只有 file_path, intern 过的
+# 重复字符串在 pickle 里只出现一次; 加载时直接还原成 MovieRecord, 不经过 dict。
+# to_state() 的字段位图按 header 里的 fields 解释, MovieRecord 增删字段后旧快照仍然能正确加载。
+# pickle 只允许基本类型, 不会加载任何类。
+SNAPSHOT_MAGIC = b'MVSNAP\x02\n'
+_LENGTH = struct.Struct('<I')
+
+
+def stored_movie(movie):
+    """
+    写进 journal / SQLite 的电影对象 (MovieRecord 或 dict 均可): TMDB 海报/剧照只保存 file_path,
+    与图片尺寸无关, 读取时才按需要的尺寸拼上前缀。其他来源的图片地址原样保留。
+    """
+    return MovieRecord.coerce(movie).to_stored_dict()
+
+
+def _stored_ops(ops):
+    return [dict(op, movie=stored_movie(op['movie'])) if op.get('movie') is not None else op for op in ops]
+
+
+class _DataOnlyUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"快照中不允许出现对象 {module}.{name}")
+
+
+def _read_block(f):
+    header = f.read(_LENGTH.size)
+    if len(header) != _LENGTH.size:
+        raise ValueError("快照文件不完整")
+    (length,) = _LENGTH.unpack(header)
+    block = f.read(length)
+    if len(block) != length:
+        raise ValueError("快照文件不完整")
+    return block
+
+
+def read_snapshot(path):
+    """读取快照文件 (按扩展名区分 .json / .mvs), 返回 {列表名: [MovieRecord, ...]}。"""
+    data = empty_library()
+    if os.path.splitext(path)[1] != '.mvs':
+        with open(path, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        for name in LIST_NAMES:
+            data[name] = [MovieRecord.from_dict(movie) for movie in loaded.get(name, [])]
+        return data
+    with open(path, 'rb') as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} 不是电影库快照文件")
+        header = json.loads(_read_block(f))
+        if 'fields' not in header:
+            raise ValueError(f"{path} 的快照头缺少字段表")
+        fields = tuple(header['fields'])
+        for name in LIST_NAMES:
+            movies = _DataOnlyUnpickler(io.BytesIO(_read_block(f))).load()
+            data[name] = [MovieRecord.from_state(state, fields) for state in movies]
+    return data
+
+
+def encode_snapshot(path, data):
+    """按 path 的扩展名把电影库 (MovieRecord 或 dict 均可) 编码成快照文件内容 (bytes)。"""
+    if os.path.splitext(path)[1] != '.mvs':
+        plain = {name: [MovieRecord.coerce(movie).to_dict() for movie in data.get(name, [])] for name in LIST_NAMES}
+        return json.dumps(plain, ensure_ascii=False, indent=4).encode('utf-8')
+    header = json.dumps({'fields': MovieRecord.__slots__,
+                         'lists': {name: len(data.get(name, [])) for name in LIST_NAMES}}).encode('utf-8')
+    parts = [SNAPSHOT_MAGIC, _LENGTH.pack(len(header)), header]
+    for name in LIST_NAMES:
+        block = pickle.dumps([MovieRecord.coerce(movie).to_state() for movie in data.get(name, [])],
+                             protocol=pickle.HIGHEST_PROTOCOL)
+        parts += [_LENGTH.pack(len(block)), block]
+    return b''.join(parts)
+
+
+class DurabilityError(OSError):
+    """
+    修改已经生效 (内存里已经应用, 其他请求也能看到), 但等待它写入磁盘时失败或超时。
+
+    写线程会继续重试, 之后某一次写入成功时这条修改会随之落盘; 调用方应当把它报告成
+    "已接受、尚未持久化", 而不是 "修改失败"。
+    """
+
+
+class InterProcessLock:
+    """
+    基于锁文件的跨进程排它锁, 同一进程内可重入。
+
+    POSIX 上使用 flock, Windows 上使用 msvcrt.locking。多个 worker 进程共享同一份
+    数据文件时, 用它把 "读-改-写" 串行化。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    while True:
+                        try:
+                            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            # LK_LOCK 重试 10 秒后仍拿不到锁会报错, 继续等待
+                            continue
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class MovieStore:
+    """
+    电影库快照 (movies.json, 或二进制的 movies.mvs) 的内存视图。
+
+    启动时只解析一次快照文件并重放追加日志(journal), 之后所有读请求都直接走内存。
+    每次修改 (add / delete / move / update / clear) 只生成一条很小的日志记录, 由后台写线程
+    批量追加到 journal 文件; 当 journal 超过 compact_bytes 时, 后台线程把它合并进
+    一份新的快照并清空 journal。进程退出前必须调用 close(), 保证最后一批修改落盘。
+
+    写入采用分组提交 (group commit): durable=True 的修改会阻塞到它所在的那一批记录
+    fsync 完成为止; 写线程在有请求等待时只等 group_commit_window 秒收集同一批修改,
+    然后用一次 write + 一次 fsync 把整批落盘, 再统一唤醒这一批的所有请求。
+    durable=False 的修改 (例如批量导入) 最多延迟 flush_interval 秒写盘。
+
+    version 是单调递增的修改序号: 每条日志记录都带着自己的 version, 压缩后新 journal 的
+    第一行是记录当前 version 的 checkpoint, 所以序号在重启之后也会继续增长。
+    最近 history_limit 条修改保留在内存里, 供客户端按序号增量同步 (changes_since)。
+    instance_id 是快照的纪元 (epoch), 随 checkpoint 一起保存, 只有电影库被重新建立时才会
+    改变; 它和 version 组合起来可以作为电影库内容的强 ETag。
+
+    shared=True 时多个 worker 进程可以同时打开同一个电影库: 每次修改都在跨进程文件锁里
+    先追上其他进程追加的记录、再把自己的记录直接追加到 journal (fsync 仍然分组进行);
+    压缩也在同一把锁里完成。其他进程通过 refresh() 重放 journal 新增的尾部,
+    发现 journal 已被压缩替换时重新加载快照, 并通知所有监听器。
+
+    Args:
+        path (str): 快照文件路径, 扩展名为 .mvs 时使用二进制格式, 否则使用 JSON。
+        flush_interval (float): durable=False 的修改最多延迟多少秒写盘。
+        compact_bytes (int): journal 超过这个大小就触发压缩。
+        history_limit (int): 内存中保留多少条修改记录用于增量同步。
+        group_commit_window (float): 分组提交时收集同一批修改的时间窗口 (秒)。
+        shared (bool): 是否有多个进程同时读写这个电影库。
+    """
+
+    DURABLE_TIMEOUT = 30
+
+    def __init__(self, path, flush_interval=2.0, compact_bytes=512 * 1024, history_limit=1000,
+                 group_commit_window=0.005, shared=False):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.shared = shared
+        self._file_lock = InterProcessLock(os.path.splitext(path)[0] + '.lock') if shared else None
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        self.group_commit_window = group_commit_window
+        self.lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._lists = empty_library()
+        self._by_id = {}  # movie_id -> (list_name, movie)
+        self._by_tmdb_id = {}  # tmdb_id -> movie_id
+        self._journal_buffer = []
+        self._journal_bytes = 0
+        self._checkpoint_line = b''  # 当前 journal 的第一行, 用来识别 journal 是否已被压缩替换
+        self._journal_sig = None  # 上次看到的 journal (st_ino, st_size, st_mtime_ns)
+        self.instance_id = None
+        self.version = 0
+        self.last_modified = time.time()
+        self._history = deque(maxlen=history_limit)
+        self._listeners = []
+        self._pending = threading.Event()
+        self._urgent = threading.Event()
+        self._closing = threading.Event()
+        self._durable = threading.Condition()
+        self._durable_version = 0
+        self._write_failure = None  # (失败的那一批覆盖到的 version, 异常), 之后写入成功时清除
+        self.load()
+        if self.shared and not self._checkpoint_line:
+            # 旧格式或全新的 journal 没有记录纪元, 先压缩一次, 让所有 worker 使用同一个 instance_id
+            self.compact()
+        self._writer = threading.Thread(target=self._flush_loop, name='movie-store-writer', daemon=True)
+        self._writer.start()
+
+    # --- 读取 ---
+    def load(self):
+        """从磁盘(重新)加载快照, 并按顺序重放 journal 中的修改。"""
+        with self.lock, self._locked():
+            data = empty_library()
+            if os.path.exists(self.path):
+                try:
+                    data = read_snapshot(self.path)
+                except (ValueError, KeyError, OSError, pickle.UnpicklingError) as e:
+                    print(f"读取电影库 {self.path} 失败, 使用空库: {e}")
+            self._lists = data
+            self._rebuild_id_index()
+            self._journal_buffer = []
+            self._history.clear()
+            self.instance_id = None
+            self._checkpoint_line = b''
+            self._journal_bytes = self._replay_journal()
+            self._durable_version = self.version
+            if self.instance_id is None:
+                self.instance_id = uuid.uuid4().hex[:12]
+            self.last_modified = max([os.path.getmtime(p) for p in (self.path, self.journal_path)
+                                      if os.path.exists(p)], default=time.time())
+
+    def _locked(self):
+        """多进程模式下返回跨进程文件锁, 单进程模式下什么也不做。"""
+        return self._file_lock if self.shared else nullcontext()
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 最后一行可能在崩溃时只写了一半, 直接丢弃
+                    print(f"跳过 {self.journal_path} 中损坏的日志记录")
+                    continue
+                if entry.get('op') == 'checkpoint':
+                    self.version = max(self.version, entry['version'])
+                    self.instance_id = entry.get('epoch', self.instance_id)
+                    self._checkpoint_line = line
+                    self._history.clear()
+                    continue
+                self._apply(entry)
+                self.version = entry.get('version', self.version + 1)
+                self._history.append(entry)
+                replayed += 1
+            size = f.tell()
+            self._journal_sig = self._stat_sig(os.fstat(f.fileno()))
+        if replayed:
+            print(f"从 {self.journal_path} 重放了 {replayed} 条修改记录")
+        return size
+
+    def _rebuild_id_index(self):
+        self._by_id = {}
+        self._by_tmdb_id = {}
+        for name, lst in self._lists.items():
+            for movie in lst:
+                self._index(name, movie)
+
+    def _index(self, list_name, movie):
+        movie_id = movie.get('id')
+        self._by_id[movie_id] = (list_name, movie)
+        tmdb_id = parse_tmdb_id(movie_id)
+        if tmdb_id is not None:
+            self._by_tmdb_id[tmdb_id] = movie_id
+
+    def snapshot(self):
+        """返回所有列表的浅拷贝, 可以在锁外安全地序列化。"""
+        with self.lock:
+            return {name: list(lst) for name, lst in self._lists.items()}
+
+    def get(self, list_name, movie_id):
+        """按列表名和ID取出一部电影, 不存在时返回 None。"""
+        entry = self._by_id.get(movie_id)
+        if entry and entry[0] == list_name:
+            return entry[1]
+        return None
+
+    def locate(self, movie_id):
+        """返回电影当前所在的列表名, 不在库中时返回 None。"""
+        entry = self._by_id.get(movie_id)
+        return entry[0] if entry else None
+
+    def page(self, list_name, offset=0, limit=None):
+        """返回某个列表中从 offset 开始的最多 limit 部电影, 以及该列表的总数。"""
+        with self.lock:
+            movies = self._lists.get(list_name, [])
+            end = None if limit is None else offset + limit
+            return movies[offset:end], len(movies)
+
+    def add_listener(self, callback):
+        """注册一个回调, 每条修改提交后都会以修改记录为参数调用它 (持有 self.lock)。"""
+        self._listeners.append(callback)
+
+    def _notify(self, entry):
+        for callback in self._listeners:
+            try:
+                callback(entry)
+            except Exception as e:
+                print(f"电影库监听器处理修改记录时出错: {e}")
+
+    def changes_since(self, version):
+        """
+        返回 version 之后的所有修改记录 (按序号排列)。
+
+        如果这段历史已经被丢弃 (超出 history_limit 或重启前已被压缩), 或者 version
+        比当前序号还大, 返回 None, 表示客户端需要重新拉取整个电影库。
+        """
+        with self.lock:
+            floor = self._history[0]['version'] - 1 if self._history else self.version
+            if version < floor or version > self.version:
+                return None
+            return [entry for entry in self._history if entry['version'] > version]
+
+    def refresh(self):
+        """
+        多进程模式下, 把其他 worker 写入 journal 的修改同步到本进程的内存视图。
+
+        journal 没有变化时只需要一次 stat, 可以在每个请求开始时调用;
+        单进程模式下什么也不做。
+        """
+        if not self.shared:
+            return
+        try:
+            st = os.stat(self.journal_path)
+        except OSError:
+            return
+        if (st.st_ino, st.st_size, st.st_mtime_ns) == self._journal_sig:
+            return
+        with self.lock, self._locked():
+            self._catch_up()
+
+    @contextmanager
+    def transaction(self):
+        """
+        持有本进程的锁 (多进程模式下还有跨进程文件锁), 并先追上其他进程的修改。
+
+        用于 "先检查再修改" 的场景, 例如添加前检查是否已在库中; 块内的修改应传 durable=False。
+        """
+        with self.lock, self._locked():
+            if self.shared:
+                self._catch_up()
+            yield self
+
+    def _catch_up(self):
+        """重放其他进程追加的 journal 尾部; journal 已被其他进程压缩替换时重新加载。调用方需持有两把锁。"""
+        try:
+            st = os.stat(self.journal_path)
+        except OSError:
+            return
+        with open(self.journal_path, 'rb') as f:
+            # inode 号在文件被替换后可能被复用, 所以用第一行的 checkpoint 判断 journal 是否已被压缩替换
+            header = f.readline()
+            if header != self._checkpoint_line:
+                try:
+                    checkpoint = json.loads(header)
+                except ValueError:
+                    checkpoint = {}
+                if checkpoint.get('op') != 'checkpoint' or checkpoint.get('epoch') != self.instance_id \
+                        or checkpoint.get('version') != self.version:
+                    # 压缩前还有没见过的修改 (或电影库被重建了), 只能整体重新加载
+                    self._reload_and_notify()
+                    return
+                self._checkpoint_line = header
+                self._journal_bytes = len(header)
+            f.seek(self._journal_bytes)
+            tail = f.read()
+        # 只处理完整的行, 写了一半的最后一行留到下次
+        tail = tail[:tail.rfind(b'\n') + 1]
+        for line in tail.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"跳过 {self.journal_path} 中损坏的日志记录")
+                continue
+            if entry.get('op') == 'checkpoint' or entry.get('version', 0) <= self.version:
+                continue
+            self._apply(entry)
+            self.version = entry['version']
+            self._history.append(entry)
+            self._notify(entry)
+        self._journal_bytes += len(tail)
+        if tail:
+            self.last_modified = st.st_mtime
+        self._journal_sig = self._stat_sig(st)
+
+    @staticmethod
+    def _stat_sig(st):
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _reload_and_notify(self):
+        self.load()
+        # 重新加载无法表示成增量, 让监听器按 "清空 + 逐条添加" 重建各自的状态
+        self._notify({'op': 'clear'})
+        for list_name, movies in self._lists.items():
+            for index, movie in enumerate(movies):
+                self._notify({'op': 'add', 'list': list_name, 'index': index, 'movie': movie})
+
+    def find_by_tmdb_id(self, tmdb_id):
+        """按TMDB ID查找库中的电影, 返回 (list_name, movie_id), 不在库中时返回 None。"""
+        movie_id = self._by_tmdb_id.get(int(tmdb_id))
+        entry = self._by_id.get(movie_id)
+        return (entry[0], movie_id) if entry else None
+
+    def iter_movies(self):
+        """遍历 (list_name, movie), 调用方需要一致性时应持有 self.lock。"""
+        for name, lst in self.snapshot().items():
+            for movie in lst:
+                yield name, movie
+
+    # --- 修改 ---
+    # durable=True (默认) 时, 方法会等到这条修改 fsync 落盘之后才返回。
+    # 持有 self.lock 时必须传 durable=False, 释放锁之后再调用 wait_durable(), 否则写线程拿不到锁。
+    def add(self, list_name, movie, index=0, durable=True):
+        """把电影插入到指定列表 (默认插到最前面), ID 已存在时返回 False。"""
+        if list_name not in LIST_NAMES:
+            raise KeyError(list_name)
+        movie = stored_movie(movie)
+        return self._commit({'op': 'add', 'list': list_name, 'index': index, 'movie': movie}, durable)
+
+    def delete(self, list_name, movie_id, durable=True):
+        """删除一部电影, 返回是否真的删掉了。"""
+        return self._commit({'op': 'delete', 'list': list_name, 'id': movie_id}, durable)
+
+    def move(self, movie_id, from_list, to_list, new_id=None, index=0, durable=True):
+        """把电影移动到另一个列表, 可以同时改写它的ID; 新ID已被占用时返回 False。"""
+        if to_list not in LIST_NAMES:
+            raise KeyError(to_list)
+        with self.transaction():
+            if new_id and new_id != movie_id and new_id in self._by_id:
+                return False
+            if not self._commit({'op': 'move', 'from': from_list, 'to': to_list, 'id': movie_id,
+                                 'new_id': new_id or movie_id, 'index': index}, durable=False):
+                return False
+            version = self.version
+        if durable:
+            self.wait_durable(version)
+        return True
+
+    def update(self, list_name, movie, durable=True):
+        """用新内容替换列表中同ID的电影, 位置不变; 电影不在该列表中时返回 False。"""
+        movie = stored_movie(movie)
+        return self._commit({'op': 'update', 'list': list_name, 'movie': movie}, durable)
+
+    def clear(self, durable=True):
+        """清空整个电影库。"""
+        self._commit({'op': 'clear'}, durable)
+
+    def apply_batch(self, ops, atomic=True, durable=True):
+        """
+        在一次提交里执行一批 add / delete / move / update, 整批只写一条 batch 日志记录。
+
+        Args:
+            ops (list): 修改记录, 格式和 add / delete / move / update 的日志记录相同。
+            atomic (bool): 为 True 时只要有一项不能执行, 整批都不执行;
+                为 False 时跳过不能执行的项, 其余的照常提交。
+
+        Returns:
+            list: 每一项的错误信息, 可以执行的项为 None。
+        """
+        ops = _stored_ops(ops)
+        with self.transaction():
+            errors = self._check_batch(ops)
+            valid = [op for op, error in zip(ops, errors) if error is None]
+            if not valid or (atomic and len(valid) < len(ops)):
+                return errors
+            self._commit({'op': 'batch', 'ops': valid}, durable=False)
+            version = self.version
+        if durable:
+            self.wait_durable(version)
+        return errors
+
+    def _check_batch(self, ops):
+        """按顺序检查一批修改能否执行, 后面的项会看到前面各项的效果。"""
+        located = {}  # 本批次中位置发生变化的ID -> 所在列表, 已删除为 None
+
+        def where(movie_id):
+            if movie_id in located:
+                return located[movie_id]
+            entry = self._by_id.get(movie_id)
+            return entry[0] if entry else None
+
+        errors = []
+        for op in ops:
+            kind, error = op.get('op'), None
+            if kind == 'add':
+                movie_id = op['movie'].get('id')
+                if op.get('list') not in LIST_NAMES:
+                    error = "未知的列表"
+                elif where(movie_id) is not None:
+                    error = "电影已存在"
+                else:
+                    located[movie_id] = op['list']
+            elif kind == 'delete':
+                if where(op.get('id')) != op.get('list'):
+                    error = "电影不存在"
+                else:
+                    located[op['id']] = None
+            elif kind == 'move':
+                new_id = op.get('new_id') or op.get('id')
+                if op.get('to') not in LIST_NAMES:
+                    error = "未知的列表"
+                elif where(op.get('id')) != op.get('from'):
+                    error = "电影不存在"
+                elif new_id != op['id'] and where(new_id) is not None:
+                    error = "目标ID已被占用"
+                else:
+                    located[op['id']] = None
+                    located[new_id] = op['to']
+            elif kind == 'update':
+                if where(op['movie'].get('id')) != op.get('list'):
+                    error = "电影不存在"
+            else:
+                error = "未知的操作"
+            errors.append(error)
+        return errors
+
+    def _commit(self, entry, durable):
+        with self.transaction():
+            if not self._apply(entry):
+                return False
+            self.version += 1
+            entry['version'] = self.version
+            line = json.dumps(entry, ensure_ascii=False) + '\n'
+            if self.shared:
+                # 多进程模式下记录必须在文件锁内按序号写入 journal, 其他进程才能按顺序重放;
+                # 这里只 write 不 fsync, fsync 仍由写线程分组完成
+                try:
+                    self._append_journal(line.encode('utf-8'))
+                except OSError:
+                    # 记录没能写进 journal, 其他进程永远看不到它: 丢掉内存里已经应用的修改
+                    self._reload_and_notify()
+                    raise
+            else:
+                self._journal_buffer.append(line)
+            self._history.append(entry)
+            self.last_modified = time.time()
+            self._notify(entry)
+        self._pending.set()
+        if durable:
+            self.wait_durable(entry['version'])
+        return True
+
+    def wait_durable(self, version):
+        """
+        等待包含 version 的那一批记录 fsync 完成。
+
+        Raises:
+            DurabilityError: 包含 version 的那一批写入失败, 或等待超时。修改本身已经生效,
+                写线程会继续重试; 更新的修改不受之前失败的批次影响, 仍然等待下一次写入。
+        """
+        deadline = time.time() + self.DURABLE_TIMEOUT
+        with self._durable:
+            if self._durable_version < version:
+                # 多进程模式下 version 可能来自其他进程的记录, 本进程的写线程也要被唤醒去 fsync
+                self._urgent.set()
+                self._pending.set()
+            while self._durable_version < version:
+                failure = self._write_failure
+                if failure is not None and failure[0] >= version:
+                    raise DurabilityError(f"电影库修改尚未落盘: {failure[1]}")
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise DurabilityError("电影库修改尚未落盘: 等待超时")
+                self._durable.wait(remaining)
+
+    def _mark_durable(self, version, error=None):
+        with self._durable:
+            if error is None:
+                self._durable_version = max(self._durable_version, version)
+                self._write_failure = None
+            else:
+                self._write_failure = (version, error)
+            self._durable.notify_all()
+
+    def _apply(self, entry):
+        """
+        把一条修改记录应用到内存中。
+
+        所有操作都是幂等的: 压缩过程中如果在写完快照、清空 journal 之前崩溃,
+        重放已经合并进快照的记录不会产生重复数据。
+        """
+        op = entry.get('op')
+        if op == 'add':
+            # 日志里保存的是 dict, 内存里统一转成紧凑的 MovieRecord
+            movie = MovieRecord.coerce(entry['movie'])
+            if movie.get('id') in self._by_id:
+                return False
+            self._lists[entry['list']].insert(entry.get('index', 0), movie)
+            self._index(entry['list'], movie)
+        elif op == 'delete':
+            if self.get(entry['list'], entry['id']) is None:
+                return False
+            self._remove(entry['list'], entry['id'])
+        elif op == 'move':
+            movie = self.get(entry['from'], entry['id'])
+            if movie is None:
+                return False
+            self._remove(entry['from'], entry['id'])
+            new_id = entry.get('new_id') or entry['id']
+            if new_id in self._by_id:
+                return True
+            moved = movie.with_id(new_id)
+            self._lists[entry['to']].insert(entry.get('index', 0), moved)
+            self._index(entry['to'], moved)
+        elif op == 'update':
+            movie = MovieRecord.coerce(entry['movie'])
+            movie_id = movie.get('id')
+            if self.get(entry['list'], movie_id) is None:
+                return False
+            movies = self._lists[entry['list']]
+            movies[next(i for i, m in enumerate(movies) if m.get('id') == movie_id)] = movie
+            self._index(entry['list'], movie)
+        elif op == 'clear':
+            self._lists = empty_library()
+            self._by_id = {}
+            self._by_tmdb_id = {}
+        elif op == 'batch':
+            # 提交前已经检查过整批都能执行; 重放时逐项幂等地应用
+            applied = [self._apply(sub) for sub in entry['ops']]
+            return any(applied)
+        else:
+            print(f"未知的日志操作: {op}")
+            return False
+        return True
+
+    def _remove(self, list_name, movie_id):
+        self._lists[list_name] = [m for m in self._lists[list_name] if m.get('id') != movie_id]
+        self._by_id.pop(movie_id, None)
+        tmdb_id = parse_tmdb_id(movie_id)
+        if self._by_tmdb_id.get(tmdb_id) == movie_id:
+            del self._by_tmdb_id[tmdb_id]
+
+    # --- 持久化 ---
+    def _append_journal(self, payload, fsync=False):
+        """把 payload 追加到 journal; 写入失败时把文件截回原来的长度, 不留下写了一半的行。"""
+        with open(self.journal_path, 'ab') as f:
+            start = f.tell()
+            try:
+                f.write(payload)
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+            except BaseException:
+                try:
+                    f.truncate(start)
+                except OSError:
+                    pass
+                raise
+            self._journal_sig = self._stat_sig(os.fstat(f.fileno()))
+        self._journal_bytes += len(payload)
+
+    def flush(self):
+        """把缓冲中的整批修改记录用一次 write + 一次 fsync 追加到 journal。"""
+        with self._write_lock:
+            with self.lock:
+                lines, self._journal_buffer = self._journal_buffer, []
+                version = self.version
+            # 多进程模式下记录在提交时已经写入 journal, 这里只需要 fsync
+            if lines or (self.shared and self._durable_version < version):
+                try:
+                    self._append_journal(''.join(lines).encode('utf-8'), fsync=True)
+                except Exception as e:
+                    # 放回缓冲, 下一次写入时重试; 等待这一批的请求会收到 DurabilityError
+                    with self.lock:
+                        self._journal_buffer[:0] = lines
+                    self._mark_durable(version, error=e)
+                    raise
+            self._mark_durable(version)
+
+    def compact(self):
+        """把当前内存状态写成新快照, 然后用只含 checkpoint 的新 journal 替换旧 journal。"""
+        with self._write_lock:
+            # 多进程模式下整个压缩过程都要持有文件锁, 否则其他进程可能在
+            # 快照之后、替换 journal 之前追加记录, 这些记录会随旧 journal 一起丢失
+            with self.transaction() if self.shared else nullcontext():
+                with self.lock:
+                    data = self.snapshot()
+                    version = self.version
+                    # 缓冲里尚未写盘的记录已经包含在快照里了
+                    self._journal_buffer = []
+                self._atomic_write(self.path, encode_snapshot(self.path, data))
+                checkpoint = (json.dumps({'op': 'checkpoint', 'version': version, 'epoch': self.instance_id})
+                              + '\n').encode('utf-8')
+                self._atomic_write(self.journal_path, checkpoint)
+                self._journal_sig = self._stat_sig(os.stat(self.journal_path))
+                self._checkpoint_line = checkpoint
+                self._journal_bytes = len(checkpoint)
+            self._mark_durable(version)
+
+    def _atomic_write(self, path, payload):
+        """临时文件 + fsync + 原子替换, 崩溃时磁盘上只会是旧文件或新文件。"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.movies-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _flush_loop(self):
+        while not self._closing.is_set():
+            self._pending.wait()
+            # 没有请求在等待确认时, 按 flush_interval 延迟写入 (write-behind);
+            # 一旦有请求在等待, 只再等一个分组窗口收集同一批修改
+            if self._urgent.wait(self.flush_interval) and not self._closing.is_set():
+                time.sleep(self.group_commit_window)
+            self._pending.clear()
+            self._urgent.clear()
+            try:
+                self.flush()
+                if self._journal_bytes - len(self._checkpoint_line) >= self.compact_bytes:
+                    self.compact()
+            except Exception as e:
+                print(f"写入电影库 {self.path} 失败, 稍后重试: {e}")
+                self._pending.set()
+
+    def close(self):
+        """停止后台写线程, 并把所有修改合并进快照。"""
+        self._closing.set()
+        self._pending.set()
+        self._urgent.set()
+        self._writer.join(timeout=self.flush_interval + 5)
+        self.flush()
+        # 多进程模式下其他 worker 可能还在运行, 只有 journal 确实过大时才压缩
+        threshold = self.compact_bytes if self.shared else 0
+        if self._journal_bytes - len(self._checkpoint_line) > threshold:
+            self.compact()
+
+
+class SqliteMovieStore:
+    """
+    基于 SQLite 的电影库存储引擎, 和 MovieStore 提供相同的接口。
+
+    每部电影一行, 完整的电影对象以 JSON 保存在 data 列里; tmdb_id / list_name / year / title
+    单独成列并建索引。数据库运行在 WAL 模式下, 读请求不会被写入阻塞。
+    适合几万部以上、整文件 JSON 已经吃不消的电影库。
+    version / last_modified 保存在 meta 表里, 随每个有实际修改的写事务一起更新;
+    每条修改记录同时写入 changes 表 (只保留最近 history_limit 条), 供增量同步使用。
+
+    Args:
+        path (str): SQLite 数据库文件路径。
+        history_limit (int): changes 表中保留多少条修改记录。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS movies (
+            id TEXT PRIMARY KEY,
+            list_name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            tmdb_id INTEGER,
+            media_type TEXT,
+            title TEXT,
+            year TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_movies_list ON movies (list_name, position);
+        CREATE INDEX IF NOT EXISTS idx_movies_tmdb_id ON movies (tmdb_id);
+        CREATE INDEX IF NOT EXISTS idx_movies_year ON movies (year);
+        CREATE INDEX IF NOT EXISTS idx_movies_title ON movies (title);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value
+        );
+        INSERT OR IGNORE INTO meta VALUES ('version', 0);
+        INSERT OR IGNORE INTO meta VALUES ('last_modified', 0);
+        CREATE TABLE IF NOT EXISTS changes (
+            version INTEGER PRIMARY KEY,
+            entry TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path, history_limit=1000):
+        self.path = path
+        self.history_limit = history_limit
+        self._listeners = []
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        # 每次提交都 fsync: 修改请求返回 200 之前必须已经落盘
+        self._connections = ThreadConnections(path, synchronous='FULL')
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('instance_id', ?)", (uuid.uuid4().hex[:12],))
+        self.instance_id = self._meta('instance_id')
+        self._seen_version = self.version
+
+    def _conn(self):
+        """每个线程一个连接, 线程结束时关闭; WAL 模式下多个读连接可以和写连接并发。"""
+        return self._connections.get()
+
+    @contextmanager
+    def _write_txn(self):
+        conn = self._conn()
+        with self.lock:
+            if getattr(self._local, 'depth', 0):
+                # 嵌套在 transaction() 里时复用外层事务, 由外层统一提交
+                self._local.depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._local.depth -= 1
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            self._local.depth = 1
+            self._local.committed = []
+            try:
+                # 已经拿到数据库写锁, 先把其他进程提交的修改通知给本进程的监听器
+                self._catch_up(conn)
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            finally:
+                self._local.depth = 0
+            conn.execute('COMMIT')
+            for entry in self._local.committed:
+                self._notify(entry)
+                self._seen_version = entry['version']
+
+    @contextmanager
+    def transaction(self):
+        """在同一个写事务里完成 "先检查再修改", 块内的所有修改一起提交; 多个进程之间也是串行的。"""
+        with self._write_txn():
+            yield self
+
+    def refresh(self):
+        """把其他进程提交的修改通知给本进程的监听器; 没有新修改时只需要读一次版本号。"""
+        with self.lock:
+            if self.version == self._seen_version:
+                return
+            conn = self._conn()
+            conn.execute('BEGIN')
+            try:
+                self._catch_up(conn)
+            finally:
+                conn.execute('COMMIT')
+
+    def _catch_up(self, conn):
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        if version == self._seen_version:
+            return
+        rows = conn.execute('SELECT version, entry FROM changes WHERE version > ? ORDER BY version',
+                            (self._seen_version,)).fetchall()
+        if rows and rows[0][0] == self._seen_version + 1:
+            for _, raw in rows:
+                self._notify(json.loads(raw))
+        else:
+            # 中间的修改记录已被清理 (或整库被替换), 让监听器按 "清空 + 逐条添加" 重建
+            self._notify({'op': 'clear'})
+            counts = dict.fromkeys(LIST_NAMES, 0)
+            for list_name, raw in conn.execute('SELECT list_name, data FROM movies ORDER BY list_name, position'):
+                self._notify({'op': 'add', 'list': list_name, 'index': counts[list_name], 'movie': json.loads(raw)})
+                counts[list_name] += 1
+        self._seen_version = version
+
+    def add_listener(self, callback):
+        """注册一个回调, 每条修改提交后都会以修改记录为参数调用它 (持有 self.lock)。"""
+        self._listeners.append(callback)
+
+    def _notify(self, entry):
+        for callback in self._listeners:
+            try:
+                callback(entry)
+            except Exception as e:
+                print(f"电影库监听器处理修改记录时出错: {e}")
+
+    def _record_change(self, conn, entry):
+        """在当前写事务里推进版本号, 并把这条修改记入 changes 表。"""
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'last_modified'", (time.time(),))
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        entry['version'] = version
+        conn.execute('INSERT INTO changes VALUES (?, ?)', (version, json.dumps(entry, ensure_ascii=False)))
+        conn.execute('DELETE FROM changes WHERE version <= ?', (version - self.history_limit,))
+        self._local.committed.append(entry)
+
+    def _meta(self, key):
+        row = self._conn().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def version(self):
+        return self._meta('version')
+
+    @property
+    def last_modified(self):
+        return self._meta('last_modified') or time.time()
+
+    @staticmethod
+    def _row_values(list_name, position, movie):
+        movie = stored_movie(movie)
+        return (movie.get('id'), list_name, position, parse_tmdb_id(movie.get('id')), movie.get('media_type'),
+                movie.get('title'), str(movie.get('year', '')), json.dumps(movie, ensure_ascii=False))
+
+    @staticmethod
+    def _load_row(raw):
+        return MovieRecord.from_dict(json.loads(raw))
+
+    # --- 读取 ---
+    def load(self):
+        """SQLite 引擎不需要预加载, 保留这个方法只是为了和 MovieStore 接口一致。"""
+
+    def snapshot(self):
+        """按列表和顺序读出整个电影库。"""
+        data = empty_library()
+        rows = self._conn().execute('SELECT list_name, data FROM movies ORDER BY list_name, position')
+        for list_name, raw in rows:
+            data.setdefault(list_name, []).append(self._load_row(raw))
+        return data
+
+    def get(self, list_name, movie_id):
+        """按列表名和ID取出一部电影, 不存在时返回 None。"""
+        row = self._conn().execute('SELECT data FROM movies WHERE id = ? AND list_name = ?',
+                                   (movie_id, list_name)).fetchone()
+        return self._load_row(row[0]) if row else None
+
+    def locate(self, movie_id):
+        """返回电影当前所在的列表名, 不在库中时返回 None。"""
+        row = self._conn().execute('SELECT list_name FROM movies WHERE id = ?', (movie_id,)).fetchone()
+        return row[0] if row else None
+
+    def page(self, list_name, offset=0, limit=None):
+        """返回某个列表中从 offset 开始的最多 limit 部电影, 以及该列表的总数。"""
+        conn = self._conn()
+        rows = conn.execute('SELECT data FROM movies WHERE list_name = ? ORDER BY position LIMIT ? OFFSET ?',
+                            (list_name, -1 if limit is None else limit, offset)).fetchall()
+        total = conn.execute('SELECT COUNT(*) FROM movies WHERE list_name = ?', (list_name,)).fetchone()[0]
+        return [self._load_row(raw) for (raw,) in rows], total
+
+    def changes_since(self, version):
+        """返回 version 之后的所有修改记录; 历史已被丢弃时返回 None, 表示需要全量同步。"""
+        conn = self._conn()
+        current = self.version
+        oldest = conn.execute('SELECT MIN(version) FROM changes').fetchone()[0]
+        floor = oldest - 1 if oldest is not None else current
+        if version < floor or version > current:
+            return None
+        rows = conn.execute('SELECT entry FROM changes WHERE version > ? ORDER BY version', (version,))
+        return [json.loads(raw) for (raw,) in rows]
+
+    def find_by_tmdb_id(self, tmdb_id):
+        """按TMDB ID查找库中的电影, 返回 (list_name, movie_id), 不在库中时返回 None。"""
+        row = self._conn().execute('SELECT list_name, id FROM movies WHERE tmdb_id = ? LIMIT 1',
+                                   (int(tmdb_id),)).fetchone()
+        return tuple(row) if row else None
+
+    def iter_movies(self):
+        """遍历 (list_name, movie)。"""
+        for list_name, raw in self._conn().execute('SELECT list_name, data FROM movies ORDER BY list_name, position'):
+            yield list_name, self._load_row(raw)
+
+    # --- 修改 ---
+    def _insert_position(self, conn, list_name, index):
+        if index == 0:
+            row = conn.execute('SELECT MIN(position) FROM movies WHERE list_name = ?', (list_name,)).fetchone()
+            return (row[0] - 1) if row[0] is not None else 0
+        row = conn.execute('SELECT position FROM movies WHERE list_name = ? ORDER BY position LIMIT 1 OFFSET ?',
+                           (list_name, index)).fetchone()
+        if row is None:
+            row = conn.execute('SELECT MAX(position) FROM movies WHERE list_name = ?', (list_name,)).fetchone()
+            return (row[0] + 1) if row[0] is not None else 0
+        conn.execute('UPDATE movies SET position = position + 1 WHERE list_name = ? AND position >= ?',
+                     (list_name, row[0]))
+        return row[0]
+
+    # 每个修改都是一个独立提交的事务, durable 参数和 wait_durable() 只是为了和 MovieStore 的接口保持一致
+    def wait_durable(self, version):
+        """连接使用 synchronous=FULL, 事务提交时已经落盘, 不需要等待。"""
+
+    def add(self, list_name, movie, index=0, durable=True):
+        """把电影插入到指定列表 (默认插到最前面), ID 已存在时返回 False。"""
+        if list_name not in LIST_NAMES:
+            raise KeyError(list_name)
+        movie = stored_movie(movie)
+        return self._commit({'op': 'add', 'list': list_name, 'index': index, 'movie': movie})
+
+    def delete(self, list_name, movie_id, durable=True):
+        """删除一部电影, 返回是否真的删掉了。"""
+        return self._commit({'op': 'delete', 'list': list_name, 'id': movie_id})
+
+    def move(self, movie_id, from_list, to_list, new_id=None, index=0, durable=True):
+        """把电影移动到另一个列表, 可以同时改写它的ID; 新ID已被占用时返回 False。"""
+        if to_list not in LIST_NAMES:
+            raise KeyError(to_list)
+        return self._commit({'op': 'move', 'from': from_list, 'to': to_list, 'id': movie_id,
+                             'new_id': new_id or movie_id, 'index': index})
+
+    def apply_batch(self, ops, atomic=True, durable=True):
+        """在一个事务里执行一批 add / delete / move / update, 只记一条 batch 修改记录; 参数和返回值同 MovieStore。"""
+        ops = _stored_ops(ops)
+        with self._write_txn() as conn:
+            conn.execute('SAVEPOINT batch')
+            errors = [self._apply(conn, op) for op in ops]
+            valid = [op for op, error in zip(ops, errors) if error is None]
+            if not valid or (atomic and len(valid) < len(ops)):
+                conn.execute('ROLLBACK TO batch')
+                conn.execute('RELEASE batch')
+                return errors
+            conn.execute('RELEASE batch')
+            self._record_change(conn, {'op': 'batch', 'ops': valid})
+        return errors
+
+    def _commit(self, entry):
+        with self._write_txn() as conn:
+            if self._apply(conn, entry) is not None:
+                return False
+            self._record_change(conn, entry)
+        return True
+
+    def _apply(self, conn, entry):
+        """在当前事务里执行一条 add / delete / move / update, 返回错误信息, 成功时返回 None。"""
+        op = entry.get('op')
+        if op == 'add':
+            movie = entry['movie']
+            if entry.get('list') not in LIST_NAMES:
+                return "未知的列表"
+            if conn.execute('SELECT 1 FROM movies WHERE id = ?', (movie.get('id'),)).fetchone():
+                return "电影已存在"
+            position = self._insert_position(conn, entry['list'], entry.get('index', 0))
+            conn.execute('INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         self._row_values(entry['list'], position, movie))
+        elif op == 'delete':
+            cursor = conn.execute('DELETE FROM movies WHERE id = ? AND list_name = ?',
+                                  (entry.get('id'), entry.get('list')))
+            if cursor.rowcount == 0:
+                return "电影不存在"
+        elif op == 'move':
+            movie_id = entry.get('id')
+            new_id = entry.get('new_id') or movie_id
+            if entry.get('to') not in LIST_NAMES:
+                return "未知的列表"
+            row = conn.execute('SELECT data FROM movies WHERE id = ? AND list_name = ?',
+                               (movie_id, entry.get('from'))).fetchone()
+            if row is None:
+                return "电影不存在"
+            if new_id != movie_id and conn.execute('SELECT 1 FROM movies WHERE id = ?', (new_id,)).fetchone():
+                return "目标ID已被占用"
+            conn.execute('DELETE FROM movies WHERE id = ?', (movie_id,))
+            moved = dict(json.loads(row[0]), id=new_id)
+            position = self._insert_position(conn, entry['to'], entry.get('index', 0))
+            conn.execute('INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         self._row_values(entry['to'], position, moved))
+        elif op == 'update':
+            movie = entry['movie']
+            row = conn.execute('SELECT position FROM movies WHERE id = ? AND list_name = ?',
+                               (movie.get('id'), entry.get('list'))).fetchone()
+            if row is None:
+                return "电影不存在"
+            conn.execute('REPLACE INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         self._row_values(entry['list'], row[0], movie))
+        else:
+            return "未知的操作"
+        return None
+
+    def update(self, list_name, movie, durable=True):
+        """用新内容替换列表中同ID的电影, 位置不变; 电影不在该列表中时返回 False。"""
+        movie = stored_movie(movie)
+        return self._commit({'op': 'update', 'list': list_name, 'movie': movie})
+
+    def clear(self, durable=True):
+        """清空整个电影库。"""
+        with self._write_txn() as conn:
+            conn.execute('DELETE FROM movies')
+            self._record_change(conn, {'op': 'clear'})
+
+    def replace_all(self, data):
+        """在一个事务里用 data (和 movies.json 相同的结构) 替换整个电影库。"""
+        with self._write_txn() as conn:
+            conn.execute('DELETE FROM movies')
+            conn.executemany('INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (self._row_values(name, position, movie)
+                              for name in LIST_NAMES
+                              for position, movie in enumerate(data.get(name, []))))
+            # 整库替换无法表示成增量, 清空历史让所有客户端重新全量同步
+            self._record_change(conn, {'op': 'clear'})
+            conn.execute('DELETE FROM changes')
+
+    # --- 持久化 ---
+    def flush(self):
+        """每次修改都在自己的事务里提交, 没有需要刷新的缓冲。"""
+
+    def compact(self):
+        """把 WAL 合并回主数据库文件。"""
+        self._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        """合并 WAL 并关闭所有线程的连接。"""
+        try:
+            self.compact()
+        except sqlite3.Error as e:
+            print(f"合并 {self.path} 的 WAL 失败: {e}")
+        self._connections.close_all()
+        self._local = threading.local()
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """
+    一次性把 movies.json (连同尚未压缩的 journal) 迁移到 SQLite 数据库。
+
+    Args:
+        json_path (str): 源 JSON 快照路径。
+        db_path (str): 目标 SQLite 数据库路径, 已有数据会被整体替换。
+
+    Returns:
+        int: 迁移的电影数量。
+    """
+    json_store = MovieStore(json_path)
+    data = json_store.snapshot()
+    json_store.close()
+    sqlite_store = SqliteMovieStore(db_path)
+    sqlite_store.replace_all(data)
+    sqlite_store.close()
+    return sum(len(movies) for movies in data.values())
+
+
+def convert_snapshot(src_path, dst_path):
+    """
+    在 JSON 快照和二进制快照之间导入/导出, 格式按扩展名判断。
+
+    源快照对应的 journal 会先被合并进去; 如果两个文件同名 (movies.json / movies.mvs),
+    它们共用同一个 movies.journal, 转换之后可以直接切换 app 使用的快照文件。
+
+    Returns:
+        int: 转换的电影数量。
+    """
+    store = MovieStore(src_path)
+    data = store.snapshot()
+    store.close()
+    store._atomic_write(dst_path, encode_snapshot(dst_path, data))
+    return sum(len(movies) for movies in data.values())
+
+
+if __name__ == '__main__':
+    # 用法: python movie_store.py migrate movies.json movies.db
+    #       python movie_store.py convert movies.json movies.mvs   (导入为二进制快照, 反过来即导出为 JSON)
+    if len(sys.argv) == 4 and sys.argv[1] == 'migrate':
+        count = migrate_json_to_sqlite(sys.argv[2], sys.argv[3])
+        print(f"已将 {count} 部电影从 {sys.argv[2]} 迁移到 {sys.argv[3]}")
+    elif len(sys.argv) == 4 and sys.argv[1] == 'convert':
+        count = convert_snapshot(sys.argv[2], sys.argv[3])
+        print(f"已将 {count} 部电影从 {sys.argv[2]} 转换到 {sys.argv[3]}")
+    else:
+        print("用法: python movie_store.py migrate <movies.json> <movies.db>")
+        print("      python movie_store.py convert <movies.json|movies.mvs> <movies.mvs|movies.json>")
@@ -0,0 +1,58 @@
+import sqlite3
+import threading
+import weakref
+
+
+class _Holder:
+    """线程局部变量里保存的连接包装; 线程结束、它被回收时连接随之关闭。"""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ThreadConnections:
+    """
+    每个线程各用一个 SQLite 连接 (WAL 模式), 线程结束时自动关闭它的连接。
+
+    Flask/SocketIO 的线程模式每个请求都是一个新线程, 如果把连接存进一个普通列表,
+    每个请求都会留下一个永远不关闭的连接和它的文件描述符。这里连接只被线程局部变量引用,
+    线程退出后由 weakref.finalize 关闭; close_all() 关闭所有仍然存活的连接。
+
+    synchronous 是连接的 PRAGMA synchronous: WAL 模式下 'NORMAL' 提交时不 fsync, 断电可能丢掉最后几个事务
+    (缓存这类可以重新获取的数据够用); 'FULL' 每次提交都 fsync, 提交返回时数据已经落盘。
+    """
+
+    def __init__(self, path, timeout=30, synchronous='NORMAL'):
+        self.path = path
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self._holders = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """当前线程的连接, 第一次调用时创建。"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            holder = self._local.holder = _Holder(conn)
+            weakref.finalize(holder, conn.close)
+            with self._lock:
+                self._holders.add(holder)
+        return holder.conn
+
+    def __len__(self):
+        """当前打开着的连接数。"""
+        with self._lock:
+            return len(self._holders)
+
+    def close_all(self):
+        with self._lock:
+            holders = list(self._holders)
+            self._holders.clear()
+            self._local = threading.local()
+        for holder in holders:
+            holder.conn.close()
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块 (movie_store, tmdb_client, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_tmdb_server  # noqa: E402
+from movie_store import MovieStore  # noqa: E402
+
+
+def movie(list_name, tmdb_id, title=None):
+    return {'id': f"{list_name}-{tmdb_id}", 'media_type': 'movie', 'title': title or f"电影 {tmdb_id}",
+            'year': '2001', 'posters': [f"https://image.tmdb.org/t/p/original/p{tmdb_id}.jpg"], 'stills': []}
+
+
+def ids(store, list_name):
+    return [m.get('id') for m in store.snapshot()[list_name]]
+
+
+def open_store(path, **kwargs):
+    # flush_interval 设得很长, 测试里由 durable=True / flush() / close() 决定何时写盘
+    kwargs.setdefault('flush_interval', 60)
+    kwargs.setdefault('compact_bytes', 1 << 30)
+    return MovieStore(path, **kwargs)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'movies.json')
+
+
+@pytest.fixture
+def fake_tmdb(tmp_path):
+    """按给定的命令行参数启动 fake_tmdb_server, 返回 (API 基础地址, FakeTmdb 状态)。"""
+    servers = []
+
+    def start(*argv):
+        args = fake_tmdb_server.parse_args(['--port', '0', '--quiet', '--fixtures', str(tmp_path / 'fixtures'),
+                                            *map(str, argv)])
+        server = fake_tmdb_server.make_server(args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}{fake_tmdb_server.API_PREFIX}", server.tmdb
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def wait_for_refreshes(app_module, timeout=10):
+    """等 app 在后台提交的电影刷新全部结束。"""
+    deadline = time.monotonic() + timeout
+    while app_module._refreshing_movies:
+        assert time.monotonic() < deadline, "background refresh did not finish"
+        time.sleep(0.01)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """
+    导入 app。它在导入时就在当前目录创建数据文件并打开电影库, 所以在临时目录里导入;
+    整个测试会话只导入一次, 每个测试再用 app_client 换上自己的电影库和 TMDB。
+    """
+    work = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('TMDB_API_BASE_URL', 'http://127.0.0.1:9/3')
+        mp.setenv('TMDB_CACHE_FILE', str(work / 'tmdb_cache.db'))
+        mp.setenv('TMDB_PREFETCH_PER_MINUTE', '0')
+        os.chdir(work)
+        try:
+            import app
+        finally:
+            os.chdir(cwd)
+    return app
+
+
+@pytest.fixture
+def app_client(app_module, fake_tmdb, tmp_path, monkeypatch):
+    """
+    app 的 Flask 测试客户端, 电影库、TMDB 缓存和 TMDB 客户端都换成这个测试自己的。
+    返回 (client, store, tmdb), tmdb 是 fake_tmdb_server 的状态, tmdb.stats 记录了收到的请求。
+    """
+    from library_search import LibrarySearchIndex
+    from tmdb_cache import TmdbCache
+    from tmdb_client import TmdbClient
+
+    base_url, tmdb = fake_tmdb()
+    store = open_store(str(tmp_path / 'movies.json'), flush_interval=0.05)
+    index = LibrarySearchIndex()
+    store.add_listener(index.apply_change)
+    client = TmdbClient(app_module.TMDB_API_KEY, base_url)
+    cache = TmdbCache(str(tmp_path / 'tmdb_cache.db'), default_ttl=app_module.TMDB_DETAILS_TTL)
+    monkeypatch.setattr(app_module, 'movie_store', store)
+    monkeypatch.setattr(app_module, 'library_index', index)
+    monkeypatch.setattr(app_module, 'library_response_cache', app_module.LibraryResponseCache())
+    monkeypatch.setattr(app_module, 'tmdb_client', client)
+    monkeypatch.setattr(app_module, 'tmdb_cache', cache)
+    yield app_module.app.test_client(), store, tmdb
+    # 等后台刷新跑完再关闭, 避免它们用到已经关闭的库
+    wait_for_refreshes(app_module)
+    store.close()
+    client.close()
+    cache.close()
@@ -0,0 +1,57 @@
+import time
+
+from conftest import wait_for_refreshes
+
+
+def add(client, tmdb_id, target_list='watched'):
+    response = client.post('/api/add', json={'tmdb_id': tmdb_id, 'media_type': 'movie', 'target_list': target_list})
+    assert response.status_code == 200, response.json
+    return f"{target_list}-{tmdb_id}"
+
+
+def test_stale_record_is_refreshed_from_tmdb_not_the_cache(app_module, app_client, monkeypatch):
+    client, store, tmdb = app_client
+    monkeypatch.setattr(app_module, 'TMDB_REFRESH_AGE', 3600)
+    movie_id = add(client, 100)
+    # 记录两小时前补全过; 详情缓存 (默认7天) 里仍然留着当时的响应
+    stale = dict(store.get('watched', movie_id).to_dict(), enriched_at=int(time.time()) - 7200)
+    store.update('watched', stale)
+    requests_before = tmdb.stats['requests']
+
+    response = client.get(f'/api/movie_data/watched/{movie_id}')
+    assert response.status_code == 200
+    assert response.json['enriched_at'] == stale['enriched_at']  # 先返回旧记录
+    wait_for_refreshes(app_module)
+
+    assert tmdb.stats['requests'] > requests_before
+    assert store.get('watched', movie_id).get('enriched_at') > stale['enriched_at']
+
+
+def test_fresh_record_is_served_without_tmdb(app_module, app_client):
+    client, store, tmdb = app_client
+    movie_id = add(client, 101)
+    requests_before = tmdb.stats['requests']
+
+    response = client.get(f'/api/movie_data/watched/{movie_id}')
+    assert response.status_code == 200 and response.json['title'] == "电影 101"
+    wait_for_refreshes(app_module)
+    assert tmdb.stats['requests'] == requests_before
+
+
+def test_unmatched_record_is_served_at_once_and_enriched_in_the_background(app_module, app_client):
+    client, store, tmdb = app_client
+    store.add('watched', {'id': 'watched-xl-0', 'title': "我的老片", 'year': '1990', 'plot': "保存的简介",
+                          'posters': [], 'stills': []})
+
+    first = client.get('/api/movie_data/watched/watched-xl-0')
+    assert first.status_code == 200
+    assert first.json['title'] == "我的老片" and first.json['plot'] == "保存的简介"
+    wait_for_refreshes(app_module)
+    assert tmdb.stats['requests'] == 2  # 后台的一次搜索和一次详情
+
+    second = client.get('/api/movie_data/watched/watched-xl-0')
+    assert second.json['id'] == 'watched-xl-0' and second.json['media_type'] == 'movie'
+    assert second.json['plot'] == f"{second.json['title']} 的剧情简介。"
+    assert tmdb.stats['requests'] == 2  # 补全的内容来自缓存
+    # 猜测的结果不写回电影库
+    assert store.get('watched', 'watched-xl-0').get('plot') == "保存的简介"
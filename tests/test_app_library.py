@@ -0,0 +1,126 @@
+import gzip
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from conftest import movie
+
+
+def fill(store, count=3, list_name='watched'):
+    for tmdb_id in range(1, count + 1):
+        store.add(list_name, movie(list_name, tmdb_id))
+
+
+def http_date(timestamp):
+    return format_datetime(datetime.fromtimestamp(int(timestamp), timezone.utc), usegmt=True)
+
+
+def test_matching_etag_is_not_modified(app_client):
+    client, store, tmdb = app_client
+    fill(store)
+    first = client.get('/api/movies')
+    assert first.status_code == 200 and first.headers['X-Library-Version'] == str(store.version)
+
+    assert client.get('/api/movies', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    store.add('watching', movie('watching', 9))
+    changed = client.get('/api/movies', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+
+
+def test_if_modified_since_within_the_last_modified_second(app_client):
+    client, store, tmdb = app_client
+    fill(store)
+    # 最后一次修改所在的那一秒还没过完: 不发 Last-Modified, 同一秒的 If-Modified-Since 也不能得到 304
+    response = client.get('/api/movies', headers={'If-Modified-Since': http_date(time.time())})
+    assert response.status_code == 200 and 'Last-Modified' not in response.headers
+
+    store.last_modified = time.time() - 10
+    response = client.get('/api/movies')
+    assert response.headers['Last-Modified'] == http_date(store.last_modified)
+    assert client.get('/api/movies', headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+
+def test_summary_projection(app_client):
+    client, store, tmdb = app_client
+    fill(store, 1)
+    response = client.get('/api/movies?fields=summary&poster_size=w342')
+    (item,) = response.json['watched']
+    assert set(item) <= {'id', 'media_type', 'title', 'year', 'director', 'actors_string', 'rating', 'poster', 'still'}
+    assert item['id'] == 'watched-1' and item['poster'] == "https://image.tmdb.org/t/p/w342/p1.jpg"
+    assert 'posters' not in item
+
+
+def test_pagination_is_pinned_to_one_version(app_client):
+    client, store, tmdb = app_client
+    fill(store, 5)
+    first = client.get('/api/movies?list=watched&limit=2&fields=id')
+    version = first.headers['X-Library-Version']
+    assert first.json['total'] == 5 and first.json['next_cursor'] == '2'
+    assert [m['id'] for m in first.json['items']] == ['watched-5', 'watched-4']
+
+    second = client.get(f"/api/movies?list=watched&limit=2&fields=id&cursor=2&version={version}")
+    assert [m['id'] for m in second.json['items']] == ['watched-3', 'watched-2']
+
+    store.add('watched', movie('watched', 6))
+    stale = client.get(f"/api/movies?list=watched&limit=2&fields=id&cursor=4&version={version}")
+    assert stale.status_code == 409 and stale.json['version'] == store.version
+
+
+def test_pagination_requires_a_list(app_client):
+    client, store, tmdb = app_client
+    assert client.get('/api/movies?limit=2').status_code == 400
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_compressed_variant_etag_is_not_modified(app_module, app_client, encoding):
+    if encoding == 'br' and app_module.brotli is None:
+        pytest.skip("brotli is not installed")
+    client, store, tmdb = app_client
+    fill(store)
+    plain = client.get('/api/movies')
+    compressed = client.get('/api/movies', headers={'Accept-Encoding': encoding})
+    assert compressed.headers['Content-Encoding'] == encoding
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + f'-{encoding}"'
+    decompress = gzip.decompress if encoding == 'gzip' else app_module.brotli.decompress
+    assert json.loads(decompress(compressed.data)) == plain.json
+
+    for etag in (compressed.headers['ETag'], plain.headers['ETag']):
+        response = client.get('/api/movies', headers={'Accept-Encoding': encoding, 'If-None-Match': etag})
+        assert response.status_code == 304
+
+
+def test_changes_since_returns_only_newer_changes(app_client):
+    client, store, tmdb = app_client
+    fill(store, 2)
+    since = store.version
+    store.add('watching', movie('watching', 3))
+    store.move('watched-1', 'watched', 'wantToWatch', new_id='wantToWatch-1')
+    store.delete('watched', 'watched-2')
+
+    response = client.get(f'/api/movies/changes?since={since}&fields=id,poster&poster_size=w185')
+    assert response.json['resync'] is False and response.json['version'] == store.version
+    changes = response.json['changes']
+    assert [c['op'] for c in changes] == ['add', 'move', 'delete']
+    assert [c['version'] for c in changes] == list(range(since + 1, store.version + 1))
+    assert changes[0]['movie'] == {'id': 'watching-3', 'poster': "https://image.tmdb.org/t/p/w185/p3.jpg"}
+
+    current = client.get(f'/api/movies/changes?since={store.version}')
+    assert current.json == {'version': store.version, 'resync': False, 'changes': []}
+
+
+def test_changes_outside_the_history_ask_for_a_resync(app_client, monkeypatch):
+    client, store, tmdb = app_client
+    fill(store, 1)
+    response = client.get(f'/api/movies/changes?since={store.version + 5}')
+    assert response.json == {'version': store.version, 'resync': True}
+
+    # 只保留最近两条修改时, 更早的序号已经无法增量同步
+    monkeypatch.setattr(store, '_history', deque(store._history, maxlen=2))
+    fill(store, 4, 'watching')
+    assert client.get('/api/movies/changes?since=0').json == {'version': store.version, 'resync': True}
+    assert len(client.get(f'/api/movies/changes?since={store.version - 2}').json['changes']) == 2
+    assert client.get('/api/movies/changes').status_code == 400
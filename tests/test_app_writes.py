@@ -0,0 +1,176 @@
+import time
+
+import pytest
+
+from conftest import movie
+from movie_store import DurabilityError
+
+
+def test_write_error_inside_the_transaction_is_a_json_500(app_client, monkeypatch):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 1))
+
+    def fail(*args, **kwargs):
+        # 共享模式下 _commit 追加 journal 失败时就是这样把 OSError 抛出事务
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(store, 'move', fail)
+    response = client.post('/api/move', json={'movie_id': 'watched-1', 'from_list': 'watched', 'to_list': 'watching'})
+    assert response.status_code == 500
+    assert "No space left on device" in response.json['detail']
+
+
+def test_unflushed_change_is_accepted(app_client, monkeypatch):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 1))
+
+    def not_durable(version):
+        raise DurabilityError("fsync failed")
+
+    monkeypatch.setattr(store, 'wait_durable', not_durable)
+    response = client.post('/api/delete', json={'list_name': 'watched', 'movie_id': 'watched-1'})
+    assert response.status_code == 202
+    assert response.json['durable'] is False and response.json['message'] == "电影已删除"
+    assert store.get('watched', 'watched-1') is None
+
+
+def test_duplicate_add_is_rejected_before_asking_tmdb(app_module, app_client, monkeypatch):
+    client, store, tmdb = app_client
+    request = {'tmdb_id': 550, 'media_type': 'movie', 'target_list': 'watched'}
+    assert client.post('/api/add', json=request).status_code == 200
+    fetches = []
+    fetch = app_module.get_enriched_tmdb_details
+    monkeypatch.setattr(app_module, 'get_enriched_tmdb_details', lambda *args: fetches.append(args) or fetch(*args))
+
+    response = client.post('/api/add', json=dict(request, target_list='watching'))
+    assert response.status_code == 409 and "电影 550" in response.json['detail']
+    assert fetches == []
+
+
+def test_batch_add_after_delete_of_the_same_title(app_client):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 7))
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'delete', 'list_name': 'watched', 'movie_id': 'watched-7'},
+        {'op': 'add', 'tmdb_id': 7, 'media_type': 'movie', 'target_list': 'wantToWatch'},
+        {'op': 'add', 'tmdb_id': 7, 'media_type': 'movie', 'target_list': 'watching'},
+    ], 'atomic': False})
+    assert response.status_code == 200
+    assert [r['status'] for r in response.json['results']] == ['ok', 'ok', 'error']
+    assert store.find_by_tmdb_id(7) == ('wantToWatch', 'wantToWatch-7')
+
+
+def test_excel_import_keeps_row_order(app_module, app_client, tmp_path):
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('openpyxl')
+    client, store, tmdb = app_client
+    excel_path = str(tmp_path / 'source.xlsx')
+    with pd.ExcelWriter(excel_path) as writer:
+        pd.DataFrame({'标题': [f"片名{i}" for i in range(12)], '年份': ['2001'] * 12}).to_excel(
+            writer, sheet_name='看过的电影', index=False)
+
+    assert app_module.convert_excel_to_json(excel_path, store, 'zh,en,null')
+    titles = [m.get('title') for m in store.snapshot()['watched']]
+    # 各行并发解析, 但按表格的顺序写入 (每条都插到列表最前面)
+    assert len(titles) == 12 and len(set(titles)) == 12
+    assert [m.get('id') for m in store.snapshot()['watched']] == [
+        f"watched-{app_module.search_tmdb(f'片名{i}', '2001')[0]['tmdb_id']}" for i in reversed(range(12))]
+
+
+def test_atomic_batch_applies_everything_in_one_change(app_client):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 1))
+    since = store.version
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'add', 'tmdb_id': 2, 'media_type': 'movie', 'target_list': 'watching'},
+        {'op': 'move', 'movie_id': 'watched-1', 'from_list': 'watched', 'to_list': 'wantToWatch'},
+        {'op': 'add', 'tmdb_id': 3, 'media_type': 'movie', 'target_list': 'watched'},
+    ]})
+    assert response.status_code == 200 and response.json['applied'] is True
+    assert [(r['index'], r['status'], r['id']) for r in response.json['results']] == [
+        (0, 'ok', 'watching-2'), (1, 'ok', 'wantToWatch-1'), (2, 'ok', 'watched-3')]
+    assert response.json['version'] == store.version == since + 1
+    assert [c['op'] for c in store.changes_since(since)] == ['batch']
+
+
+def test_atomic_batch_with_a_failing_item_changes_nothing(app_client):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 1))
+    version = store.version
+    add = {'op': 'add', 'tmdb_id': 2, 'media_type': 'movie', 'target_list': 'watching'}
+    # 请求本身有问题的项 (重复添加、未知操作) 在提交前就被发现, 其余项不再执行
+    response = client.post('/api/batch', json={'operations': [
+        add, {'op': 'add', 'tmdb_id': 1, 'media_type': 'movie', 'target_list': 'watching'}, {'op': 'rename'},
+    ]})
+    assert response.status_code == 409 and response.json['applied'] is False
+    assert [r['status'] for r in response.json['results']] == ['skipped', 'error', 'error']
+    assert response.json['results'][1]['detail'] == "已存在于列表中"
+    # 电影库检查出的错误 (要删除的电影不在这个列表里) 同样让整批作废
+    response = client.post('/api/batch', json={'operations': [
+        add, {'op': 'delete', 'list_name': 'watching', 'movie_id': 'watched-1'},
+    ]})
+    assert response.status_code == 409
+    assert [(r['status'], r['detail']) for r in response.json['results']] == [('skipped', "整批未执行"),
+                                                                                ('error', "电影不存在")]
+    assert store.version == version and store.find_by_tmdb_id(2) is None
+
+
+def test_non_atomic_batch_skips_failing_items(app_client):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 1))
+    response = client.post('/api/batch', json={'atomic': False, 'operations': [
+        {'op': 'delete', 'list_name': 'watching', 'movie_id': 'watched-1'},
+        {'op': 'add', 'tmdb_id': 2, 'media_type': 'movie', 'target_list': 'watching'},
+        {'op': 'delete', 'list_name': 'watched', 'movie_id': 'watched-1'},
+    ]})
+    assert response.status_code == 200 and response.json['applied'] is True
+    assert [r['status'] for r in response.json['results']] == ['error', 'ok', 'ok']
+    assert store.find_by_tmdb_id(1) is None and store.find_by_tmdb_id(2) == ('watching', 'watching-2')
+
+
+def test_non_atomic_batch_with_nothing_applicable_is_a_conflict(app_client):
+    client, store, tmdb = app_client
+    response = client.post('/api/batch', json={'atomic': False, 'operations': [
+        {'op': 'delete', 'list_name': 'watched', 'movie_id': 'watched-404'},
+    ]})
+    assert response.status_code == 409 and response.json['applied'] is False
+    assert response.json['results'][0]['status'] == 'error'
+
+
+def test_batch_rejects_malformed_requests(app_client):
+    client, store, tmdb = app_client
+    assert client.post('/api/batch', json={'operations': []}).status_code == 400
+    assert client.post('/api/batch', json={'operations': [{'op': 'delete'}] * 501}).status_code == 400
+
+
+def test_move_resolves_an_old_id_without_tmdb(app_client):
+    client, store, tmdb = app_client
+    store.add('wantToWatch', dict(movie('wantToWatch', 5), enriched_at=int(time.time())))
+    store.add('watched', {'id': 'watched-xl-0', 'title': "旧片", 'posters': [], 'stills': []})
+
+    response = client.post('/api/move', json={'movie_id': 'wantToWatch-5', 'from_list': 'wantToWatch',
+                                              'to_list': 'watching'})
+    assert response.json == {"message": "电影已移动。", "id": 'watching-5', "list": 'watching'}
+    # 旧链接里的列表名和ID已经过时, 仍然能找到这部电影
+    response = client.post('/api/move', json={'movie_id': 'wantToWatch-5', 'from_list': 'wantToWatch',
+                                              'to_list': 'watched'})
+    assert response.status_code == 200 and response.json['id'] == 'watched-5'
+    assert client.get('/api/movie_data/wantToWatch/wantToWatch-5').json['id'] == 'watched-5'
+    assert store.get('watched', 'watched-5').get('title') == "电影 5"
+
+    # 旧的Excel导入ID移动时保持不变
+    response = client.post('/api/move', json={'movie_id': 'watched-xl-0', 'from_list': 'watched',
+                                              'to_list': 'wantToWatch'})
+    assert response.json['id'] == 'watched-xl-0' and store.locate('watched-xl-0') == 'wantToWatch'
+    assert tmdb.stats['requests'] == 0
+
+
+def test_move_edge_cases(app_client):
+    client, store, tmdb = app_client
+    store.add('watched', movie('watched', 5))
+    same = client.post('/api/move', json={'movie_id': 'watched-5', 'from_list': 'watched', 'to_list': 'watched'})
+    assert same.status_code == 200 and same.json['message'] == "电影已在该列表中。"
+    missing = client.post('/api/move', json={'movie_id': 'watched-6', 'from_list': 'watched', 'to_list': 'watching'})
+    assert missing.status_code == 404
+    invalid = client.post('/api/move', json={'movie_id': 'watched-5', 'from_list': 'watched', 'to_list': 'nowhere'})
+    assert invalid.status_code == 400
@@ -0,0 +1,46 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_record_only_saves_successful_responses(fake_tmdb, tmp_path):
+    fixtures = tmp_path / 'recorded'
+    upstream_url, _ = fake_tmdb('--fixtures', tmp_path / 'upstream')
+    recorder_url, recorder = fake_tmdb('--record', '--upstream', upstream_url, '--fixtures', fixtures)
+
+    status, body = fetch(f"{recorder_url}/movie/550?language=zh-CN&api_key=k")
+    assert status == 200 and body['id'] == 550
+    status, _ = fetch(f"{recorder_url}/person/1")
+    assert status == 404
+    assert (recorder.stats['recorded'], recorder.stats['passed_through']) == (1, 1)
+    assert len(list(fixtures.iterdir())) == 1
+
+    # 回放: 录下的响应和录制时一致, 与 api_key 无关
+    replay_url, replay = fake_tmdb('--fixtures', fixtures, '--no-synthetic')
+    assert fetch(f"{replay_url}/movie/550?language=zh-CN&api_key=other") == (200, body)
+    assert replay.stats['fixture'] == 1
+
+
+@pytest.mark.parametrize('upstream_args', [('--error-429', 1, '--retry-after', 0), ()])
+def test_record_passes_errors_through(fake_tmdb, tmp_path, upstream_args):
+    fixtures = tmp_path / 'recorded'
+    if upstream_args:
+        upstream_url, _ = fake_tmdb('--fixtures', tmp_path / 'upstream', *upstream_args)
+        expected = 429
+    else:
+        upstream_url, expected = 'http://127.0.0.1:9/3', 502  # 连不上的上游
+    recorder_url, recorder = fake_tmdb('--record', '--upstream', upstream_url, '--fixtures', fixtures)
+    status, _ = fetch(f"{recorder_url}/movie/550")
+    assert status == expected
+    assert recorder.stats['passed_through'] == 1
+    assert not any(fixtures.iterdir())
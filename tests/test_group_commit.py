@@ -0,0 +1,123 @@
+import os
+import threading
+
+import pytest
+
+from conftest import ids, movie, open_store
+import movie_store as movie_store_module
+from movie_store import DurabilityError, MovieStore
+
+
+@pytest.fixture
+def fsync_calls(monkeypatch):
+    """统计 fsync 次数; 把 calls['fail'] 设成 n 可以让接下来的 n 次 fsync 失败。"""
+    calls = {'count': 0, 'fail': 0}
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        calls['count'] += 1
+        if calls['fail']:
+            calls['fail'] -= 1
+            raise OSError(28, "No space left on device")
+        real_fsync(fd)
+
+    monkeypatch.setattr(movie_store_module.os, 'fsync', fsync)
+    return calls
+
+
+def test_concurrent_durable_writes_share_fsyncs(path, fsync_calls):
+    store = MovieStore(path, flush_interval=60, compact_bytes=1 << 30, group_commit_window=0.05)
+    barrier = threading.Barrier(20)
+
+    def add(tmdb_id):
+        barrier.wait()
+        assert store.add('watched', movie('watched', tmdb_id))
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(20)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 每个 add 返回时它的记录都已经 fsync 过, 但 20 个请求只用了几次 fsync
+        assert store._durable_version == store.version == 20
+        assert fsync_calls['count'] < 10
+    finally:
+        store.close()
+
+
+def test_durable_add_waits_for_fsync(path, fsync_calls):
+    store = open_store(path)
+    try:
+        store.add('watched', movie('watched', 1))
+        assert fsync_calls['count'] == 1
+        with open(store.journal_path, 'rb') as f:
+            assert b'"watched-1"' in f.read()
+        store.add('watched', movie('watched', 2), durable=False)
+        assert fsync_calls['count'] == 1
+    finally:
+        store.close()
+
+
+def test_failed_fsync_reports_pending_durability(path, fsync_calls):
+    store = open_store(path)
+    try:
+        fsync_calls['fail'] = 1
+        with pytest.raises(DurabilityError):
+            store.add('watched', movie('watched', 1))
+        # 修改已经生效, 只是还没有落盘
+        assert ids(store, 'watched') == ['watched-1']
+
+        # 之前失败的批次不影响新的修改: 下一次写入成功, 两条记录一起落盘
+        store.add('watched', movie('watched', 2))
+        assert store._write_failure is None
+        store.wait_durable(1)
+    finally:
+        store.close()
+
+    reopened = open_store(path)
+    try:
+        assert ids(reopened, 'watched') == ['watched-2', 'watched-1']
+    finally:
+        reopened.close()
+
+
+def test_failed_append_leaves_no_torn_line(path, monkeypatch):
+    store = open_store(path)
+    try:
+        store.add('watched', movie('watched', 1))
+        size = os.path.getsize(store.journal_path)
+
+        class FailingFile:
+            def __init__(self, f):
+                self._f = f
+
+            def write(self, payload):
+                self._f.write(payload[:10])
+                self._f.flush()
+                raise OSError(28, "No space left on device")
+
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return self._f.__exit__(*exc_info)
+
+        real_open = open
+        monkeypatch.setattr(movie_store_module, 'open', lambda *a, **k: FailingFile(real_open(*a, **k)), raising=False)
+        with pytest.raises(DurabilityError):
+            store.add('watched', movie('watched', 2))
+        monkeypatch.undo()
+        assert os.path.getsize(store.journal_path) == size
+
+        store.add('watched', movie('watched', 3))
+    finally:
+        store.close()
+    reopened = open_store(path)
+    try:
+        assert ids(reopened, 'watched') == ['watched-3', 'watched-2', 'watched-1']
+    finally:
+        reopened.close()
@@ -0,0 +1,53 @@
+from conftest import movie, open_store
+from library_search import LibrarySearchIndex, tokenize
+
+
+def film(list_name, tmdb_id, title, year='2001', rating=7.0, **fields):
+    return dict(movie(list_name, tmdb_id, title), year=year, rating=rating, **fields)
+
+
+def hits(index, query='', **kwargs):
+    return [movie_id for _, movie_id, _ in index.search(query, **kwargs)[0]]
+
+
+def test_tokenize():
+    assert tokenize("Spirited Away 2") == ['spirited', 'away', '2']
+    assert tokenize("星际穿越") == ['星', '际', '穿', '越', '星际', '际穿', '穿越']
+    assert tokenize("星际穿越", for_query=True) == ['星际', '际穿', '穿越']
+    assert tokenize("爱", for_query=True) == ['爱']
+
+
+def test_index_follows_store_changes(tmp_path):
+    store = open_store(str(tmp_path / 'movies.json'))
+    store.add('watched', film('watched', 1, "星际穿越", year='2014', rating=8.7, director="诺兰"))
+    index = LibrarySearchIndex()
+    index.rebuild(store)
+    store.add_listener(index.apply_change)
+    try:
+        store.add('wantToWatch', film('wantToWatch', 2, "穿越时空的少女", year='2006', rating=7.9))
+        store.apply_batch([
+            {'op': 'add', 'list': 'watching', 'movie': film('watching', 3, "Inception", year='2010', rating=8.8,
+                                                            director="诺兰")},
+            {'op': 'move', 'from': 'wantToWatch', 'to': 'watched', 'id': 'wantToWatch-2', 'new_id': 'watched-2'},
+        ])
+        assert hits(index, "穿越") == ['watched-1', 'watched-2']
+        assert hits(index, "诺兰", sort='year') == ['watched-1', 'watching-3']
+        assert hits(index, "诺兰", list_name='watching') == ['watching-3']
+        assert hits(index, year_from=2007, year_to=2012) == ['watching-3']
+        assert hits(index, min_rating=8.0, sort='rating', descending=False) == ['watched-1', 'watching-3']
+        assert hits(index, "星际穿越") == ['watched-1']
+
+        store.update('watched', film('watched', 1, "Interstellar", year='2014'))
+        store.delete('watched', 'watched-2')
+        assert hits(index, "穿越") == []
+        assert hits(index, "interstellar") == ['watched-1']
+
+        # 增量维护的结果和全量重建的一致
+        rebuilt = LibrarySearchIndex()
+        rebuilt.rebuild(store)
+        assert hits(index, sort='title') == hits(rebuilt, sort='title')
+
+        store.clear()
+        assert hits(index) == []
+    finally:
+        store.close()
@@ -0,0 +1,166 @@
+import json
+import os
+
+from conftest import ids, movie, open_store
+from movie_store import MovieStore
+
+
+def mutate(store):
+    store.add('watched', movie('watched', 1))
+    store.add('watched', movie('watched', 2))
+    store.add('watching', movie('watching', 3))
+    store.move('watched-1', 'watched', 'wantToWatch', new_id='wantToWatch-1')
+    store.delete('watched', 'watched-2')
+    store.add('watching', movie('watching', 2))
+    store.update('wantToWatch', dict(movie('wantToWatch', 1), title="改过的标题"))
+    store.move('watching-3', 'watching', 'watched', new_id='watched-3')
+    store.move('watched-3', 'watched', 'watching', new_id='watching-3')
+
+
+def state(store):
+    return {name: [m.to_dict() for m in movies] for name, movies in store.snapshot().items()}
+
+
+def test_journal_is_replayed_on_open(path):
+    store = open_store(path)
+    mutate(store)
+    expected, version = state(store), store.version
+    store.flush()
+    # 模拟进程崩溃: 不调用 close(), 快照从未写过, 只有 journal
+    assert not os.path.exists(path)
+
+    reopened = open_store(path)
+    try:
+        assert state(reopened) == expected
+        assert reopened.version == version
+    finally:
+        reopened.close()
+
+
+def test_torn_last_journal_line_is_skipped(path):
+    store = open_store(path)
+    store.add('watched', movie('watched', 1))
+    store.add('watched', movie('watched', 2))
+    store.flush()
+    with open(store.journal_path, 'rb') as f:
+        lines = f.readlines()
+    with open(store.journal_path, 'wb') as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:len(lines[-1]) // 2])
+
+    reopened = open_store(path)
+    try:
+        assert ids(reopened, 'watched') == ['watched-1']
+        assert reopened.version == 1
+        # 之后的修改接着写, 不会和写了一半的行粘在一起
+        reopened.add('watched', movie('watched', 3))
+    finally:
+        reopened.close()
+    reopened = open_store(path)
+    try:
+        assert ids(reopened, 'watched') == ['watched-3', 'watched-1']
+    finally:
+        reopened.close()
+
+
+def test_crash_between_snapshot_and_journal_replace(path):
+    store = open_store(path)
+    store.add('watched', movie('watched', 100))
+    store.compact()
+    mutate(store)
+    store.flush()
+    expected, version = state(store), store.version
+    with open(store.journal_path, 'rb') as f:
+        old_journal = f.read()
+    store.compact()
+    # 模拟压缩时在新快照已替换、journal 还没替换之前崩溃: 新快照 + 旧 journal
+    with open(store.journal_path, 'wb') as f:
+        f.write(old_journal)
+
+    reopened = open_store(path)
+    try:
+        # 已经合并进快照的记录再重放一遍, 结果不变
+        assert state(reopened) == expected
+        assert reopened.version == version
+        assert reopened.instance_id == store.instance_id
+    finally:
+        reopened.close()
+
+
+def test_crash_while_writing_snapshot_keeps_old_files(path):
+    store = open_store(path)
+    mutate(store)
+    store.compact()
+    store.add('watched', movie('watched', 9))
+    store.flush()
+    expected, version = state(store), store.version
+    # 模拟写临时快照时崩溃: 目录里留下一个没有替换过去的临时文件
+    with open(os.path.join(os.path.dirname(path), '.movies-crash.tmp'), 'wb') as f:
+        f.write(b'{"watched": [')
+
+    reopened = open_store(path)
+    try:
+        assert state(reopened) == expected
+        assert reopened.version == version
+    finally:
+        reopened.close()
+
+
+def test_changes_since_across_compaction(path):
+    store = open_store(path)
+    try:
+        store.add('watched', movie('watched', 1))
+        store.add('watched', movie('watched', 2))
+        before = store.version
+        store.compact()
+        store.delete('watched', 'watched-1')
+
+        # 同一进程内压缩不会丢掉内存里的历史
+        changes = store.changes_since(0)
+        assert [c['version'] for c in changes] == [1, 2, 3]
+        assert [c['op'] for c in store.changes_since(before)] == ['delete']
+        assert store.changes_since(store.version) == []
+        assert store.changes_since(store.version + 1) is None
+    finally:
+        store.close()
+
+    reopened = open_store(path)
+    try:
+        # 重启后压缩之前的历史已经不在了, 更早的版本需要全量同步; 序号继续增长
+        assert reopened.version == 3
+        assert reopened.changes_since(before) is None
+        assert reopened.changes_since(3) == []
+        reopened.add('watching', movie('watching', 5))
+        assert [c['version'] for c in reopened.changes_since(3)] == [4]
+    finally:
+        reopened.close()
+
+
+def test_background_compaction(path):
+    store = MovieStore(path, flush_interval=0.01, compact_bytes=2048)
+    try:
+        for tmdb_id in range(40):
+            store.add('watched', movie('watched', tmdb_id))
+        assert os.path.getsize(store.journal_path) < 2048 + 1024
+        assert os.path.exists(path)
+    finally:
+        store.close()
+    reopened = open_store(path)
+    try:
+        assert len(ids(reopened, 'watched')) == 40
+        assert reopened.version == 40
+    finally:
+        reopened.close()
+
+
+def test_journal_stores_bare_image_paths(path):
+    store = open_store(path)
+    try:
+        store.add('watched', dict(movie('watched', 1), stills=['/s1.jpg']))
+        store.flush()
+        with open(store.journal_path, encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        assert entry['movie']['posters'] == ['/p1.jpg'] and entry['movie']['stills'] == ['/s1.jpg']
+        assert store.get('watched', 'watched-1').to_dict()['stills'] == ["https://image.tmdb.org/t/p/original/s1.jpg"]
+    finally:
+        store.close()
@@ -0,0 +1,64 @@
+import json
+import os
+
+from conftest import ids, movie, open_store
+from movie_store import MovieStore, parse_tmdb_id
+
+
+def test_parse_tmdb_id():
+    assert parse_tmdb_id('watched-550') == 550
+    assert parse_tmdb_id('tmdb-550') == 550
+    assert parse_tmdb_id('watched-xl-0') is None
+    assert parse_tmdb_id(None) is None
+
+
+def test_reads_are_served_from_memory(path):
+    store = open_store(path)
+    try:
+        assert store.add('watched', movie('watched', 1))
+        assert not store.add('watched', movie('watched', 1))
+        store.add('watched', movie('watched', 2))
+        assert ids(store, 'watched') == ['watched-2', 'watched-1']
+        assert store.get('watched', 'watched-1')['title'] == "电影 1"
+        assert store.get('watching', 'watched-1') is None
+        assert store.locate('watched-2') == 'watched'
+        assert store.find_by_tmdb_id(2) == ('watched', 'watched-2')
+        movies, total = store.page('watched', offset=1, limit=5)
+        assert total == 2 and [m.get('id') for m in movies] == ['watched-1']
+    finally:
+        store.close()
+
+
+def test_mutations_survive_reopen(path):
+    store = open_store(path)
+    store.add('watched', movie('watched', 1))
+    store.add('watched', movie('watched', 2))
+    store.move('watched-1', 'watched', 'watching', new_id='watching-1')
+    store.delete('watched', 'watched-2')
+    store.close()
+
+    with open(path, encoding='utf-8') as f:
+        assert [m['id'] for m in json.load(f)['watching']] == ['watching-1']
+    store = open_store(path)
+    try:
+        assert ids(store, 'watching') == ['watching-1']
+        assert ids(store, 'watched') == []
+        assert store.get('watching', 'watching-1')['posters'] == ["https://image.tmdb.org/t/p/original/p1.jpg"]
+        assert store.find_by_tmdb_id(2) is None
+    finally:
+        store.close()
+
+
+def test_write_behind_is_flushed_on_close(path):
+    store = open_store(path)
+    for tmdb_id in range(20):
+        store.add('wantToWatch', movie('wantToWatch', tmdb_id), durable=False)
+    # 写线程还在等 flush_interval, 修改只在内存里
+    assert not os.path.exists(path)
+    store.close()
+
+    store = open_store(path)
+    try:
+        assert len(ids(store, 'wantToWatch')) == 20
+    finally:
+        store.close()
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ids, movie
+from movie_store import MovieStore
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 另一个 worker 进程: 打开同一个电影库, 交替写入和压缩
+WRITER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from movie_store import MovieStore
+store = MovieStore(sys.argv[2], flush_interval=0.01, compact_bytes=4096, shared=True)
+for i in range(int(sys.argv[3]), int(sys.argv[4])):
+    movie_id = f"watching-{i}"
+    store.add('watching', {'id': movie_id, 'title': f"电影 {i}", 'posters': [], 'stills': []})
+    if i % 3 == 0:
+        store.move(movie_id, 'watching', 'watched', new_id=f"watched-{i}")
+store.close()
+"""
+
+
+def spawn_writer(path, start, stop):
+    return subprocess.Popen([sys.executable, '-c', WRITER, REPO, path, str(start), str(stop)])
+
+
+def test_two_processes_write_the_same_library(path):
+    store = MovieStore(path, flush_interval=0.01, compact_bytes=4096, shared=True)
+    seen = []
+    store.add_listener(seen.append)
+    child = spawn_writer(path, 0, 60)
+    try:
+        for i in range(100, 160):
+            store.add('wantToWatch', movie('wantToWatch', i))
+        assert child.wait(timeout=60) == 0
+        store.refresh()
+
+        expected_watched = {f"watched-{i}" for i in range(0, 60, 3)}
+        expected_watching = {f"watching-{i}" for i in range(60) if i % 3}
+        assert set(ids(store, 'watched')) == expected_watched
+        assert set(ids(store, 'watching')) == expected_watching
+        assert len(ids(store, 'wantToWatch')) == 60
+        # 60 次 add + 20 次 move (子进程) + 60 次 add (本进程), 每条修改一个序号
+        assert store.version == 140
+        assert seen, "listeners are notified about the other process's changes"
+    finally:
+        store.close()
+
+    reopened = MovieStore(path, shared=True)
+    try:
+        assert set(ids(reopened, 'watched')) == expected_watched
+        assert len(ids(reopened, 'wantToWatch')) == 60
+        assert reopened.version == 140
+    finally:
+        reopened.close()
+
+
+def test_transaction_sees_other_process_changes(path):
+    store = MovieStore(path, flush_interval=0.01, shared=True)
+    try:
+        assert spawn_writer(path, 0, 1).wait(timeout=60) == 0
+        # 本进程还没 refresh, 但 transaction() 会先追上其他进程的修改, "先检查再修改" 不会重复添加
+        with store.transaction():
+            assert store.locate('watched-0') == 'watched'
+            assert not store.add('watched', {'id': 'watched-0', 'title': "重复"}, durable=False)
+    finally:
+        store.close()
+
+
+def test_epoch_is_shared_and_checkpointed(path):
+    first = MovieStore(path, flush_interval=0.01, shared=True)
+    second = MovieStore(path, flush_interval=0.01, shared=True)
+    try:
+        assert first.instance_id == second.instance_id
+        first.add('watched', movie('watched', 1))
+        first.compact()
+        second.refresh()
+        assert ids(second, 'watched') == ['watched-1'] and second.version == 1
+        with open(first.journal_path, 'rb') as f:
+            checkpoint = json.loads(f.readline())
+        assert checkpoint == {'op': 'checkpoint', 'version': 1, 'epoch': first.instance_id}
+    finally:
+        first.close()
+        second.close()
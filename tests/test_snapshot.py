@@ -0,0 +1,104 @@
+import io
+import json
+import pickle
+
+import pytest
+
+from conftest import movie, open_store
+from movie_record import MovieRecord
+from movie_store import LIST_NAMES, SNAPSHOT_MAGIC, _LENGTH, convert_snapshot, encode_snapshot, read_snapshot
+
+FULL_MOVIE = {
+    'id': 'watched-550', 'media_type': 'movie', 'title': "搏击俱乐部", 'year': '1999', 'director': "大卫·芬奇",
+    'actors_string': "布拉德·皮特", 'plot': "……", 'tagline': "标语", 'tagline_en': "Tagline",
+    'posters': ["https://image.tmdb.org/t/p/original/a.jpg", "http://example.com/excel.jpg"],
+    'stills': ["https://image.tmdb.org/t/p/original/s.jpg"], 'rating': 8.4, 'budget': 63000000, 'revenue': 0,
+    'actors': [{'name': "布拉德·皮特", 'character': "Tyler", 'profile_path': '/p.jpg'}],
+    'recommendations': [{'id': 807, 'title': "七宗罪", 'poster_path': '/r.jpg', 'media_type': 'movie'}],
+    'enriched_at': 1700000000,
+}
+
+
+def library():
+    return {'watched': [FULL_MOVIE, movie('watched', 1)], 'watching': [], 'wantToWatch': [movie('wantToWatch', 2)]}
+
+
+def plain(data):
+    return {name: [MovieRecord.coerce(m).to_dict() for m in movies] for name, movies in data.items()}
+
+
+def test_record_round_trip():
+    record = MovieRecord.from_dict(FULL_MOVIE)
+    assert record.to_dict() == FULL_MOVIE
+    assert record.posters == ('/a.jpg', "http://example.com/excel.jpg")
+    assert MovieRecord.from_state(record.to_state()) == record
+    # TMDB 记录的 enriched_at / poster_lang 是 slot, 不需要单独的 extra dict
+    assert not hasattr(MovieRecord.from_dict(dict(FULL_MOVIE, poster_lang='zh,en,null')), 'extra')
+
+
+@pytest.mark.parametrize('name', ['movies.json', 'movies.mvs'])
+def test_snapshot_round_trip(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(encode_snapshot(str(path), library()))
+    assert plain(read_snapshot(str(path))) == library()
+
+
+def test_binary_snapshot_rejects_objects(tmp_path):
+    path = tmp_path / 'movies.mvs'
+    payload = encode_snapshot(str(path), library())
+    # 把第一个列表块换成一个会实例化对象的 pickle
+    header_len = _LENGTH.unpack_from(payload, len(SNAPSHOT_MAGIC))[0]
+    start = len(SNAPSHOT_MAGIC) + _LENGTH.size + header_len
+    block_len = _LENGTH.unpack_from(payload, start)[0]
+    evil = pickle.dumps([io.BytesIO()])
+    path.write_bytes(payload[:start] + _LENGTH.pack(len(evil)) + evil + payload[start + _LENGTH.size + block_len:])
+    with pytest.raises(pickle.UnpicklingError):
+        read_snapshot(str(path))
+
+
+def test_convert_between_formats(tmp_path):
+    json_path = str(tmp_path / 'movies.json')
+    store = open_store(json_path)
+    for name, movies in library().items():
+        for index, m in enumerate(movies):
+            store.add(name, m, index=index)
+    store.close()
+
+    mvs_path = str(tmp_path / 'movies.mvs')
+    assert convert_snapshot(json_path, mvs_path) == 3
+    store = open_store(mvs_path)
+    try:
+        assert plain(store.snapshot()) == library()
+    finally:
+        store.close()
+
+
+def write_old_layout(path, fields, states):
+    """用另一套字段表 (模拟旧版本的 MovieRecord.__slots__) 写一个只有 watched 列表的快照。"""
+    header = json.dumps({'fields': fields, 'lists': {name: 0 for name in LIST_NAMES}}).encode('utf-8')
+    parts = [SNAPSHOT_MAGIC, _LENGTH.pack(len(header)), header]
+    for name in LIST_NAMES:
+        block = pickle.dumps(states if name == 'watched' else [])
+        parts += [_LENGTH.pack(len(block)), block]
+    path.write_bytes(b''.join(parts))
+
+
+def test_binary_snapshot_maps_fields_by_header(tmp_path):
+    path = tmp_path / 'movies.mvs'
+    # 字段顺序不同、多一个已经删除的字段、poster_lang 还在 extra 里
+    fields = ['title', 'dropped', 'id', 'posters', 'extra']
+    write_old_layout(path, fields, [(0b11111, "标题", "旧值", 'watched-1', ('/a.jpg',), {'poster_lang': 'en'})])
+
+    (record,) = read_snapshot(str(path))['watched']
+    assert record.to_dict() == {'id': 'watched-1', 'title': "标题", 'posters': ["https://image.tmdb.org/t/p/original/a.jpg"],
+                                'dropped': "旧值", 'poster_lang': 'en'}
+    assert record.title == "标题" and record.posters == ('/a.jpg',)
+    assert record.poster_lang == 'en' and record.extra == {'dropped': "旧值"}
+
+
+def test_binary_snapshot_without_field_table_is_rejected(tmp_path):
+    path = tmp_path / 'movies.mvs'
+    header = json.dumps({'lists': {}}).encode('utf-8')
+    path.write_bytes(SNAPSHOT_MAGIC + _LENGTH.pack(len(header)) + header)
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
@@ -0,0 +1,126 @@
+import gc
+import json
+import threading
+
+import pytest
+
+from conftest import ids, movie, open_store
+from movie_store import SqliteMovieStore, migrate_json_to_sqlite
+from tmdb_cache import TmdbCache
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteMovieStore(str(tmp_path / 'movies.db'))
+    yield store
+    store.close()
+
+
+def test_crud_and_positions(store):
+    assert store.add('watched', movie('watched', 1))
+    assert store.add('watched', movie('watched', 2))
+    assert store.add('watched', movie('watched', 3), index=1)
+    assert not store.add('watching', movie('watched', 1))
+    assert ids(store, 'watched') == ['watched-2', 'watched-3', 'watched-1']
+    assert store.move('watched-3', 'watched', 'watching', new_id='watching-3')
+    assert not store.move('watched-3', 'watched', 'watching')
+    assert store.delete('watched', 'watched-2')
+    assert not store.delete('watched', 'watched-2')
+    assert store.update('watching', dict(movie('watching', 3), title="新标题"))
+    assert not store.update('watched', movie('watched', 404))
+
+    assert ids(store, 'watched') == ['watched-1']
+    assert store.get('watching', 'watching-3')['title'] == "新标题"
+    assert store.locate('watching-3') == 'watching'
+    assert store.find_by_tmdb_id(3) == ('watching', 'watching-3')
+    movies, total = store.page('watched', 0, 10)
+    assert total == 1 and movies[0]['posters'] == ["https://image.tmdb.org/t/p/original/p1.jpg"]
+
+
+def test_changes_and_batch(store):
+    store.add('watched', movie('watched', 1))
+    start = store.version
+    errors = store.apply_batch([
+        {'op': 'add', 'list': 'watching', 'movie': movie('watching', 2)},
+        {'op': 'delete', 'list': 'watched', 'id': 'watched-404'},
+    ])
+    assert errors == [None, "电影不存在"]
+    assert store.version == start and ids(store, 'watching') == []
+
+    errors = store.apply_batch([
+        {'op': 'add', 'list': 'watching', 'movie': movie('watching', 2)},
+        {'op': 'delete', 'list': 'watched', 'id': 'watched-404'},
+    ], atomic=False)
+    assert errors == [None, "电影不存在"]
+    assert ids(store, 'watching') == ['watching-2']
+    changes = store.changes_since(start)
+    assert [c['op'] for c in changes] == ['batch'] and changes[0]['version'] == start + 1
+    assert store.changes_since(store.version + 1) is None
+
+
+def test_second_connection_sees_commits(tmp_path):
+    path = str(tmp_path / 'movies.db')
+    first, second = SqliteMovieStore(path), SqliteMovieStore(path)
+    seen = []
+    second.add_listener(seen.append)
+    try:
+        first.add('watched', movie('watched', 1))
+        second.refresh()
+        assert [entry['op'] for entry in seen] == ['add']
+        assert ids(second, 'watched') == ['watched-1']
+    finally:
+        first.close()
+        second.close()
+
+
+def test_commits_are_fsynced(store, tmp_path):
+    # WAL + synchronous=NORMAL 提交时不 fsync, 断电会丢掉已经返回成功的修改; 每个线程的连接都必须是 FULL (2)
+    modes = [store._conn().execute('PRAGMA synchronous').fetchone()[0]]
+    thread = threading.Thread(target=lambda: modes.append(store._conn().execute('PRAGMA synchronous').fetchone()[0]))
+    thread.start()
+    thread.join()
+    assert modes == [2, 2]
+    # TMDB 缓存可以重新获取, 仍然用 NORMAL (1)
+    cache = TmdbCache(str(tmp_path / 'cache.db'))
+    try:
+        assert cache._conn().execute('PRAGMA synchronous').fetchone()[0] == 1
+    finally:
+        cache.close()
+
+
+def test_thread_connections_are_released(store):
+    def read(tmdb_id):
+        store.get('watched', 'watched-1')
+        store.add('watched', movie('watched', tmdb_id))
+
+    for tmdb_id in range(50):
+        thread = threading.Thread(target=read, args=(tmdb_id,))
+        thread.start()
+        thread.join()
+    gc.collect()
+    # 只剩创建 store 的主线程那一个连接
+    assert len(store._connections) == 1
+    assert len(ids(store, 'watched')) == 50
+
+
+def test_migrate_from_json(tmp_path):
+    json_path = str(tmp_path / 'movies.json')
+    json_store = open_store(json_path)
+    json_store.add('watched', movie('watched', 1))
+    json_store.add('wantToWatch', movie('wantToWatch', 2))
+    json_store.close()
+
+    db_path = str(tmp_path / 'movies.db')
+    assert migrate_json_to_sqlite(json_path, db_path) == 2
+    store = SqliteMovieStore(db_path)
+    try:
+        assert ids(store, 'watched') == ['watched-1']
+        assert ids(store, 'wantToWatch') == ['wantToWatch-2']
+    finally:
+        store.close()
+
+
+def test_rows_store_bare_image_paths(store):
+    store.add('watched', movie('watched', 1))
+    (raw,) = store._conn().execute("SELECT data FROM movies WHERE id = 'watched-1'").fetchone()
+    assert json.loads(raw)['posters'] == ['/p1.jpg']
@@ -0,0 +1,111 @@
+import gc
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+import pytest
+
+from tmdb_cache import TmdbCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.db')
+
+
+def stored_bytes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def payload(n):
+    # 压缩后仍然有一定大小的随机内容
+    return {'data': [hash((n, i)) for i in range(200)]}
+
+
+def test_get_put_and_ttl(path):
+    cache = TmdbCache(path)
+    try:
+        key = TmdbCache.make_key('details', 550, 'movie', None)
+        assert key == 'details|550|movie|'
+        assert cache.get(key) is None
+        cache.put(key, {'title': "搏击俱乐部"})
+        assert cache.get(key) == {'title': "搏击俱乐部"}
+        assert cache.contains(key)
+        cache.put('short', {'x': 1}, ttl=0.05)
+        time.sleep(0.1)
+        assert not cache.contains('short')
+        assert cache.get('short') is None
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 1)
+    finally:
+        cache.close()
+
+
+def test_running_total_matches_table(path):
+    cache = TmdbCache(path)
+    try:
+        for n in range(20):
+            cache.put(f"k{n}", payload(n))
+        for n in range(10):
+            cache.put(f"k{n}", {'small': n})  # 覆盖写入, 大小变化
+        cache.put('gone', payload(99), ttl=0)
+        cache.get('gone')  # 读到已过期的条目时删除
+        assert cache.stats()['bytes'] == stored_bytes(path)
+        cache.clear()
+        assert cache.stats()['bytes'] == stored_bytes(path) == 0
+    finally:
+        cache.close()
+
+
+def test_lru_eviction(path):
+    size = len(zlib.compress(json.dumps(payload(0)).encode('utf-8')))
+    cache = TmdbCache(path, max_bytes=size * 10)
+    try:
+        for n in range(10):
+            cache.put(f"k{n}", payload(n))
+        cache.get('k0')  # k0 变成最近使用过的
+        cache.put('k10', payload(10))
+        assert cache.evictions > 0
+        assert cache.stats()['bytes'] <= size * 10
+        assert cache.contains('k0') and cache.contains('k10')
+        assert not cache.contains('k1')
+        assert cache.stats()['bytes'] == stored_bytes(path)
+    finally:
+        cache.close()
+
+
+def test_shared_file_keeps_one_total(path):
+    first, second = TmdbCache(path), TmdbCache(path)
+    try:
+        first.put('a', payload(1))
+        second.put('b', payload(2))
+        second.put('a', {'small': True})
+        assert first.stats()['bytes'] == second.stats()['bytes'] == stored_bytes(path)
+        assert first.get('a') == {'small': True}
+    finally:
+        first.close()
+        second.close()
+
+
+def test_thread_connections_are_released(path):
+    cache = TmdbCache(path)
+    try:
+        def lookup(n):
+            cache.put(f"k{n}", {'n': n})
+            cache.get(f"k{n}")
+
+        for n in range(50):
+            thread = threading.Thread(target=lookup, args=(n,))
+            thread.start()
+            thread.join()
+        gc.collect()
+        assert len(cache._connections) == 1
+        assert cache.stats()['entries'] == 50
+    finally:
+        cache.close()
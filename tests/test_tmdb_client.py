@@ -0,0 +1,125 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from tmdb_client import TmdbClient, TokenBucket, parse_retry_after
+
+
+def get_concurrently(client, calls):
+    """同时发出 calls 里的每个 (path, params), 返回各自的结果或异常。"""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(i, path, params):
+        barrier.wait()
+        try:
+            results[i] = client.get(path, params)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, *call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_concurrent_gets_are_coalesced(fake_tmdb):
+    base_url, tmdb = fake_tmdb('--latency', 0.3)
+    client = TmdbClient('key', base_url=base_url)
+    try:
+        results = get_concurrently(client, [('/movie/550', {'language': 'zh-CN'})] * 8)
+        assert tmdb.stats['requests'] == 1
+        assert client.coalesced == 7
+        assert all(result == results[0] for result in results)
+        # 每个调用方拿到各自解析的一份, 互不影响
+        results[0]['title'] = "改掉"
+        assert results[1]['title'] != "改掉"
+    finally:
+        client.close()
+
+
+def test_different_requests_are_not_coalesced(fake_tmdb):
+    base_url, tmdb = fake_tmdb('--latency', 0.2)
+    client = TmdbClient('key', base_url=base_url)
+    try:
+        results = get_concurrently(client, [('/movie/550', {'language': 'zh-CN'}),
+                                            ('/movie/550', {'language': 'en-US'}),
+                                            ('/movie/551', {'language': 'zh-CN'})])
+        assert tmdb.stats['requests'] == 3 and client.coalesced == 0
+        assert results[0]['title'] == "电影 550" and results[1]['title'] == "Movie 550"
+    finally:
+        client.close()
+
+
+def test_errors_reach_every_coalesced_caller(fake_tmdb):
+    base_url, tmdb = fake_tmdb('--latency', 0.3)
+    client = TmdbClient('key', base_url=base_url)
+    try:
+        results = get_concurrently(client, [('/person/1', None)] * 4)
+        assert tmdb.stats['requests'] == 1
+        assert all(isinstance(result, requests.HTTPError) for result in results)
+        # 失败的请求不会留在进行中的表里, 之后的调用重新请求上游
+        with pytest.raises(requests.HTTPError):
+            client.get('/person/1')
+        assert tmdb.stats['requests'] == 2
+    finally:
+        client.close()
+
+
+def test_429_is_retried_only_by_the_client(fake_tmdb):
+    # 每个请求都返回 429 (Retry-After: 0): 连接池不能自己重试 429, 否则会绕过限流器并且次数相乘
+    base_url, tmdb = fake_tmdb('--error-429', 1, '--retry-after', 0)
+    client = TmdbClient('key', base_url=base_url, max_retries=2, backoff_factor=0)
+    try:
+        with pytest.raises(requests.HTTPError) as excinfo:
+            client.get('/movie/550')
+        assert excinfo.value.response.status_code == 429
+        assert tmdb.stats['requests'] == 3
+        assert client.limiter.throttled == 2
+        assert client.limiter.rate < client.limiter.max_rate
+    finally:
+        client.close()
+
+
+def test_retry_after_pauses_the_whole_client(fake_tmdb):
+    base_url, tmdb = fake_tmdb('--max-rps', 1, '--retry-after', 1)
+    client = TmdbClient('key', base_url=base_url)
+    try:
+        client.get('/movie/1')
+        start = time.monotonic()
+        assert client.get('/movie/2')['id'] == 2
+        assert time.monotonic() - start >= 0.9
+        assert (tmdb.stats['requests'], tmdb.stats['rate_limited'], client.limiter.throttled) == (3, 1, 1)
+    finally:
+        client.close()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert 0 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # 先用掉 5 个积攒的令牌, 其余 10 个按每秒 50 个发放
+    assert time.monotonic() - start >= 0.18
+
+    bucket.throttle(0.2)
+    assert bucket.rate == 25
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.2
+    for _ in range(40):
+        bucket.reward()
+    assert bucket.rate == bucket.max_rate
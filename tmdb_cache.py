@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+import zlib
+
+from sqlite_connections import ThreadConnections
+
+
+class TmdbCache:
+    """
+    TMDB 响应的本地磁盘缓存, 保存在一个 SQLite 文件里, 重启之后仍然有效。
+
+    每个条目有自己的过期时间 (TTL), 过期的条目在读到时删除; 所有条目的总大小 (压缩后的字节数)
+    超过 max_bytes 时, 按最近使用时间淘汰最久没用过的条目 (LRU)。总大小由触发器维护在 meta 表里,
+    写入时不需要扫描整张表, 多个进程写同一个文件时也保持准确。
+    hits / misses / evictions 计数器记录本进程的命中情况, 见 stats()。
+    数据库运行在 WAL 模式下, 多个 worker 进程可以共用同一个缓存文件。
+
+    Args:
+        path (str): SQLite 数据库文件路径。
+        max_bytes (int): 缓存总大小上限。
+        default_ttl (float): put() 未指定 ttl 时使用的过期秒数。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta VALUES ('bytes', 0);
+        CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+            UPDATE meta SET value = value + NEW.size WHERE key = 'bytes';
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+            UPDATE meta SET value = value - OLD.size + NEW.size WHERE key = 'bytes';
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+            UPDATE meta SET value = value - OLD.size WHERE key = 'bytes';
+        END;
+    """
+
+    # 淘汰时一次性腾出到上限的这个比例, 避免每次写入都触发淘汰
+    EVICT_TARGET = 0.9
+
+    def __init__(self, path, max_bytes=200 * 1024 * 1024, default_ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._connections = ThreadConnections(path)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        """每个线程一个连接, 线程结束时关闭。"""
+        return self._connections.get()
+
+    @staticmethod
+    def make_key(*parts):
+        """由若干字段拼出缓存键, 如 make_key('details', 550, 'movie', 'zh-CN', 'zh,en,null')。"""
+        return '|'.join('' if part is None else str(part) for part in parts)
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def get(self, key):
+        """返回缓存的对象, 不存在或已过期时返回 None。"""
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute('SELECT value, expires_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= now:
+            if row is not None:
+                conn.execute('DELETE FROM entries WHERE key = ? AND expires_at <= ?', (key, now))
+            self._count('misses')
+            return None
+        conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+        self._count('hits')
+        return json.loads(zlib.decompress(row[0]))
+
+    def contains(self, key):
+        """是否有未过期的条目; 不计入命中统计, 也不更新最近使用时间。"""
+        row = self._conn().execute('SELECT 1 FROM entries WHERE key = ? AND expires_at > ?',
+                                   (key, time.time())).fetchone()
+        return row is not None
+
+    def put(self, key, value, ttl=None):
+        """写入一个可以 JSON 序列化的对象, ttl 秒后过期。"""
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        conn = self._conn()
+        # 用 UPSERT 而不是 INSERT OR REPLACE: REPLACE 删除旧行时不会触发 DELETE 触发器, 总大小会算错
+        conn.execute('INSERT INTO entries VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                     'value = excluded.value, size = excluded.size, expires_at = excluded.expires_at, '
+                     'last_used = excluded.last_used', (key, blob, len(blob), expires_at, now))
+        self._evict(conn)
+
+    @staticmethod
+    def _total_bytes(conn):
+        return conn.execute("SELECT value FROM meta WHERE key = 'bytes'").fetchone()[0]
+
+    def _evict(self, conn):
+        if self._total_bytes(conn) <= self.max_bytes:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 先丢掉已经过期的, 再按最近使用时间从旧到新淘汰
+            now = time.time()
+            removed = conn.execute('DELETE FROM entries WHERE expires_at <= ?', (now,)).rowcount
+            total = self._total_bytes(conn)
+            target = self.max_bytes * self.EVICT_TARGET
+            victims = []
+            for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_used'):
+                if total <= target:
+                    break
+                victims.append((key,))
+                total -= size
+            conn.executemany('DELETE FROM entries WHERE key = ?', victims)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._count('evictions', removed + len(victims))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM entries')
+
+    def stats(self):
+        """命中计数和当前缓存的条目数、总大小。"""
+        conn = self._conn()
+        entries = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        size = self._total_bytes(conn)
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def close(self):
+        self._connections.close_all()
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TMDB_API_BASE_URL = os.environ.get("TMDB_API_BASE_URL", "https://api.themoviedb.org/3")
+
+# 连接池大小、重试次数和退避系数可以通过环境变量调整
+DEFAULT_POOL_SIZE = int(os.environ.get("TMDB_POOL_SIZE", "16"))
+DEFAULT_MAX_RETRIES = int(os.environ.get("TMDB_MAX_RETRIES", "3"))
+DEFAULT_BACKOFF_FACTOR = float(os.environ.get("TMDB_BACKOFF_FACTOR", "0.5"))
+
+# TMDB 文档给出的请求上限约为每秒 40~50 次, 默认留一点余量
+DEFAULT_RATE_LIMIT = float(os.environ.get("TMDB_RATE_LIMIT", "40"))
+DEFAULT_RATE_BURST = int(os.environ.get("TMDB_RATE_BURST", "20"))
+
+# 这些状态码表示暂时性错误, 由连接池退避后重试。429 不在其中, 并且连接池不按 Retry-After 重试
+# (respect_retry_after_header=False), 所以 429 总是交给 TmdbClient._request 处理, 以便同时让限流器降速
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+def parse_retry_after(value):
+    """把 Retry-After 头 (秒数或 HTTP 日期) 转成需要等待的秒数, 无法解析时返回 None。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    所有 TMDB 请求共享的令牌桶限流器。
+
+    平时以 rate 个/秒的速度发放令牌, 最多攒 burst 个; 上游返回 429 时速率减半,
+    并在 Retry-After 给出的时间内暂停发放, 之后每次成功请求把速率按加法逐步恢复到上限 (AIMD)。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = max(rate / 16, 0.5)
+        self.burst = burst or max(1, int(rate))
+        self.throttled = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                start = max(self._updated, self._paused_until)
+                if now > start:
+                    self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, pause):
+        """上游返回 429: 速率减半, 并在 pause 秒内不再发放令牌。"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.throttled += 1
+
+    def reward(self):
+        """请求成功: 速率逐步恢复。"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class _Flight:
+    """一次正在进行的上游请求, 等待同一请求的调用方共享它的结果。"""
+    __slots__ = ('done', 'body', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+        self.error = None
+
+
+class TmdbClient:
+    """
+    所有 TMDB API 请求共用的 HTTP 客户端。
+
+    内部是一个带连接池的 requests.Session: 同一主机的连接保持 keep-alive 复用, 不必每次请求都重新
+    握手 TCP + TLS; 遇到 5xx 和连接错误时按指数退避自动重试。所有请求先从令牌桶 (TokenBucket) 取令牌,
+    遇到 429 时按 Retry-After 暂停整个客户端并降低速率, 然后重试。
+    Session 本身是线程安全的, 多个线程可以共用同一个实例。
+
+    相同 (路径, 参数) 的并发请求会合并 (single-flight): 只有第一个调用方真正请求上游, 其余的等待并
+    共享同一份响应, 热门条目被同时打开很多次时上游也只收到一次请求。coalesced 记录被合并掉的请求数。
+    """
+
+    def __init__(self, api_key, base_url=TMDB_API_BASE_URL, pool_size=DEFAULT_POOL_SIZE,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 rate_limit=DEFAULT_RATE_LIMIT, rate_burst=DEFAULT_RATE_BURST):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.limiter = TokenBucket(rate_limit, rate_burst)
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET']),
+            # 为 True 时 urllib3 会自己按 Retry-After 重试 429, 既绕过限流器, 次数也和 _request 的重试相乘
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.coalesced = 0
+
+    def get(self, path, params=None, timeout=10):
+        """
+        请求 TMDB API 并返回解析后的 JSON。
+
+        Args:
+            path (str): API 路径, 如 '/search/multi'。
+            params (dict): 查询参数, api_key 会自动加上。
+
+        Raises:
+            requests.RequestException: 重试之后仍然失败 (含非 2xx 响应)。
+        """
+        params = dict(params or {}, api_key=self.api_key)
+        key = (path, tuple(sorted((name, str(value)) for name, value in params.items())))
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                response = self._request(path, params, timeout)
+                flight.body = response.content
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._flights_lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+        # 每个调用方各自解析一份, 互相修改结果不会影响对方
+        return json.loads(flight.body)
+
+    def _request(self, path, params, timeout):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            response = self.session.get(f"{self.base_url}{path}", params=params, timeout=timeout)
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+            pause = parse_retry_after(response.headers.get('Retry-After'))
+            self.limiter.throttle(self.backoff_factor * 2 ** attempt if pause is None else pause)
+        response.raise_for_status()
+        self.limiter.reward()
+        return response
+
+    def close(self):
+        self.session.close()
+